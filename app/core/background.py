@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+def seconds_until_hour_utc(hour: int) -> float:
+    """Seconds from now until the next HH:00 UTC (used for nightly jobs)."""
+    now = datetime.now(timezone.utc)
+    nxt = now.replace(hour=int(hour) % 24, minute=0, second=0, microsecond=0)
+    if nxt <= now:
+        nxt += timedelta(days=1)
+    return (nxt - now).total_seconds()
+
+
+class PeriodicTask:
+    """
+    Minimal in-process scheduler: runs `func` every `interval_seconds`
+    (after `first_delay_seconds`), started/stopped from the FastAPI lifespan.
+    interval_seconds <= 0 runs it once.
+
+    A failing run is logged and does not stop the schedule.
+    """
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        func: Callable[[], Awaitable[object]],
+        interval_seconds: float,
+        first_delay_seconds: float | Callable[[], float] = 0.0,
+    ):
+        self.name = name
+        self.func = func
+        self.interval_seconds = float(interval_seconds)
+        self.first_delay_seconds = first_delay_seconds
+        self.last_result: object = None
+        self.last_run_at: datetime | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping = asyncio.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name=self.name)
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopping.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._task = None
+
+    async def _sleep(self, seconds: float) -> bool:
+        """Returns True if stop was requested while sleeping."""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=max(0.0, seconds))
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _run(self) -> None:
+        delay = self.first_delay_seconds() if callable(self.first_delay_seconds) else self.first_delay_seconds
+        if await self._sleep(float(delay)):
+            return
+        while not self._stopping.is_set():
+            try:
+                self.last_result = await self.func()
+                self.last_run_at = datetime.now(timezone.utc)
+            except Exception:
+                logger.exception("background task %s failed", self.name)
+            if self.interval_seconds <= 0:
+                return
+            if await self._sleep(self.interval_seconds):
+                return
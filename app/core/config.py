@@ -1,6 +1,11 @@
+from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+# values that must never reach production as the coupon code key
+_COUPON_CODE_KEY_PLACEHOLDERS = {"", "change-me", "changeme", "change_me"}
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         env_file=".env2",
@@ -17,5 +22,99 @@ class Settings(BaseSettings):
 
     BOT_API_KEY: str = "change-me"
 
+    # Geek provider (app/integrations/geek_api_client.py): one pooled client per process
+    GEEK_API_BASE_URL: str = ""
+    GEEK_API_TOKEN: str = ""
+    GEEK_HTTP_MAX_CONNECTIONS: int = 50
+    GEEK_HTTP_MAX_KEEPALIVE: int = 20
+    GEEK_HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    GEEK_HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    GEEK_HTTP_READ_TIMEOUT_SECONDS: float = 15.0
+    GEEK_HTTP_WRITE_TIMEOUT_SECONDS: float = 5.0
+    GEEK_HTTP_POOL_TIMEOUT_SECONDS: float = 5.0
+    # use app/integrations/geek_mock.py instead of the real provider (local runs / load tests)
+    GEEK_PROVIDER_MOCK: bool = False
+
+    # Provider issuance executor (app/services/issuance_executor.py)
+    ISSUANCE_CONCURRENCY_PER_ENDPOINT: int = 8
+    ISSUANCE_QUEUE_MAX: int = 500
+    ISSUANCE_MAX_ATTEMPTS: int = 3
+    ISSUANCE_BACKOFF_BASE_SECONDS: float = 0.2
+    ISSUANCE_BACKOFF_MAX_SECONDS: float = 3.0
+    ISSUANCE_BREAKER_THRESHOLD: int = 5
+    ISSUANCE_BREAKER_RESET_SECONDS: float = 30.0
+    # on shutdown: how long calls already at the provider may take to finish
+    ISSUANCE_DRAIN_SECONDS: float = 10.0
+    # provider calls one bulk bot request may have queued at once
+    BOT_BULK_ISSUE_CONCURRENCY: int = 16
+
+    # Transactional outbox dispatcher (app/services/outbox.py)
+    OUTBOX_DISPATCH_ENABLED: bool = True
+    OUTBOX_BATCH_SIZE: int = 200
+    OUTBOX_POLL_SECONDS: float = 1.0
+    # failed events: retry after base * 2^(attempts-1) seconds (capped), dead-letter after max attempts
+    OUTBOX_RETRY_BASE_SECONDS: float = 2.0
+    OUTBOX_RETRY_MAX_SECONDS: float = 600.0
+    OUTBOX_MAX_ATTEMPTS: int = 10
+    # processed events are deleted once older than this (dead-lettered ones are kept for replay);
+    # the dispatcher purges at most every OUTBOX_PURGE_INTERVAL_SECONDS, in batches of OUTBOX_PURGE_BATCH_SIZE
+    OUTBOX_RETENTION_HOURS: float = 72.0
+    OUTBOX_PURGE_INTERVAL_SECONDS: float = 600.0
+    OUTBOX_PURGE_BATCH_SIZE: int = 5000
+
+    # Nightly downstream margin-violation scan (app/services/margin_violations.py)
+    MARGIN_SCAN_ENABLED: bool = True
+    MARGIN_SCAN_HOUR_UTC: int = 3
+
+    # In-process pricing cache (app/services/pricing_cache.py)
+    PRICING_CACHE_ENABLED: bool = True
+    PRICING_CACHE_TTL_SECONDS: float = 300.0
+    PRICING_CACHE_MAX_SELLERS: int = 10000
+    PRICING_CACHE_LISTEN: bool = True
+
+    # Coupon code allocator (app/services/coupon_codes.py)
+    # NEVER change the key once codes were issued: the permutation depends on it.
+    # Required and secret: with the key, valid codes follow from sequence numbers.
+    COUPON_CODE_KEY: str
+    # Probe for pre-allocator (random) codes; can be turned off once none are left
+    COUPON_CODE_LEGACY_CHECK: bool = True
+
+    # Stale-reservation sweeper (app/services/reservation_sweeper.py)
+    RESERVATION_SWEEP_ENABLED: bool = True
+    RESERVATION_TTL_MINUTES: int = 60
+    RESERVATION_SWEEP_INTERVAL_SECONDS: float = 300.0
+    RESERVATION_SWEEP_BATCH_SIZE: int = 500
+    # per run; whatever is left is picked up by the next run
+    RESERVATION_SWEEP_MAX_BATCHES: int = 20
+
+    # Pre-minted coupon pools per plan (app/services/coupon_pools.py); off by default
+    COUPON_POOL_ENABLED: bool = False
+    # system account that owns pooled coupons (create it once, e.g. a seller under the admin root)
+    COUPON_POOL_OWNER_USER_ID: int | None = None
+    COUPON_POOL_LOW_WATER: int = 1000
+    COUPON_POOL_HIGH_WATER: int = 5000
+    COUPON_POOL_REFILL_SECONDS: float = 60.0
+
+    # In-process index of existing coupon codes for the bot edge (app/services/coupon_code_filter.py)
+    COUPON_CODE_FILTER_ENABLED: bool = True
+    COUPON_CODE_FILTER_REFRESH_SECONDS: float = 5.0
+
+    # Fill coupons.owner_path for coupons minted before it existed, once at
+    # startup on one worker (app/services/coupon_owner_paths.py)
+    COUPON_OWNER_PATH_BACKFILL_ENABLED: bool = True
+
+    # In-process LRU of coupon category versions (app/services/coupon_category_versions.py)
+    COUPON_CATEGORY_VERSION_CACHE_SIZE: int = 1024
+
+    @field_validator("COUPON_CODE_KEY")
+    @classmethod
+    def _coupon_code_key_is_set(cls, v: str) -> str:
+        if (v or "").strip().lower() in _COUPON_CODE_KEY_PLACEHOLDERS:
+            raise ValueError(
+                "COUPON_CODE_KEY must be set to a secret value, e.g. "
+                "python -c \"import secrets; print(secrets.token_hex(32))\""
+            )
+        return v
+
 
 settings = Settings()
@@ -2,11 +2,69 @@ import httpx
 from app.core.config import settings
 
 
-class GeekApiClient:
+class GeekApiError(Exception):
+    def __init__(self, message: str, *, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def build_geek_http_client() -> httpx.AsyncClient:
+    """
+    One pooled client per process: keep-alive connections are reused across
+    issuances instead of a TCP+TLS handshake per call.
+    """
+    return httpx.AsyncClient(
+        base_url=settings.GEEK_API_BASE_URL,
+        limits=httpx.Limits(
+            max_connections=settings.GEEK_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.GEEK_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.GEEK_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=httpx.Timeout(
+            connect=settings.GEEK_HTTP_CONNECT_TIMEOUT_SECONDS,
+            read=settings.GEEK_HTTP_READ_TIMEOUT_SECONDS,
+            write=settings.GEEK_HTTP_WRITE_TIMEOUT_SECONDS,
+            # waiting for a free pooled connection
+            pool=settings.GEEK_HTTP_POOL_TIMEOUT_SECONDS,
+        ),
+    )
+
+
+class GeekHttpPool:
+    """
+    Owns the shared httpx.AsyncClient. Started/closed from the FastAPI lifespan;
+    created lazily if something uses it outside the app (scripts).
+    """
+
     def __init__(self):
-        self.base_url = settings.GEEK_API_BASE_URL
+        self._http: httpx.AsyncClient | None = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = build_geek_http_client()
+        return self._http
+
+    async def start(self) -> None:
+        _ = self.http
+
+    async def stop(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+geek_http_pool = GeekHttpPool()
+
+
+def issue_endpoint(issue_mode: str) -> str:
+    return "adddevice" if issue_mode == "instant" else "addyydevice"
+
+
+class GeekApiClient:
+    def __init__(self, http: httpx.AsyncClient | None = None):
+        self.http = http if http is not None else geek_http_pool.http
         self.token = settings.GEEK_API_TOKEN
-        self.timeout = 15
 
     async def issue_device(
         self,
@@ -16,11 +74,7 @@ class GeekApiClient:
         warranty: int,
         note: str | None = None,
     ):
-        endpoint = (
-            "/api/adddevice"
-            if issue_mode == "instant"
-            else "/api/addyydevice"
-        )
+        endpoint = f"/api/{issue_endpoint(issue_mode)}"
 
         payload = {
             "token": self.token,
@@ -30,10 +84,14 @@ class GeekApiClient:
             "beizhu": note or "",
         }
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            r = await client.post(f"{self.base_url}{endpoint}", json=payload)
+        r = await self.http.post(endpoint, json=payload)
 
         if r.status_code != 200:
-            raise Exception(f"Geek API error: {r.text}")
+            raise GeekApiError(f"Geek API error: {r.text}", status_code=r.status_code)
+
+        return r.json()
+
 
-        return r.json()
\ No newline at end of file
+def get_geek_client() -> GeekApiClient:
+    """FastAPI dependency: a GeekApiClient on the shared pooled connection."""
+    return GeekApiClient(http=geek_http_pool.http)
@@ -0,0 +1,58 @@
+import asyncio
+import random
+import uuid
+
+from app.integrations.geek_api_client import GeekApiError, issue_endpoint
+
+
+class MockGeekProvider:
+    """
+    Local stand-in for GeekApiClient (GEEK_PROVIDER_MOCK=true): same
+    issue_device() signature, configurable latency and failure rates, no network.
+    Used for load tests of the issuance executor and for local development.
+    """
+
+    def __init__(
+        self,
+        *,
+        latency_seconds: float = 0.2,
+        jitter_seconds: float = 0.1,
+        transient_error_rate: float = 0.0,
+        permanent_error_rate: float = 0.0,
+    ):
+        self.latency_seconds = float(latency_seconds)
+        self.jitter_seconds = float(jitter_seconds)
+        self.transient_error_rate = float(transient_error_rate)
+        self.permanent_error_rate = float(permanent_error_rate)
+        self.calls: dict[str, int] = {"adddevice": 0, "addyydevice": 0}
+
+    async def issue_device(
+        self,
+        udid: str,
+        issue_mode: str,
+        pool_type: int,
+        warranty: int,
+        note: str | None = None,
+    ):
+        endpoint = issue_endpoint(issue_mode)
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+        await asyncio.sleep(max(0.0, self.latency_seconds + random.uniform(-1, 1) * self.jitter_seconds))
+
+        roll = random.random()
+        if roll < self.transient_error_rate:
+            raise GeekApiError("mock provider: service unavailable", status_code=503)
+        if roll < self.transient_error_rate + self.permanent_error_rate:
+            raise GeekApiError("mock provider: invalid udid", status_code=400)
+
+        return {
+            "code": 0,
+            "msg": "ok",
+            "data": {
+                "udid": udid,
+                "type": pool_type,
+                "warranty": warranty,
+                "endpoint": endpoint,
+                "req_id": uuid.uuid4().hex,
+            },
+        }
@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -5,6 +7,55 @@ from fastapi.middleware.cors import CORSMiddleware
 # This imports ALL models so SQLAlchemy registers tables + FKs correctly
 import app.models  # noqa: F401
 
+from app.core.config import settings
+
+# Shared outbound HTTP clients
+from app.integrations.geek_api_client import geek_http_pool
+from app.services.issuance_executor import issuance_executor
+
+# Background workers
+from app.core.background import PeriodicTask, seconds_until_hour_utc
+from app.services.margin_violations import run_nightly_margin_scan
+from app.services.outbox import outbox_dispatcher
+from app.services.pricing_cache import pricing_listener
+from app.services.reservation_sweeper import sweep_stale_reservations
+from app.services.coupon_pools import pool_enabled, refill_coupon_pools
+from app.services.coupon_code_filter import refresh_coupon_code_filter
+from app.services.coupon_owner_paths import run_coupon_owner_path_backfill
+
+margin_scan_task = PeriodicTask(
+    name="nightly-margin-scan",
+    func=run_nightly_margin_scan,
+    interval_seconds=24 * 3600,
+    first_delay_seconds=lambda: seconds_until_hour_utc(settings.MARGIN_SCAN_HOUR_UTC),
+)
+
+reservation_sweep_task = PeriodicTask(
+    name="reservation-sweeper",
+    func=sweep_stale_reservations,
+    interval_seconds=settings.RESERVATION_SWEEP_INTERVAL_SECONDS,
+    first_delay_seconds=settings.RESERVATION_SWEEP_INTERVAL_SECONDS,
+)
+
+coupon_pool_refill_task = PeriodicTask(
+    name="coupon-pool-refill",
+    func=refill_coupon_pools,
+    interval_seconds=settings.COUPON_POOL_REFILL_SECONDS,
+)
+
+coupon_code_filter_task = PeriodicTask(
+    name="coupon-code-filter",
+    func=refresh_coupon_code_filter,
+    interval_seconds=settings.COUPON_CODE_FILTER_REFRESH_SECONDS,
+)
+
+coupon_owner_path_backfill_task = PeriodicTask(
+    name="coupon-owner-path-backfill",
+    func=run_coupon_owner_path_backfill,
+    # once per startup; mint-time writes keep new coupons exact
+    interval_seconds=0,
+)
+
 # Routers
 from app.routers.auth import router as auth_router
 from app.routers.admin import router as admin_router
@@ -63,7 +114,42 @@ from app.routers.seller_balance_history_rollup import router as seller_balance_h
 from app.routers.admin_balance_history import router as admin_balance_history_router
 from app.routers import admin_coupon_categories, bot_coupons
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await geek_http_pool.start()
+    await issuance_executor.start()
+
+    # Background workers (in-process)
+    if settings.OUTBOX_DISPATCH_ENABLED:
+        await outbox_dispatcher.start()
+    if settings.MARGIN_SCAN_ENABLED:
+        await margin_scan_task.start()
+    if settings.RESERVATION_SWEEP_ENABLED:
+        await reservation_sweep_task.start()
+    if pool_enabled():
+        await coupon_pool_refill_task.start()
+    if settings.COUPON_CODE_FILTER_ENABLED:
+        # first run streams every code; until it finishes the filter lets everything through
+        await coupon_code_filter_task.start()
+    if settings.COUPON_OWNER_PATH_BACKFILL_ENABLED:
+        await coupon_owner_path_backfill_task.start()
+    if settings.PRICING_CACHE_ENABLED and settings.PRICING_CACHE_LISTEN:
+        await pricing_listener.start()
+    try:
+        yield
+    finally:
+        await pricing_listener.stop()
+        await reservation_sweep_task.stop()
+        await coupon_pool_refill_task.stop()
+        await coupon_code_filter_task.stop()
+        await coupon_owner_path_backfill_task.stop()
+        await margin_scan_task.stop()
+        await outbox_dispatcher.stop()
+        await issuance_executor.stop()
+        await geek_http_pool.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # ✅ CORS for Next.js dev server (frontend)
 # Add your Vercel domain later when you deploy frontend.
@@ -9,10 +9,15 @@ from app.models.pricing import AdminPlanBasePrice, SellerEdgePlanPrice  # noqa:
 from app.models.wallet import WalletAccount, WalletLedger  # noqa: F401
 
 from app.models.coupon import Coupon  # noqa: F401
+from app.models.coupon_category_version import CouponCategoryVersion  # noqa: F401
 from app.models.coupon_event import CouponEvent  # noqa: F401
+from app.models.coupon_generation_batch import CouponGenerationBatch  # noqa: F401
+from app.models.coupon_inventory import CouponInventoryCount  # noqa: F401
 
 from app.models.certificate import Certificate  # noqa: F401
 
 # Module E
 from app.models.order import Order  # noqa: F401
 from app.models.order_item import OrderItem  # noqa: F401
+
+from app.models.outbox import OutboxEvent  # noqa: F401
@@ -30,7 +30,7 @@ class Certificate(Base):
 
     telegram_id = Column(BigInteger, nullable=True)
 
-    udid = Column(Text, nullable=False)
+    udid = Column(Text, nullable=False, index=True)
     serial = Column(Text, nullable=False)
 
     provider_req_id = Column(Text, nullable=True)
@@ -1,7 +1,5 @@
 # app/models/coupon.py
 from __future__ import annotations
-from sqlalchemy import JSON, ForeignKey, Integer
-from sqlalchemy.orm import relationship
 
 from sqlalchemy import (
     BigInteger,
@@ -9,13 +7,29 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKey,
+    Index,
+    Integer,
+    Sequence,
     Text,
     func,
+    text,
 )
 from sqlalchemy.dialects.postgresql import BYTEA
 from sqlalchemy.orm import relationship
 
 from app.core.db import Base
+from app.models.user import LtreeType
+
+
+# Feeds app/services/coupon_codes.py: every value maps to exactly one 8-hex code
+coupon_code_seq = Sequence(
+    "coupon_code_seq",
+    metadata=Base.metadata,
+    start=1,
+    minvalue=1,
+    maxvalue=0xFFFFFFFF,
+    cycle=False,
+)
 
 
 class Coupon(Base):
@@ -26,6 +40,25 @@ class Coupon(Base):
             "status IN ('unused','reserved','used','void')",
             name="coupons_status_check",
         ),
+        # Keyset pagination on (created_at, coupon_code), alone and per filter
+        Index("ix_coupons_created_at_code", "created_at", "coupon_code"),
+        Index("ix_coupons_status_created_at_code", "status", "created_at", "coupon_code"),
+        Index("ix_coupons_plan_created_at_code", "plan_id", "created_at", "coupon_code"),
+        Index("ix_coupons_owner_created_at_code", "owner_user_id", "created_at", "coupon_code"),
+        Index("ix_coupons_owner_status_created_at_code", "owner_user_id", "status", "created_at", "coupon_code"),
+        # UDID lookup (app/services/coupon_trace.py::find_by_udid)
+        Index("ix_coupons_reserved_udid_hash", "reserved_udid_hash"),
+        Index("ix_coupons_used_udid_hash", "used_udid_hash"),
+        # Stale-reservation sweep (app/services/reservation_sweeper.py)
+        Index(
+            "ix_coupons_reserved_at_reserved",
+            "reserved_at",
+            "coupon_code",
+            postgresql_where=text("status = 'reserved'"),
+        ),
+        # Subtree queries on the denormalized owner path (app/services/coupon_owner_paths.py)
+        Index("ix_coupons_owner_path_gist", "owner_path", postgresql_using="gist"),
+        Index("ix_coupons_owner_bucket_created_at_code", "owner_bucket_depth1", "created_at", "coupon_code"),
     )
 
     coupon_code = Column(Text, primary_key=True)
@@ -60,14 +93,27 @@ class Coupon(Base):
     used_udid_hash = Column(BYTEA, nullable=True)
     used_udid_suffix = Column(Text, nullable=True)
 
+    # set only for coupons minted by a bulk admin generation (coupon_generation_batches.id)
+    generation_batch_id = Column(BigInteger, nullable=True, index=True)
+
+    # Copy of the owner's users.path + its depth-1 ancestor id, written at mint time
+    owner_path = Column(LtreeType(), nullable=True)
+    owner_bucket_depth1 = Column(BigInteger, nullable=True)
+
     plan = relationship("Plan", back_populates="coupons", lazy="selectin")
 
     coupon_category_id = Column(
-    Integer,
-    ForeignKey("coupon_categories.id", ondelete="RESTRICT"),
-    nullable=True,
-)
+        Integer,
+        ForeignKey("coupon_categories.id", ondelete="RESTRICT"),
+        nullable=True,
+    )
 
-coupon_category_snapshot = Column(JSON, nullable=False, default=dict)
+    # Issuing config frozen at mint time (app/services/coupon_category_versions.py);
+    # replaces the per-row coupon_category_snapshot JSON copy
+    coupon_category_version_id = Column(
+        BigInteger,
+        ForeignKey("public.coupon_category_versions.id", ondelete="RESTRICT"),
+        nullable=True,
+        index=True,
+    )
 
-coupon_category = relationship("CouponCategory")
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Integer
+from sqlalchemy.dialects.postgresql import BYTEA, JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+
+from app.core.db import Base
+
+
+class CouponCategoryVersion(Base):
+    """
+    Immutable, deduplicated copy of a coupon category's issuing config.
+    Coupons point at the version that was current when they were minted
+    (coupons.coupon_category_version_id) instead of each carrying a JSON copy.
+    """
+
+    __tablename__ = "coupon_category_versions"
+    __table_args__ = {"schema": "public"}
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+
+    coupon_category_id: Mapped[int | None] = mapped_column(
+        Integer,
+        ForeignKey("coupon_categories.id", ondelete="RESTRICT"),
+        nullable=True,
+        index=True,
+    )
+
+    # sha256 of "<category id>:<snapshot jsonb text>", computed in SQL (dedupe key)
+    content_hash: Mapped[bytes] = mapped_column(BYTEA, nullable=False, unique=True)
+
+    snapshot: Mapped[dict] = mapped_column(JSONB, nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
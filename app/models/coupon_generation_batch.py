@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, Integer, Text
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+
+from app.core.db import Base
+
+
+class CouponGenerationBatch(Base):
+    """
+    One bulk (COPY-based) admin coupon generation run.
+    Coupons minted by it carry coupons.generation_batch_id = id.
+    """
+
+    __tablename__ = "coupon_generation_batches"
+    __table_args__ = {"schema": "public"}
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+
+    plan_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    owner_user_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    created_by_user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+    requested_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    generated_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+
+    notes: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
+    completed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
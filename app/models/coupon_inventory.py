@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from sqlalchemy import BigInteger, CheckConstraint, PrimaryKeyConstraint, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.db import Base
+
+
+class CouponInventoryCount(Base):
+    """
+    Number of coupons per (owner, plan, status), maintained incrementally in
+    the same transaction as every mint / status transition
+    (app/services/coupon_inventory.py). owner_user_id 0 = coupons without owner.
+    """
+
+    __tablename__ = "coupon_inventory_counts"
+    __table_args__ = (
+        PrimaryKeyConstraint("owner_user_id", "plan_id", "status", name="coupon_inventory_counts_pkey"),
+        CheckConstraint(
+            "status IN ('unused','reserved','used','void')",
+            name="coupon_inventory_counts_status_check",
+        ),
+        {"schema": "public"},
+    )
+
+    owner_user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    plan_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    status: Mapped[str] = mapped_column(Text, nullable=False)
+
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default="0")
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, Index, Integer, Text, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+
+from app.core.db import Base
+
+
+class OutboxEvent(Base):
+    """
+    Transactional outbox: domain events written in the SAME transaction as the
+    state change (purchase, ledger post, coupon transition), drained later by
+    app/services/outbox.py::OutboxDispatcher.
+    """
+
+    __tablename__ = "outbox_events"
+    __table_args__ = {"schema": "public"}
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+
+    # order_paid | ledger_posted | coupon_status_changed
+    event_type: Mapped[str] = mapped_column(Text, nullable=False)
+
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False, server_default="{}")
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
+
+    # NULL until every registered consumer handled the event
+    processed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    # failed events are retried with exponential backoff, not before this
+    next_attempt_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # dead-lettered after OUTBOX_MAX_ATTEMPTS failures; never claimed again
+    # (set back to NULL, with next_attempt_at, to replay)
+    dead_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+# Dispatcher scans only pending rows, oldest first
+Index(
+    "ix_outbox_events_pending",
+    OutboxEvent.id,
+    postgresql_where=text("processed_at IS NULL AND dead_at IS NULL"),
+)
+
+# Retention purge deletes processed rows oldest first
+Index(
+    "ix_outbox_events_processed_at",
+    OutboxEvent.processed_at,
+    postgresql_where=text("processed_at IS NOT NULL"),
+)
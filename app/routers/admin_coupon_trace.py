@@ -6,13 +6,30 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.db import get_db
 from app.core.deps import require_admin
 from app.models.user import User
-from app.schemas.coupon_trace import CouponTraceOut
-from app.services.coupon_trace import trace_coupon, CouponTraceError
+from app.schemas.coupon_trace import CouponTraceOut, UdidLookupOut
+from app.services.coupon_trace import find_by_udid, trace_coupon, CouponTraceError
 
 
 router = APIRouter(prefix="/admin/coupon-trace", tags=["Admin Coupon Trace"])
 
 
+@router.get("/by-udid", response_model=UdidLookupOut)
+async def admin_find_coupons_by_udid(
+    udid: str = Query(..., min_length=1, max_length=128),
+    db: AsyncSession = Depends(get_db),
+    _: User = Depends(require_admin),
+) -> UdidLookupOut:
+    """
+    Coupons reserved for / used by / certified for a UDID, with state, order
+    and certificate. The input is hashed and matched on indexed columns.
+    """
+    try:
+        items = await find_by_udid(db, udid=udid)
+    except CouponTraceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return UdidLookupOut(items=items)
+
+
 @router.get("/{coupon_code}", response_model=CouponTraceOut)
 async def admin_trace_coupon(
     coupon_code: str,
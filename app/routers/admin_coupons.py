@@ -7,22 +7,44 @@ from app.schemas.coupons import AdminCouponReserveRequest, AdminCouponFailReques
 from app.services.coupons import admin_reserve_coupon, admin_mark_coupon_failed
 
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy import select
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.db import get_db
 from app.core.deps import require_admin
 from app.models.coupon import Coupon
 from app.schemas.coupons import (
+    AdminCouponBatchGenerateRequest,
+    AdminCouponBatchOpRequest,
+    AdminCouponBatchOut,
+    AdminCouponBatchReserveRequest,
     AdminCouponGenerateRequest,
     AdminCouponResponse,
     AdminCouponUnreserveRequest,
     AdminCouponVoidRequest,
+    CouponBatchOpOut,
+    CouponInventoryOut,
+    CouponPageOut,
 )
+from app.services.coupon_batches import (
+    CouponBatchError,
+    admin_generate_coupon_batch,
+    get_coupon_batch,
+    iter_batch_codes,
+)
+from app.services.coupon_inventory import get_inventory, rebuild_inventory_counts
+from app.services.coupon_code_filter import coupon_code_filter
+from app.services.coupon_category_versions import backfill_coupon_category_versions, category_version_cache
+from app.services.coupon_owner_paths import backfill_coupon_owner_paths
+from app.services.coupon_pools import pool_enabled, pool_levels, refill_coupon_pools
+from app.services.coupon_transitions import admin_batch_reserve, admin_batch_transition
+from app.services.issuance_executor import issuance_executor
 from app.services.coupons import (
     admin_generate_coupons,
     admin_unreserve_coupon,
     admin_void_coupon,
+    list_coupon_rows,
+    list_coupons_page,
 )
 
 router = APIRouter(prefix="/admin/coupons", tags=["Admin - Coupons"])
@@ -47,6 +69,226 @@ async def generate_coupons(
 
 
 
+def _batch_out(batch) -> AdminCouponBatchOut:
+    return AdminCouponBatchOut(
+        batch_id=int(batch.id),
+        plan_id=int(batch.plan_id),
+        owner_user_id=int(batch.owner_user_id) if batch.owner_user_id is not None else None,
+        created_by_user_id=int(batch.created_by_user_id),
+        requested_count=int(batch.requested_count),
+        generated_count=int(batch.generated_count),
+        notes=batch.notes,
+        created_at=batch.created_at,
+        completed_at=batch.completed_at,
+        codes_download_url=f"/admin/coupons/batches/{int(batch.id)}/codes",
+    )
+
+
+@router.post("/batches", response_model=AdminCouponBatchOut)
+async def generate_coupon_batch(
+    body: AdminCouponBatchGenerateRequest,
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(require_admin),
+):
+    """
+    Bulk generation (COPY-based). Codes are not returned inline:
+    download them from codes_download_url.
+    """
+    batch = await admin_generate_coupon_batch(
+        db,
+        plan_id=body.plan_id,
+        count=body.count,
+        created_by_user_id=admin_user.id,
+        owner_user_id=admin_user.id,
+        notes=body.notes,
+    )
+    return _batch_out(batch)
+
+
+@router.get("/batches/{batch_id}", response_model=AdminCouponBatchOut)
+async def get_coupon_batch_info(
+    batch_id: int,
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(require_admin),
+):
+    try:
+        batch = await get_coupon_batch(db, batch_id=batch_id)
+    except CouponBatchError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return _batch_out(batch)
+
+
+@router.get("/batches/{batch_id}/codes")
+async def download_coupon_batch_codes(
+    batch_id: int,
+    format: str = Query(default="text", pattern="^(text|ndjson)$"),
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(require_admin),
+):
+    """Streamed code download, constant memory regardless of batch size."""
+    try:
+        batch = await get_coupon_batch(db, batch_id=batch_id)
+    except CouponBatchError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    if format == "ndjson":
+        media_type = "application/x-ndjson"
+        filename = f"coupon_batch_{int(batch.id)}.ndjson"
+    else:
+        media_type = "text/plain; charset=utf-8"
+        filename = f"coupon_batch_{int(batch.id)}.txt"
+
+    return StreamingResponse(
+        iter_batch_codes(batch_id=int(batch.id), fmt=format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/inventory", response_model=CouponInventoryOut)
+async def get_coupon_inventory(
+    owner_user_id: int | None = Query(default=None),
+    plan_id: int | None = Query(default=None),
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(require_admin),
+):
+    """Coupon counts per owner/plan/status from coupon_inventory_counts (no coupon scan)."""
+    items = await get_inventory(
+        db,
+        owner_user_ids=[int(owner_user_id)] if owner_user_id is not None else None,
+        plan_id=plan_id,
+    )
+    return {"items": items}
+
+
+@router.post("/inventory/rebuild")
+async def rebuild_coupon_inventory(
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(require_admin),
+):
+    """Recompute coupon_inventory_counts from coupons (backfill / repair)."""
+    rows = await rebuild_inventory_counts(db)
+    return {"ok": True, "rows": rows}
+
+
+@router.get("/code-filter")
+async def get_code_filter_stats(
+    admin_user=Depends(require_admin),
+):
+    """Bot-edge coupon code index: size, memory, rejections, measured false-positive rate."""
+    return coupon_code_filter.stats()
+
+
+@router.get("/issuance-stats")
+async def get_issuance_stats(
+    admin_user=Depends(require_admin),
+):
+    """Provider issuance executor: queue depth, in-flight, retries, circuit state, latency percentiles."""
+    return issuance_executor.stats()
+
+
+@router.get("/pools")
+async def get_coupon_pools(
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(require_admin),
+):
+    """Pre-minted pool size per plan (empty when pool mode is off)."""
+    return {"enabled": pool_enabled(), "items": await pool_levels(db)}
+
+
+@router.post("/pools/refill")
+async def refill_pools_now(
+    admin_user=Depends(require_admin),
+):
+    """Run the pool refill job now instead of waiting for the next tick."""
+    refilled = await refill_coupon_pools()
+    return {"ok": True, "refilled": {str(k): v for k, v in refilled.items()}}
+
+
+@router.post("/category-versions/backfill")
+async def backfill_category_versions(
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(require_admin),
+):
+    """Point coupons that only have a coupon_category_snapshot copy at a deduplicated category version."""
+    updated = await backfill_coupon_category_versions(db)
+    return {"ok": True, "updated": updated}
+
+
+@router.get("/category-versions/cache")
+async def get_category_version_cache_stats(
+    admin_user=Depends(require_admin),
+):
+    """Bot-side category version LRU: size, hits, misses."""
+    return category_version_cache.stats()
+
+
+@router.post("/owner-paths/backfill")
+async def backfill_owner_paths(
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(require_admin),
+):
+    """Fill coupons.owner_path / owner_bucket_depth1 for coupons minted before they existed."""
+    updated = await backfill_coupon_owner_paths(db)
+    return {"ok": True, "updated": updated}
+
+
+@router.post("/batch/void", response_model=CouponBatchOpOut)
+async def batch_void_coupons(
+    body: AdminCouponBatchOpRequest,
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(require_admin),
+):
+    """
+    Void many coupons in one statement. Rows locked by another transaction are
+    skipped (outcome "locked") instead of waited on.
+    """
+    return await admin_batch_transition(
+        db,
+        action="void",
+        actor_user_id=admin_user.id,
+        codes=body.coupon_codes,
+        plan_id=body.plan_id,
+        owner_user_id=body.owner_user_id,
+        generation_batch_id=body.generation_batch_id,
+        limit=body.limit,
+        reason=body.reason,
+    )
+
+
+@router.post("/batch/unreserve", response_model=CouponBatchOpOut)
+async def batch_unreserve_coupons(
+    body: AdminCouponBatchOpRequest,
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(require_admin),
+):
+    return await admin_batch_transition(
+        db,
+        action="unreserve",
+        actor_user_id=admin_user.id,
+        codes=body.coupon_codes,
+        plan_id=body.plan_id,
+        owner_user_id=body.owner_user_id,
+        generation_batch_id=body.generation_batch_id,
+        limit=body.limit,
+        reason=body.reason,
+    )
+
+
+@router.post("/batch/reserve", response_model=CouponBatchOpOut)
+async def batch_reserve_coupons(
+    body: AdminCouponBatchReserveRequest,
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(require_admin),
+):
+    return await admin_batch_reserve(
+        db,
+        items=[(it.coupon_code, it.udid) for it in body.items],
+        notes=body.notes,
+        actor_user_id=admin_user.id,
+    )
+
+
 @router.get("", response_model=list[AdminCouponResponse])
 async def list_coupons(
     status: str | None = Query(default=None),
@@ -55,17 +297,34 @@ async def list_coupons(
     db: AsyncSession = Depends(get_db),
     admin_user=Depends(require_admin),
 ):
-    stmt = select(Coupon).order_by(Coupon.created_at.desc())
+    return await list_coupon_rows(
+        db,
+        status=status,
+        plan_id=plan_id,
+        owner_user_ids=[int(owner_user_id)] if owner_user_id else None,
+        limit=500,
+    )
 
-    if status:
-        stmt = stmt.where(Coupon.status == status)
-    if plan_id:
-        stmt = stmt.where(Coupon.plan_id == plan_id)
-    if owner_user_id:
-        stmt = stmt.where(Coupon.owner_user_id == owner_user_id)
 
-    res = await db.execute(stmt.limit(500))
-    return res.scalars().all()
+@router.get("/page", response_model=CouponPageOut)
+async def list_coupons_paged(
+    status: str | None = Query(default=None),
+    plan_id: int | None = Query(default=None),
+    owner_user_id: int | None = Query(default=None),
+    cursor: str | None = Query(default=None),
+    limit: int = Query(default=100, ge=1, le=500),
+    db: AsyncSession = Depends(get_db),
+    admin_user=Depends(require_admin),
+):
+    """Keyset-paginated list: pass next_cursor back as ?cursor= for the next page."""
+    return await list_coupons_page(
+        db,
+        status=status,
+        plan_id=plan_id,
+        owner_user_ids=[int(owner_user_id)] if owner_user_id else None,
+        cursor=cursor,
+        limit=int(limit),
+    )
 
 
 @router.post("/{coupon_code}/unreserve", response_model=AdminCouponResponse)
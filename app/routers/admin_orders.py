@@ -4,6 +4,7 @@ from datetime import datetime
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.db import get_db
@@ -11,6 +12,7 @@ from app.core.deps import require_admin
 from app.models.user import User
 from app.schemas.orders import OrdersListOut, OrderOut
 from app.services.orders import OrdersError, get_order_by_order_no, list_orders
+from app.services.order_keys import OrderKeysError, get_order_for_keys, iter_order_keys
 
 
 router = APIRouter(prefix="/admin/orders", tags=["Admin Orders"])
@@ -55,3 +57,29 @@ async def admin_get_order(
         return OrderOut(**data)
     except OrdersError as e:
         raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/{order_no}/keys")
+async def admin_download_order_keys(
+    order_no: int,
+    format: str = Query(default="text", pattern="^(text|ndjson)$"),
+    db: AsyncSession = Depends(get_db),
+    _: User = Depends(require_admin),
+):
+    try:
+        order = await get_order_for_keys(db, order_no=order_no)
+    except OrderKeysError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    if format == "ndjson":
+        media_type = "application/x-ndjson"
+        filename = f"order_{order['order_no']}_keys.ndjson"
+    else:
+        media_type = "text/plain; charset=utf-8"
+        filename = f"order_{order['order_no']}_keys.txt"
+
+    return StreamingResponse(
+        iter_order_keys(order_id=int(order["order_id"]), fmt=format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -9,6 +9,7 @@ from app.core.db import get_db
 from app.core.deps import require_admin
 from app.models.plan import Plan
 from app.schemas.plans import PlanCreate, PlanOut, PlanUpdate
+from app.services.pricing_cache import notify_pricing_changed
 
 router = APIRouter(prefix="/admin/plans", tags=["Admin - Plans"])
 
@@ -90,6 +91,8 @@ async def update_plan(
         plan.provider_api_params = body.provider_api_params or {}
 
     try:
+        # cached seller plan lists carry title/code/is_active
+        await notify_pricing_changed(db)
         await db.commit()
         await db.refresh(plan)
         return plan
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.db import get_db
@@ -6,10 +6,16 @@ from app.core.deps import get_current_user, require_admin
 from app.schemas.pricing import (
     AdminBasePriceOut,
     AdminBasePriceUpsertIn,
+    AdminEdgePriceBulkUpsertIn,
     AdminEdgePriceUpsertIn,
+    EdgePriceBulkUpsertOut,
     EdgePriceOut,
+    MarginViolationsOut,
 )
+from app.services.pricing_cache import pricing_cache
+from app.services.margin_violations import find_margin_violations, preview_edge_price_change
 from app.services.pricing import (
+    bulk_upsert_edge_prices_admin_override,
     admin_get_base_price,
     admin_list_base_prices,
     admin_upsert_base_price,
@@ -66,3 +72,57 @@ async def upsert_admin_edge_override(
         currency=payload.currency,
     )
     return row
+
+
+@router.put("/edge-override/bulk", response_model=EdgePriceBulkUpsertOut, dependencies=[Depends(require_admin)])
+async def bulk_upsert_admin_edge_overrides(
+    payload: AdminEdgePriceBulkUpsertIn,
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    return await bulk_upsert_edge_prices_admin_override(
+        db,
+        admin_user_id=current_user.id,
+        items=[(i.parent_user_id, i.child_user_id, i.plan_id, i.price_cents, i.currency) for i in payload.items],
+    )
+
+
+@router.post("/edge-override/preview", response_model=MarginViolationsOut, dependencies=[Depends(require_admin)])
+async def preview_admin_edge_override(
+    payload: AdminEdgePriceUpsertIn,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Dry run: downstream edges that would end up below their parent's cost if
+    this override were applied. Nothing is written.
+    """
+    items = await preview_edge_price_change(
+        db,
+        parent_user_id=payload.parent_user_id,
+        child_user_id=payload.child_user_id,
+        plan_id=payload.plan_id,
+        price_cents=payload.price_cents,
+    )
+    return {"items": items, "total": len(items)}
+
+
+@router.get("/margin-violations", response_model=MarginViolationsOut, dependencies=[Depends(require_admin)])
+async def list_margin_violations(
+    plan_id: int | None = Query(default=None),
+    limit: int = Query(default=1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    items = await find_margin_violations(
+        db,
+        root_path=str(current_user.path) if current_user.path else None,
+        plan_id=plan_id,
+        limit=limit,
+    )
+    return {"items": items, "total": len(items)}
+
+
+@router.get("/cache-stats", dependencies=[Depends(require_admin)])
+async def get_pricing_cache_stats():
+    # per-worker numbers (each process has its own cache)
+    return pricing_cache.stats()
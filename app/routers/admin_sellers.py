@@ -2,13 +2,12 @@
 from __future__ import annotations
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select, delete
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.db import get_db
 from app.core.deps import require_admin
 from app.models.plan import Plan
-from app.models.pricing import SellerEdgePlanPrice
 from app.models.seller_plan_price import SellerPlanPrice
 from app.models.user import User
 from app.models.wallet import WalletAccount
@@ -23,6 +22,8 @@ from app.schemas.admin_sellers import (
     AdminDeleteSellerIn,
 )
 
+from app.services.pricing import determine_parent_costs
+from app.services.plan_price_sync import sync_edge_prices, sync_seller_plan_prices
 from app.services.tree import create_user_under_parent
 from app.services.wallet import (
     admin_set_balance_via_parent,
@@ -34,42 +35,6 @@ from app.services.wallet import (
 router = APIRouter(prefix="/admin", tags=["admin-sellers"])
 
 
-async def _sync_edge_prices_full_replace(
-    db: AsyncSession,
-    *,
-    parent_user_id: int,
-    child_user_id: int,
-    plan_prices: list[tuple[int, int]],  # [(plan_id, price_cents)]
-    updated_by_user_id: int,
-    currency: str = "USD",
-) -> None:
-    """
-    Ensure seller_edge_plan_prices has exactly one row per (parent, child, plan)
-    matching the child's assigned plan prices (full replace).
-    """
-    # delete all existing edges for this parent->child
-    await db.execute(
-        delete(SellerEdgePlanPrice).where(
-            SellerEdgePlanPrice.parent_user_id == int(parent_user_id),
-            SellerEdgePlanPrice.child_user_id == int(child_user_id),
-        )
-    )
-
-    # insert fresh edges
-    for plan_id, price_cents in plan_prices:
-        db.add(
-            SellerEdgePlanPrice(
-                parent_user_id=int(parent_user_id),
-                child_user_id=int(child_user_id),
-                plan_id=int(plan_id),
-                price_cents=int(price_cents),
-                currency=currency,
-                updated_by_user_id=int(updated_by_user_id),
-                # is_admin_override defaults false in DB
-            )
-        )
-
-
 @router.post("/sellers", response_model=AdminSellerOut)
 async def admin_create_seller(
     payload: AdminCreateSellerRequest,
@@ -118,15 +83,10 @@ async def admin_create_seller(
         db.add(WalletAccount(user_id=int(user.id), balance_cents=0, currency="USD"))
         await db.flush()
 
-        # Parent price rule (only if parent has a record for that plan)
+        # Parent price rule (only if parent has a cost for that plan)
         if payload.plans:
-            parent_prices_res = await db.execute(
-                select(SellerPlanPrice).where(
-                    SellerPlanPrice.seller_id == int(parent.id),
-                    SellerPlanPrice.plan_id.in_(plan_ids),
-                )
-            )
-            parent_prices = {int(r.plan_id): int(r.price_cents) for r in parent_prices_res.scalars().all()}
+            parent_costs = await determine_parent_costs(db, int(parent.id), plan_ids)
+            parent_prices = {pid: int(c.parent_cost_cents) for pid, c in parent_costs.items()}
 
             for pp in payload.plans:
                 pid = int(pp.plan_id)
@@ -148,7 +108,7 @@ async def admin_create_seller(
                 )
 
             # ✅ CRITICAL FIX: create edge rows parent->child for the same plans
-            await _sync_edge_prices_full_replace(
+            await sync_edge_prices(
                 db,
                 parent_user_id=int(parent.id),
                 child_user_id=int(user.id),
@@ -300,7 +260,9 @@ async def admin_update_seller(
         if payload.role is not None:
             seller.role = payload.role.value
 
-        # plans: full replace if provided
+        # plans: full replace if provided (applied as a diff)
+        plan_changes = None
+        edge_changes = None
         if payload.plans is not None:
             plan_ids = [int(p.plan_id) for p in payload.plans]
             if len(plan_ids) != len(set(plan_ids)):
@@ -323,15 +285,10 @@ async def admin_update_seller(
 
             parent_id = int(seller.parent_id) if seller.parent_id is not None else int(admin_user.id)
 
-            # parent price rule (only if parent has a record)
+            # parent price rule (only if parent has a cost for that plan)
             if plan_ids:
-                parent_prices_res = await db.execute(
-                    select(SellerPlanPrice).where(
-                        SellerPlanPrice.seller_id == int(parent_id),
-                        SellerPlanPrice.plan_id.in_(plan_ids),
-                    )
-                )
-                parent_prices = {int(r.plan_id): int(r.price_cents) for r in parent_prices_res.scalars().all()}
+                parent_costs = await determine_parent_costs(db, int(parent_id), plan_ids)
+                parent_prices = {pid: int(c.parent_cost_cents) for pid, c in parent_costs.items()}
 
                 for pp in payload.plans:
                     pid = int(pp.plan_id)
@@ -341,24 +298,15 @@ async def admin_update_seller(
                             detail=f"Plan {pid} price_cents must be >= parent price ({parent_prices[pid]})",
                         )
 
-            # FULL replace SellerPlanPrice rows
-            await db.execute(delete(SellerPlanPrice).where(SellerPlanPrice.seller_id == int(seller.id)))
-            for pp in payload.plans:
-                db.add(
-                    SellerPlanPrice(
-                        seller_id=int(seller.id),
-                        plan_id=int(pp.plan_id),
-                        price_cents=int(pp.price_cents),
-                        currency="USD",
-                    )
-                )
+            # Make SellerPlanPrice + edge rows match the payload, writing only the delta
+            plan_prices = [(int(pp.plan_id), int(pp.price_cents)) for pp in payload.plans]
+            plan_changes = await sync_seller_plan_prices(db, seller_id=int(seller.id), plan_prices=plan_prices)
 
-            # ✅ CRITICAL FIX: full replace edge rows too
-            await _sync_edge_prices_full_replace(
+            edge_changes = await sync_edge_prices(
                 db,
                 parent_user_id=int(parent_id),
                 child_user_id=int(seller.id),
-                plan_prices=[(int(pp.plan_id), int(pp.price_cents)) for pp in payload.plans],
+                plan_prices=plan_prices,
                 updated_by_user_id=int(admin_user.id),
                 currency="USD",
             )
@@ -421,6 +369,8 @@ async def admin_update_seller(
             balance_cents=int(r.balance_cents) if r.balance_cents is not None else 0,
             currency=r.currency or "USD",
             plans=prices,
+            plan_changes=plan_changes,
+            edge_changes=edge_changes,
         )
 
     except HTTPException:
@@ -1,29 +1,83 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from app.core.config import settings
 from app.core.db import get_db
 from app.models.coupon import Coupon
-from app.integrations.geek_api_client import GeekApiClient
+from app.schemas.coupons import BotBulkIssueRequest
+from app.services.bot_issuance import (
+    issue_coupon_for_udid,
+    iter_bulk_issuance,
+    load_category_snapshot,
+    reserve_bulk_issuance,
+)
+from app.services.coupon_code_filter import coupon_code_filter
+from app.services.issuance_executor import IssuanceExecutor, get_issuance_executor
 
 router = APIRouter(prefix="/bot/coupons", tags=["Bot Coupons"])
 
 
+@router.post("/issue/bulk")
+async def issue_coupons_bulk(
+    payload: BotBulkIssueRequest,
+    db: AsyncSession = Depends(get_db),
+    executor: IssuanceExecutor = Depends(get_issuance_executor),
+):
+    """
+    Issue many (coupon_code, udid) pairs: all reserved in one statement, provider
+    calls run concurrently, one NDJSON result line per pair as each finishes.
+    """
+    rejected, reserved = await reserve_bulk_issuance(
+        db,
+        items=[(item.coupon_code, item.udid) for item in payload.items],
+        note=payload.note,
+    )
+
+    return StreamingResponse(
+        iter_bulk_issuance(
+            rejected=rejected,
+            reserved=reserved,
+            executor=executor,
+            note=payload.note,
+            concurrency=settings.BOT_BULK_ISSUE_CONCURRENCY,
+        ),
+        media_type="application/x-ndjson",
+    )
+
+
 @router.get("/{coupon_code}")
 async def get_coupon_info(
     coupon_code: str,
     db: AsyncSession = Depends(get_db),
 ):
+    # unknown codes (typos / guesses) never reach Postgres
+    if not coupon_code_filter.might_exist(coupon_code):
+        raise HTTPException(status_code=404, detail="Coupon not found")
+
+    # columns only: no ORM object, no selectin load of the plan
     result = await db.execute(
-        select(Coupon).where(Coupon.code == coupon_code)
+        select(
+            Coupon.status,
+            Coupon.plan_id,
+            Coupon.coupon_category_id,
+            Coupon.coupon_category_version_id,
+        ).where(Coupon.coupon_code == coupon_code)
     )
-    coupon = result.scalar_one_or_none()
+    coupon = result.first()
 
     if not coupon:
+        coupon_code_filter.record_miss()
         raise HTTPException(status_code=404, detail="Coupon not found")
 
     return {
         "status": coupon.status,
-        "category": coupon.coupon_category_snapshot,
+        "category": await load_category_snapshot(
+            db,
+            coupon_category_version_id=coupon.coupon_category_version_id,
+            coupon_category_id=coupon.coupon_category_id,
+            plan_id=int(coupon.plan_id),
+        ),
     }
 
 
@@ -33,30 +87,17 @@ async def issue_coupon(
     udid: str,
     note: str | None = None,
     db: AsyncSession = Depends(get_db),
+    executor: IssuanceExecutor = Depends(get_issuance_executor),
 ):
-    result = await db.execute(
-        select(Coupon).where(Coupon.code == coupon_code)
-    )
-    coupon = result.scalar_one_or_none()
-
-    if not coupon:
+    # unknown codes (typos / guesses) never reach Postgres
+    if not coupon_code_filter.might_exist(coupon_code):
         raise HTTPException(status_code=404, detail="Coupon not found")
 
-    if coupon.status != "new":
-        raise HTTPException(status_code=400, detail="Already used")
-
-    snapshot = coupon.coupon_category_snapshot
-    client = GeekApiClient()
-
-    response = await client.issue_device(
+    # reserve (CAS) -> provider call outside any transaction -> used + certificate
+    return await issue_coupon_for_udid(
+        db,
+        executor,
+        coupon_code=coupon_code,
         udid=udid,
-        issue_mode=snapshot["issue_mode"],
-        pool_type=snapshot["pool_type"],
-        warranty=snapshot["warranty"],
         note=note,
     )
-
-    coupon.status = "used"
-    await db.commit()
-
-    return response
\ No newline at end of file
@@ -27,7 +27,10 @@ async def purchase_plan(
             plan_id=payload.plan_id,
             quantity=payload.quantity,
             note=payload.note,
+            include_keys=payload.keys_delivery == "inline",
         )
+        if result["keys_delivery"] == "deferred":
+            result["keys_download_url"] = f"/sellers/orders/{result['order_no']}/keys"
         return PurchaseOut(**result)
     except InsufficientBalance as e:
         raise HTTPException(status_code=400, detail=str(e))
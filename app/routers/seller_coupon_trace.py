@@ -41,41 +41,39 @@ async def seller_trace_coupon(
     - Coupon lookup by coupon_code (not Coupon.id).
     """
 
-    # 1) Load coupon by coupon_code
+    # 1) Load coupon by coupon_code (+ owner username in the same query)
     res = await db.execute(
-        select(Coupon).where(Coupon.coupon_code == str(coupon_code))
+        select(Coupon, User.username)
+        .outerjoin(User, User.id == Coupon.owner_user_id)
+        .where(Coupon.coupon_code == str(coupon_code))
     )
-    coupon = res.scalar_one_or_none()
-    if not coupon:
+    row = res.first()
+    if not row:
         raise HTTPException(status_code=404, detail="Coupon not found")
+    coupon, owner_username = row
 
     owner_user_id = int(getattr(coupon, "owner_user_id", 0) or 0)
-    if owner_user_id <= 0:
-        # If your schema allows null owner, fallback to created_by_user_id for scoping
-        owner_user_id = int(getattr(coupon, "created_by_user_id", 0) or 0)
+    owner_path = str(coupon.owner_path) if coupon.owner_path else None
+    seller_path = str(current_seller.path)
 
-    if owner_user_id <= 0:
-        raise HTTPException(status_code=400, detail="Coupon missing owner_user_id")
+    if owner_user_id <= 0 or owner_path is None:
+        # No owner (fallback to created_by_user_id for scoping) or a coupon
+        # written before owner_path existed: resolve the path from users.
+        if owner_user_id <= 0:
+            owner_user_id = int(getattr(coupon, "created_by_user_id", 0) or 0)
+        if owner_user_id <= 0:
+            raise HTTPException(status_code=400, detail="Coupon missing owner_user_id")
+
+        owner_res = await db.execute(select(User).where(User.id == owner_user_id))
+        owner = owner_res.scalar_one_or_none()
+        if not owner:
+            raise HTTPException(status_code=400, detail="Coupon owner user not found")
+        owner_path = str(owner.path)
+        owner_username = owner.username
 
     # 2) Enforce subtree scope: owner must be in seller subtree (including self)
-    # users.path is ltree, so we check: owner.path <@ seller.path
-    owner_res = await db.execute(select(User).where(User.id == owner_user_id))
-    owner = owner_res.scalar_one_or_none()
-    if not owner:
-        raise HTTPException(status_code=400, detail="Coupon owner user not found")
-
-    seller_path = str(current_seller.path)
-    owner_path = str(owner.path)
-
-    # owner must be inside seller subtree
-    # "owner_path <@ seller_path"
-    # Using SQL to be correct with ltree operator
-    scope_check = await db.execute(
-        select(User.id)
-        .where(User.id == int(owner_user_id))
-        .where(User.path.op("<@")(seller_path))
-    )
-    if scope_check.scalar_one_or_none() is None:
+    # ltree "owner_path <@ seller_path" == same labels or seller_path + "." prefix
+    if owner_path != seller_path and not owner_path.startswith(seller_path + "."):
         raise HTTPException(status_code=403, detail="Forbidden: coupon not in your subtree")
 
     # 3) Base response
@@ -86,7 +84,7 @@ async def seller_trace_coupon(
         "created_at": getattr(coupon, "created_at", None),
         "created_by_user_id": int(getattr(coupon, "created_by_user_id", 0) or 0),
         "owner_user_id": int(getattr(coupon, "owner_user_id", 0) or 0),
-        "owner_username": owner.username,
+        "owner_username": owner_username,
         "owner_path": owner_path,
         "events": [],
     }
@@ -6,8 +6,21 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.db import get_db
 from app.core.deps import require_seller
 from app.models.user import User
-from app.schemas.coupons import AdminCouponResponse, SellerCouponGenerateRequest
-from app.services.coupons import seller_generate_coupons, seller_list_coupons
+from app.schemas.coupons import (
+    AdminCouponResponse,
+    CouponInventoryOut,
+    CouponPageOut,
+    SellerCouponGenerateRequest,
+    SellerCouponOrderOut,
+    SellerCouponOrderRequest,
+)
+from app.services.coupons import (
+    seller_coupon_inventory,
+    seller_generate_coupons,
+    seller_generate_coupons_deferred,
+    seller_list_coupons,
+    seller_list_coupons_page,
+)
 
 router = APIRouter(prefix="/sellers/coupons", tags=["Seller - Coupons"])
 
@@ -38,6 +51,26 @@ async def generate_coupons(
     )
 
 
+@router.post("/orders", response_model=SellerCouponOrderOut)
+async def generate_coupons_deferred(
+    body: SellerCouponOrderRequest,
+    db: AsyncSession = Depends(get_db),
+    seller_user: User = Depends(require_seller),
+):
+    """
+    Large paid coupon generation: returns the order number immediately.
+    Keys are downloaded as a stream from keys_download_url (text or NDJSON).
+    """
+    return await seller_generate_coupons_deferred(
+        db,
+        plan_id=body.plan_id,
+        count=body.count,
+        seller_user_id=int(seller_user.id),
+        owner_user_id=body.owner_user_id,
+        notes=body.notes,
+    )
+
+
 @router.get("", response_model=list[AdminCouponResponse])
 async def list_coupons(
     status: str | None = Query(default=None),
@@ -56,4 +89,43 @@ async def list_coupons(
         owner_user_id=owner_user_id,
         limit=int(limit),
         offset=int(offset),
-    )
\ No newline at end of file
+    )
+
+
+@router.get("/page", response_model=CouponPageOut)
+async def list_coupons_paged(
+    status: str | None = Query(default=None),
+    plan_id: int | None = Query(default=None),
+    owner_user_id: int | None = Query(default=None),
+    limit: int = Query(default=10, ge=1, le=200),
+    cursor: str | None = Query(default=None),
+    db: AsyncSession = Depends(get_db),
+    seller_user: User = Depends(require_seller),
+):
+    """Keyset-paginated list: pass next_cursor back as ?cursor= for the next page."""
+    return await seller_list_coupons_page(
+        db,
+        seller_user_id=int(seller_user.id),
+        status=status,
+        plan_id=plan_id,
+        owner_user_id=owner_user_id,
+        limit=int(limit),
+        cursor=cursor,
+    )
+
+
+@router.get("/inventory", response_model=CouponInventoryOut)
+async def get_coupon_inventory(
+    owner_user_id: int | None = Query(default=None),
+    plan_id: int | None = Query(default=None),
+    db: AsyncSession = Depends(get_db),
+    seller_user: User = Depends(require_seller),
+):
+    """Coupon counts per owner/plan/status for self + direct children."""
+    items = await seller_coupon_inventory(
+        db,
+        seller_user_id=int(seller_user.id),
+        owner_user_id=owner_user_id,
+        plan_id=plan_id,
+    )
+    return {"items": items}
@@ -4,6 +4,7 @@ from datetime import datetime
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.db import get_db
@@ -11,6 +12,7 @@ from app.core.deps import get_current_user
 from app.models.user import User
 from app.schemas.orders import OrdersListOut, OrderOut
 from app.services.orders import OrdersError, get_order_by_order_no, list_orders
+from app.services.order_keys import OrderKeysError, get_order_for_keys, iter_order_keys
 
 
 router = APIRouter(prefix="/sellers/orders", tags=["Seller Orders"])
@@ -56,3 +58,37 @@ async def seller_get_order(
         return OrderOut(**data)
     except OrdersError as e:
         raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/{order_no}/keys")
+async def seller_download_order_keys(
+    order_no: int,
+    format: str = Query(default="text", pattern="^(text|ndjson)$"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Streamed key download for an order (used by deferred key delivery).
+    Constant memory regardless of order size: rows are paged from order_items
+    with a server-side cursor.
+    """
+    try:
+        order = await get_order_for_keys(db, order_no=order_no)
+    except OrderKeysError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    if int(order["buyer_user_id"]) != int(current_user.id):
+        raise HTTPException(status_code=403, detail="Not allowed.")
+
+    if format == "ndjson":
+        media_type = "application/x-ndjson"
+        filename = f"order_{order['order_no']}_keys.ndjson"
+    else:
+        media_type = "text/plain; charset=utf-8"
+        filename = f"order_{order['order_no']}_keys.txt"
+
+    return StreamingResponse(
+        iter_order_keys(order_id=int(order["order_id"]), fmt=format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
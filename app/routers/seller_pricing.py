@@ -1,13 +1,32 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.db import get_db
 from app.core.deps import get_current_user
-from app.schemas.pricing import EdgePriceOut, ParentCostOut, SellerEdgePriceUpsertIn
+from app.schemas.pricing import (
+    EdgePriceBulkUpsertOut,
+    EdgePriceOut,
+    MarginViolationsOut,
+    ParentCostOut,
+    PriceMatrixPageOut,
+    SellerEdgePriceBulkUpsertIn,
+    SellerEdgePriceUpsertIn,
+)
+from app.services.margin_violations import preview_edge_price_change
+from app.services.price_matrix import (
+    PriceMatrixCursorError,
+    PriceMatrixError,
+    get_subtree_root_path,
+    iter_price_matrix,
+    list_edges_within_subtree,
+    list_price_matrix_page,
+)
 from app.services.pricing import (
+    bulk_upsert_edge_prices_seller,
     determine_parent_cost,
+    ensure_child_is_direct,
     list_edges_for_parent,
-    list_edges_within_subtree,
     upsert_edge_price_seller,
 )
 
@@ -47,6 +66,40 @@ async def upsert_price_for_direct_child(
     return row
 
 
+@router.post("/edge/preview", response_model=MarginViolationsOut)
+async def preview_price_for_direct_child(
+    payload: SellerEdgePriceUpsertIn,
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Dry run before PUT /edge: edges below the child that would fall under
+    their parent's cost with this price. Nothing is written.
+    """
+    await ensure_child_is_direct(db, current_user.id, payload.child_user_id)
+    items = await preview_edge_price_change(
+        db,
+        parent_user_id=current_user.id,
+        child_user_id=payload.child_user_id,
+        plan_id=payload.plan_id,
+        price_cents=payload.price_cents,
+    )
+    return {"items": items, "total": len(items)}
+
+
+@router.put("/edges/bulk", response_model=EdgePriceBulkUpsertOut)
+async def bulk_upsert_prices_for_direct_children(
+    payload: SellerEdgePriceBulkUpsertIn,
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    return await bulk_upsert_edge_prices_seller(
+        db,
+        current_user_id=current_user.id,
+        items=[(i.child_user_id, i.plan_id, i.price_cents, i.currency) for i in payload.items],
+    )
+
+
 @router.get("/direct-children", response_model=list[EdgePriceOut])
 async def list_prices_for_my_direct_children(
     plan_id: int | None = Query(default=None),
@@ -62,5 +115,60 @@ async def list_prices_within_my_subtree(
     db: AsyncSession = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    return await list_edges_within_subtree(db, root_user_id=current_user.id, plan_id=plan_id)
+    """Every edge of my subtree in one response; large subtrees should use /subtree/page or /subtree/export."""
+    try:
+        root_path = await get_subtree_root_path(db, root_user_id=current_user.id)
+    except PriceMatrixError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return await list_edges_within_subtree(db, root_path=root_path, plan_id=plan_id)
+
+
+@router.get("/subtree/page", response_model=PriceMatrixPageOut)
+async def list_prices_within_my_subtree_page(
+    plan_id: int | None = Query(default=None),
+    cursor: str | None = Query(default=None),
+    limit: int = Query(default=500, ge=1, le=2000),
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Keyset-paginated price matrix of my subtree (edges whose parent is me or
+    below me). Pass next_cursor back as `cursor` to get the following page.
+    """
+    try:
+        root_path = await get_subtree_root_path(db, root_user_id=current_user.id)
+        return await list_price_matrix_page(db, root_path=root_path, plan_id=plan_id, cursor=cursor, limit=limit)
+    except PriceMatrixCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PriceMatrixError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
 
+@router.get("/subtree/export")
+async def export_prices_within_my_subtree(
+    format: str = Query(default="csv", pattern="^(csv|ndjson)$"),
+    plan_id: int | None = Query(default=None),
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """
+    Whole subtree price matrix as a streamed CSV/NDJSON download.
+    Constant memory regardless of subtree size (server-side cursor).
+    """
+    try:
+        root_path = await get_subtree_root_path(db, root_user_id=current_user.id)
+    except PriceMatrixError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    if format == "ndjson":
+        media_type = "application/x-ndjson"
+        filename = f"price_matrix_{current_user.id}.ndjson"
+    else:
+        media_type = "text/csv; charset=utf-8"
+        filename = f"price_matrix_{current_user.id}.csv"
+
+    return StreamingResponse(
+        iter_price_matrix(root_path=root_path, plan_id=plan_id, fmt=format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select, delete
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 
@@ -24,6 +24,9 @@ from app.schemas.seller_users_management import (
     SellerSetChildBalanceIn,
     SellerDeleteChildIn,
 )
+from app.services.plan_price_sync import sync_edge_prices, sync_seller_plan_prices
+from app.services.pricing import determine_parent_costs
+from app.services.pricing_cache import notify_pricing_changed
 from app.services.tree import create_user_under_parent
 from app.services.wallet import (
     seller_set_balance_via_parent,
@@ -48,22 +51,6 @@ async def _get_direct_child_or_404(db: AsyncSession, *, seller_id: int, child_id
     return child
 
 
-async def _seller_allowed_plan_prices(db: AsyncSession, seller_id: int, plan_ids: list[int]) -> dict[int, int]:
-    """
-    Returns {plan_id: seller_price_cents} for plans the seller currently has in seller_plan_prices.
-    """
-    if not plan_ids:
-        return {}
-    res = await db.execute(
-        select(SellerPlanPrice).where(
-            SellerPlanPrice.seller_id == int(seller_id),
-            SellerPlanPrice.plan_id.in_(plan_ids),
-        )
-    )
-    rows = res.scalars().all()
-    return {int(r.plan_id): int(r.price_cents) for r in rows}
-
-
 @router.get("", response_model=SellerChildSellerListResponse)
 async def seller_list_direct_children(
     db: AsyncSession = Depends(get_db),
@@ -192,15 +179,15 @@ async def seller_create_direct_child_seller(
                 raise HTTPException(status_code=400, detail=f"Inactive plan_id(s): {inactive}")
 
         # 5) Seller can only assign plans they already have; child price >= seller price
-        seller_prices = await _seller_allowed_plan_prices(db, int(seller_user.id), plan_ids)
+        seller_costs = await determine_parent_costs(db, int(seller_user.id), plan_ids)
         if plan_ids:
-            not_owned = [pid for pid in plan_ids if pid not in seller_prices]
+            not_owned = [pid for pid in plan_ids if pid not in seller_costs]
             if not_owned:
                 raise HTTPException(status_code=400, detail=f"Forbidden plan_id(s): {not_owned}")
 
             for pp in payload.plans:
                 pid = int(pp.plan_id)
-                seller_price = int(seller_prices[pid])
+                seller_price = int(seller_costs[pid].parent_cost_cents)
                 if int(pp.price_cents) < seller_price:
                     raise HTTPException(
                         status_code=400,
@@ -232,6 +219,8 @@ async def seller_create_direct_child_seller(
                     updated_by_user_id=int(seller_user.id),
                 )
             )
+        if payload.plans:
+            await notify_pricing_changed(db)
 
         await db.commit()
         await db.refresh(child)
@@ -306,7 +295,9 @@ async def seller_update_direct_child_seller(
         if payload.is_active is not None:
             child.is_active = payload.is_active
 
-        # plans full replace (same as admin)
+        # plans full replace (same as admin, applied as a diff)
+        plan_changes = None
+        edge_changes = None
         if payload.plans is not None:
             plan_ids = [int(p.plan_id) for p in payload.plans]
             if len(plan_ids) != len(set(plan_ids)):
@@ -327,74 +318,32 @@ async def seller_update_direct_child_seller(
                     raise HTTPException(status_code=400, detail=f"Inactive plan_id(s): {inactive}")
 
             # seller can only assign plans they have; and child price >= seller price
-            seller_prices = await _seller_allowed_plan_prices(db, int(seller_user.id), plan_ids)
+            seller_costs = await determine_parent_costs(db, int(seller_user.id), plan_ids)
             if plan_ids:
-                not_owned = [pid for pid in plan_ids if pid not in seller_prices]
+                not_owned = [pid for pid in plan_ids if pid not in seller_costs]
                 if not_owned:
                     raise HTTPException(status_code=400, detail=f"Forbidden plan_id(s): {not_owned}")
 
                 for pp in payload.plans:
                     pid = int(pp.plan_id)
-                    seller_price = int(seller_prices[pid])
+                    seller_price = int(seller_costs[pid].parent_cost_cents)
                     if int(pp.price_cents) < seller_price:
                         raise HTTPException(
                             status_code=400,
                             detail=f"Plan {pid} price_cents must be >= your price ({seller_price})",
                         )
 
-            # fetch existing
-            existing_res = await db.execute(
-                select(SellerPlanPrice).where(SellerPlanPrice.seller_id == int(child.id))
-            )
-            existing = existing_res.scalars().all()
-            existing_by_plan = {int(r.plan_id): r for r in existing}
-            incoming_by_plan = {int(p.plan_id): p for p in payload.plans}
-
-            # delete removed
-            removed = [pid for pid in existing_by_plan.keys() if pid not in incoming_by_plan]
-            if removed:
-                await db.execute(
-                    delete(SellerPlanPrice).where(
-                        SellerPlanPrice.seller_id == int(child.id),
-                        SellerPlanPrice.plan_id.in_(removed),
-                    )
-                )
-
-            # update existing, insert new
-            for pid, pp in incoming_by_plan.items():
-                row = existing_by_plan.get(pid)
-                if row:
-                    row.price_cents = int(pp.price_cents)
-                else:
-                    db.add(
-                        SellerPlanPrice(
-                            seller_id=int(child.id),
-                            plan_id=int(pid),
-                            price_cents=int(pp.price_cents),
-                            currency="USD",
-                        )
-                    )
-
-            # ✅ FIX: keep edge pricing in sync with child plan prices
-            # easiest + safest: replace all edges for this parent->child
-            await db.execute(
-                delete(SellerEdgePlanPrice).where(
-                    SellerEdgePlanPrice.parent_user_id == int(seller_user.id),
-                    SellerEdgePlanPrice.child_user_id == int(child.id),
-                )
+            # keep SellerPlanPrice + edge rows in sync with the payload, writing only the delta
+            plan_prices = [(int(pp.plan_id), int(pp.price_cents)) for pp in payload.plans]
+            plan_changes = await sync_seller_plan_prices(db, seller_id=int(child.id), plan_prices=plan_prices)
+            edge_changes = await sync_edge_prices(
+                db,
+                parent_user_id=int(seller_user.id),
+                child_user_id=int(child.id),
+                plan_prices=plan_prices,
+                updated_by_user_id=int(seller_user.id),
+                currency="USD",
             )
-            for pp in payload.plans:
-                db.add(
-                    SellerEdgePlanPrice(
-                        parent_user_id=int(seller_user.id),
-                        child_user_id=int(child.id),
-                        plan_id=int(pp.plan_id),
-                        price_cents=int(pp.price_cents),
-                        currency="USD",
-                        is_admin_override=False,
-                        updated_by_user_id=int(seller_user.id),
-                    )
-                )
 
         await db.commit()
         await db.refresh(child)
@@ -435,6 +384,8 @@ async def seller_update_direct_child_seller(
             balance_cents=int(wa.balance_cents) if wa else 0,
             currency=wa.currency if wa else "USD",
             plans=out_plans,
+            plan_changes=plan_changes,
+            edge_changes=edge_changes,
         )
 
     except IntegrityError:
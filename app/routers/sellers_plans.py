@@ -9,7 +9,8 @@ from app.core.deps import require_seller
 from app.models.plan import Plan
 from app.models.seller_plan_price import SellerPlanPrice
 from app.models.user import User
-from app.schemas.plans import PlanOut
+from app.schemas.plans import PlanOut, SellerEnabledPlanOut
+from app.services.seller_plans import get_seller_plan_costs
 
 router = APIRouter(prefix="/sellers/plans", tags=["Seller - Plans"])
 
@@ -32,4 +33,28 @@ async def get_available_plans(
     )
 
     res = await db.execute(stmt)
-    return res.scalars().all()
\ No newline at end of file
+    return res.scalars().all()
+
+
+@router.get("/enabled", response_model=list[SellerEnabledPlanOut])
+async def get_enabled_plans_with_cost(
+    db: AsyncSession = Depends(get_db),
+    seller_user: User = Depends(require_seller),
+):
+    """
+    Plans I can pass down to my children (incoming edge price exists) and
+    what each one costs me. Cached per seller; invalidated by pricing writes.
+    """
+    costs = await get_seller_plan_costs(db, seller_user_id=int(seller_user.id))
+    return [
+        SellerEnabledPlanOut(
+            plan_id=c.plan_id,
+            category=c.category,
+            code=c.code,
+            title=c.title,
+            cost_cents=c.cost_cents,
+            currency=c.currency,
+        )
+        for c in costs.values()
+        if c.is_active
+    ]
@@ -32,6 +32,14 @@ class AdminCreateSellerRequest(BaseModel):
     plans: list[SellerPlanPriceIn] = Field(default_factory=list)
 
 
+class PlanPriceDiffOut(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    inserted: list[int]
+    updated: list[int]
+    deleted: list[int]
+
+
 class SellerPlanPriceOut(BaseModel):
     model_config = ConfigDict(extra="forbid")
 
@@ -62,6 +70,10 @@ class AdminSellerOut(BaseModel):
 
     plans: list[SellerPlanPriceOut]
 
+    # only on update with `plans`: plan ids actually written (diff sync)
+    plan_changes: PlanPriceDiffOut | None = None
+    edge_changes: PlanPriceDiffOut | None = None
+
 
 class AdminSellerListResponse(BaseModel):
     model_config = ConfigDict(extra="forbid")
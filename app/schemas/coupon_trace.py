@@ -53,3 +53,32 @@ class CouponTraceOut(BaseModel):
 
     # optional timeline for dashboard
     events: list[CouponTraceEventOut] = Field(default_factory=list)
+
+
+class UdidLookupItemOut(BaseModel):
+    coupon_code: str
+    status: str
+    plan_id: int
+    plan_title: str = ""
+    owner_user_id: Optional[int] = None
+
+    # which link matched: "reserved" | "used" | "certificate"
+    matched_on: list[str] = Field(default_factory=list)
+
+    reserved_udid_suffix: Optional[str] = None
+    reserved_at: Optional[datetime] = None
+    used_udid_suffix: Optional[str] = None
+    used_at: Optional[datetime] = None
+    last_failure_reason: Optional[str] = None
+    created_at: datetime
+
+    order_no: Optional[int] = None
+    tx_id: Optional[str] = None
+    buyer_user_id: Optional[int] = None
+
+    certificate_serial: Optional[str] = None
+    certificate_created_at: Optional[datetime] = None
+
+
+class UdidLookupOut(BaseModel):
+    items: list[UdidLookupItemOut]
@@ -11,6 +11,26 @@ class AdminCouponGenerateRequest(BaseModel):
     notes: str | None = None
 
 
+class AdminCouponBatchGenerateRequest(BaseModel):
+    plan_id: int
+    # Restock-sized runs; codes are downloaded via codes_download_url
+    count: int = Field(1, ge=1, le=200000)
+    notes: str | None = None
+
+
+class AdminCouponBatchOut(BaseModel):
+    batch_id: int
+    plan_id: int
+    owner_user_id: int | None
+    created_by_user_id: int
+    requested_count: int
+    generated_count: int
+    notes: str | None
+    created_at: datetime
+    completed_at: datetime | None
+    codes_download_url: str
+
+
 class AdminCouponResponse(BaseModel):
     coupon_code: str
     plan_id: int
@@ -39,6 +59,12 @@ class AdminCouponResponse(BaseModel):
         from_attributes = True
 
 
+class CouponPageOut(BaseModel):
+    items: list[AdminCouponResponse]
+    # pass back as ?cursor= for the next page; null on the last page
+    next_cursor: str | None = None
+
+
 class AdminCouponUnreserveRequest(BaseModel):
     reason: str | None = None
 
@@ -72,4 +98,84 @@ class SellerCouponGenerateRequest(BaseModel):
     count: int = Field(1, ge=1, le=500)
     # Optional: generate under a DIRECT child (never grandchildren)
     owner_user_id: int | None = None
-    notes: str | None = None
\ No newline at end of file
+    notes: str | None = None
+
+
+class SellerCouponOrderRequest(BaseModel):
+    plan_id: int
+    # Large orders: keys are NOT returned inline, download them via keys_download_url
+    count: int = Field(1, ge=1, le=10000)
+    owner_user_id: int | None = None
+    notes: str | None = None
+
+
+class SellerCouponOrderOut(BaseModel):
+    order_no: int
+    tx_id: str
+    plan_id: int
+    quantity: int
+    total_paid_cents: int
+    coupon_owner_user_id: int
+    keys_download_url: str
+
+
+class CouponInventoryRowOut(BaseModel):
+    owner_user_id: int | None
+    plan_id: int
+    unused: int
+    reserved: int
+    used: int
+    void: int
+    total: int
+
+
+class CouponInventoryOut(BaseModel):
+    items: list[CouponInventoryRowOut]
+
+
+class AdminCouponBatchOpRequest(BaseModel):
+    # Either an explicit code list (per-code outcomes) ...
+    coupon_codes: list[str] | None = Field(default=None, max_length=5000)
+    # ... or a filter (at least one of these; up to `limit` coupons)
+    plan_id: int | None = None
+    owner_user_id: int | None = None
+    generation_batch_id: int | None = None
+    limit: int = Field(1000, ge=1, le=5000)
+    reason: str | None = None
+
+
+class AdminCouponBatchReserveItem(BaseModel):
+    coupon_code: str
+    udid: str
+
+
+class AdminCouponBatchReserveRequest(BaseModel):
+    items: list[AdminCouponBatchReserveItem] = Field(min_length=1, max_length=5000)
+    notes: str | None = None
+
+
+class BotBulkIssueItem(BaseModel):
+    coupon_code: str
+    udid: str
+
+
+class BotBulkIssueRequest(BaseModel):
+    items: list[BotBulkIssueItem] = Field(min_length=1, max_length=500)
+    note: str | None = None
+
+
+class CouponBatchOutcomeOut(BaseModel):
+    coupon_code: str
+    # ok | not_found | wrong_state | locked (held by another transaction, retry later)
+    outcome: str
+    status: str | None
+
+
+class CouponBatchOpOut(BaseModel):
+    action: str
+    requested: int
+    updated: int
+    not_found: int
+    wrong_state: int
+    locked: int
+    outcomes: list[CouponBatchOutcomeOut]
@@ -48,4 +48,12 @@ class PlanDropdownOut(BaseModel):
     is_active: bool
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class SellerEnabledPlanOut(BaseModel):
+    plan_id: int
+    category: str
+    code: str
+    title: str
+    cost_cents: int
+    currency: str
@@ -46,9 +46,70 @@ class EdgePriceOut(BaseModel):
     updated_at: datetime
 
 
+class SellerEdgePriceBulkItemIn(BaseModel):
+    child_user_id: int
+    plan_id: int
+    price_cents: int = Field(ge=0)
+    currency: str = Field(min_length=1, max_length=10)
+
+
+class SellerEdgePriceBulkUpsertIn(BaseModel):
+    # e.g. 200 children x 10 plans
+    items: list[SellerEdgePriceBulkItemIn] = Field(min_length=1, max_length=2000)
+
+
+class AdminEdgePriceBulkUpsertIn(BaseModel):
+    items: list[AdminEdgePriceUpsertIn] = Field(min_length=1, max_length=2000)
+
+
+class EdgeKeyOut(BaseModel):
+    parent_user_id: int
+    child_user_id: int
+    plan_id: int
+
+
+class EdgePriceBulkUpsertOut(BaseModel):
+    applied: int
+    # seller bulk only: edges left untouched because an admin override exists
+    skipped_admin_override: list[EdgeKeyOut] = Field(default_factory=list)
+
+
 class ParentCostOut(BaseModel):
     parent_user_id: int
     plan_id: int
     parent_cost_cents: int
     currency: str
     source: str  # "admin_base_price" or "edge_price"
+
+
+# -------- Margin violations --------
+
+class MarginViolationOut(BaseModel):
+    parent_user_id: int
+    child_user_id: int
+    plan_id: int
+    price_cents: int
+    parent_cost_cents: int
+    shortfall_cents: int
+    is_admin_override: bool
+
+
+class MarginViolationsOut(BaseModel):
+    items: list[MarginViolationOut]
+    total: int
+
+
+class PriceMatrixRowOut(BaseModel):
+    parent_user_id: int
+    child_user_id: int
+    child_username: str
+    plan_id: int
+    price_cents: int
+    currency: str
+    is_admin_override: bool
+    updated_at: datetime
+
+
+class PriceMatrixPageOut(BaseModel):
+    items: list[PriceMatrixRowOut]
+    next_cursor: str | None = None
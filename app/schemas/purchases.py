@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import List
+from typing import List, Literal
 
 from pydantic import BaseModel, Field
 
@@ -8,7 +8,10 @@ from pydantic import BaseModel, Field
 class PurchaseIn(BaseModel):
     plan_id: int
     note: str | None = None
-    quantity: int = Field(default=1, ge=1, le=200)
+    quantity: int = Field(default=1, ge=1, le=10000)
+    # inline: keys returned in the response (max 200)
+    # deferred: only order_no is returned; download keys from /sellers/orders/{order_no}/keys
+    keys_delivery: Literal["inline", "deferred"] = "inline"
 
 
 class PurchaseOut(BaseModel):
@@ -25,3 +28,6 @@ class PurchaseOut(BaseModel):
     total_paid_cents: int
     coupon_codes: List[str] = Field(default_factory=list)
     keys_text: str = ""
+
+    keys_delivery: str = "inline"
+    keys_download_url: str | None = None
@@ -5,6 +5,8 @@ from typing import Optional
 
 from pydantic import BaseModel, ConfigDict, Field
 
+from app.schemas.admin_sellers import PlanPriceDiffOut
+
 
 class SellerPlanPriceIn(BaseModel):
     model_config = ConfigDict(extra="forbid")
@@ -83,6 +85,10 @@ class SellerChildSellerOut(BaseModel):
 
     plans: list[SellerPlanPriceOut]
 
+    # only on update with `plans`: plan ids actually written (diff sync)
+    plan_changes: PlanPriceDiffOut | None = None
+    edge_changes: PlanPriceDiffOut | None = None
+
 
 class SellerChildSellerListResponse(BaseModel):
     model_config = ConfigDict(extra="forbid")
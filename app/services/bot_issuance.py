@@ -0,0 +1,521 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.db import AsyncSessionLocal
+from app.models.certificate import Certificate
+from app.models.coupon import Coupon
+from app.models.coupon_category import CouponCategory
+from app.models.plan import Plan
+from app.services.coupon_categories import build_coupon_category_snapshot
+from app.services.coupon_category_versions import category_version_cache
+from app.services.coupon_code_filter import coupon_code_filter
+from app.services.coupon_transitions import (
+    FAILURE_STEP_FINALIZE,
+    FAILURE_STEP_PROVIDER_UNKNOWN,
+    OUTCOME_LOCKED,
+    OUTCOME_NOT_FOUND,
+    OUTCOME_OK,
+    CouponTransitionResult,
+    _udid_suffix,
+    apply_batch_transition,
+    transition_coupon,
+)
+from app.services.issuance_executor import (
+    IssuanceError,
+    IssuanceExecutor,
+    IssuanceOutcomeUnknown,
+    IssuanceUnavailable,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Bot issuance in three short steps, no transaction open while the provider works:
+#
+#   1. reserve   CAS unused -> reserved for this udid, commit
+#   2. provider  through the issuance executor (bounded, retried, circuit breaker)
+#   3. finalize  CAS reserved -> used + certificates row, commit
+#
+# Concurrent issue calls for one code: only one wins step 1, the others get 409
+# without reaching the provider. If step 2 fails the reservation is released
+# (nothing was issued) or kept with the failure recorded (outcome unknown).
+# A kept reservation carries a HELD_FAILURE_STEPS failure step: the
+# reservation sweeper skips it, only an admin releases it.
+
+
+async def load_category_snapshot(
+    db: AsyncSession,
+    *,
+    coupon_category_version_id: int | None,
+    coupon_category_id: int | None,
+    plan_id: int,
+) -> dict | None:
+    """
+    The coupon's category config: the version frozen at mint time (LRU cached),
+    or for coupons without one the current category (falls back to the plan's).
+    """
+    if coupon_category_version_id is not None:
+        snapshot = await category_version_cache.get(db, coupon_category_version_id)
+        if snapshot is not None:
+            return snapshot
+
+    category_id = coupon_category_id
+    if category_id is None:
+        res = await db.execute(select(Plan.coupon_category_id).where(Plan.id == int(plan_id)))
+        category_id = res.scalar_one_or_none()
+    if category_id is None:
+        return None
+
+    res = await db.execute(select(CouponCategory).where(CouponCategory.id == int(category_id)))
+    cat = res.scalar_one_or_none()
+    return build_coupon_category_snapshot(cat) if cat is not None else None
+
+
+def _provider_fields(response) -> tuple[str | None, str]:
+    """(provider request id, serial) from a provider response, whatever is present."""
+    body = response if isinstance(response, dict) else {}
+    data = body.get("data") if isinstance(body.get("data"), dict) else {}
+    req_id = data.get("req_id") or body.get("req_id")
+    serial = data.get("serial") or data.get("sn") or ""
+    return (str(req_id) if req_id else None), str(serial)
+
+
+def _raise_for_reserve(res: CouponTransitionResult) -> None:
+    if res.outcome == OUTCOME_NOT_FOUND:
+        coupon_code_filter.record_miss()
+        raise HTTPException(status_code=404, detail="Coupon not found")
+    if res.current_status == "reserved":
+        raise HTTPException(status_code=409, detail="Coupon is being issued")
+    raise HTTPException(status_code=400, detail="Already used")
+
+
+async def reserve_for_issuance(
+    db: AsyncSession,
+    *,
+    coupon_code: str,
+    udid: str,
+    note: str | None,
+) -> tuple[dict, dict]:
+    """Step 1. Returns (reserved coupon row, category snapshot); commits."""
+    try:
+        res = await transition_coupon(
+            db,
+            action="reserve",
+            coupon_code=coupon_code,
+            actor_user_id=None,
+            udid=udid,
+            notes=note or None,
+            event_meta={"source": "bot", "udid_suffix": _udid_suffix(udid)},
+        )
+        if not res.ok:
+            _raise_for_reserve(res)
+
+        coupon = res.coupon
+        snapshot = await load_category_snapshot(
+            db,
+            coupon_category_version_id=coupon.get("coupon_category_version_id"),
+            coupon_category_id=coupon.get("coupon_category_id"),
+            plan_id=int(coupon["plan_id"]),
+        )
+        if snapshot is None:
+            # rollback undoes the reservation
+            raise HTTPException(status_code=400, detail="Coupon has no category configured")
+
+        await db.commit()
+        return coupon, snapshot
+
+    except Exception:
+        await db.rollback()
+        raise
+
+
+async def finalize_issuance(
+    db: AsyncSession,
+    *,
+    coupon: dict,
+    udid: str,
+    response,
+) -> dict:
+    """Step 3. reserved -> used and the certificate row, in one transaction; commits."""
+    coupon_code = str(coupon["coupon_code"])
+    req_id, serial = _provider_fields(response)
+    try:
+        res = await transition_coupon(
+            db,
+            action="use",
+            coupon_code=coupon_code,
+            actor_user_id=None,
+            udid=udid,
+            provider_req_id=req_id,
+            event_meta={"source": "bot", "provider_req_id": req_id},
+        )
+        if not res.ok:
+            # reservation swept (and maybe re-taken) while the provider worked
+            logger.error(
+                "issued device for %s but the coupon is no longer reserved for it (status %s, req %s)",
+                coupon_code,
+                res.current_status,
+                req_id,
+            )
+            raise HTTPException(status_code=409, detail="Reservation expired before the device was recorded")
+
+        cert = Certificate(
+            coupon_code=coupon_code,
+            plan_id=int(coupon["plan_id"]),
+            udid=udid,
+            serial=serial,
+            provider_req_id=req_id,
+            raw_response=response if isinstance(response, dict) else {"response": response},
+        )
+        db.add(cert)
+        await db.flush()
+        await db.commit()
+        return {
+            "ok": True,
+            "coupon_code": coupon_code,
+            "status": res.current_status,
+            "certificate_id": int(cert.id),
+            "provider_req_id": req_id,
+            "provider_response": response,
+        }
+
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception:
+        await db.rollback()
+        logger.exception("finalize failed for %s after the provider issued it (req %s)", coupon_code, req_id)
+        await release_failed_issuance(
+            db,
+            coupon_code=coupon_code,
+            udid=udid,
+            keep_reserved=True,
+            reason=f"FINALIZE_FAILED: provider req {req_id}",
+            step=FAILURE_STEP_FINALIZE,
+        )
+        raise HTTPException(status_code=500, detail="Device issued but could not be recorded")
+
+
+async def release_failed_issuance(
+    db: AsyncSession,
+    *,
+    coupon_code: str,
+    udid: str,
+    keep_reserved: bool,
+    reason: str,
+    step: str,
+) -> None:
+    """
+    After a failed provider call: unreserve (nothing was issued) or keep the
+    reservation with the failure recorded (outcome unknown). Commits; never
+    raises, the caller is already reporting an error.
+    """
+    try:
+        await transition_coupon(
+            db,
+            action="fail" if keep_reserved else "unreserve",
+            coupon_code=coupon_code,
+            actor_user_id=None,
+            udid=udid,
+            reason=reason[:1000],
+            failure_step=step,
+            event_meta={"source": "bot", "reason": reason[:1000]},
+        )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        logger.exception("could not record issuance failure for %s", coupon_code)
+
+
+def provider_failure(exc: Exception) -> tuple[bool, str, int]:
+    """(keep reserved?, failure reason, HTTP status) for a failed provider call."""
+    if isinstance(exc, IssuanceUnavailable):
+        return False, f"PROVIDER_UNAVAILABLE: {exc}", 503
+    if isinstance(exc, IssuanceOutcomeUnknown):
+        return True, f"PROVIDER_OUTCOME_UNKNOWN: {exc}", 502
+    if isinstance(exc, IssuanceError):
+        return False, f"PROVIDER_REJECTED: {exc}", 502
+    # unexpected: treat as "may have been issued"
+    return True, f"PROVIDER_ERROR: {exc}", 502
+
+
+async def call_provider(
+    db: AsyncSession,
+    executor: IssuanceExecutor,
+    *,
+    coupon: dict,
+    snapshot: dict,
+    udid: str,
+    note: str | None,
+):
+    """Step 2 (no transaction open). On failure records it and raises HTTPException."""
+    try:
+        return await executor.issue_device(
+            udid=udid,
+            issue_mode=snapshot["issue_mode"],
+            pool_type=snapshot["pool_type"],
+            warranty=snapshot["warranty"],
+            note=note,
+        )
+    except Exception as e:
+        keep_reserved, reason, status_code = provider_failure(e)
+        await release_failed_issuance(
+            db,
+            coupon_code=str(coupon["coupon_code"]),
+            udid=udid,
+            keep_reserved=keep_reserved,
+            reason=reason,
+            step=FAILURE_STEP_PROVIDER_UNKNOWN if keep_reserved else "provider",
+        )
+        raise HTTPException(status_code=status_code, detail=str(e))
+
+
+async def issue_coupon_for_udid(
+    db: AsyncSession,
+    executor: IssuanceExecutor,
+    *,
+    coupon_code: str,
+    udid: str,
+    note: str | None = None,
+) -> dict:
+    clean_udid = (udid or "").strip()
+    if not clean_udid:
+        raise HTTPException(status_code=400, detail="udid is required")
+
+    coupon, snapshot = await reserve_for_issuance(db, coupon_code=coupon_code, udid=clean_udid, note=note)
+    response = await call_provider(db, executor, coupon=coupon, snapshot=snapshot, udid=clean_udid, note=note)
+    return await finalize_issuance(db, coupon=coupon, udid=clean_udid, response=response)
+
+
+# ---------------------------------------------------------------------------
+# Bulk issuance: one reserve statement for every pair, provider calls run
+# concurrently through the executor, results streamed as NDJSON as they finish.
+# ---------------------------------------------------------------------------
+
+# finishing tasks for bulk requests whose client went away (kept referenced)
+_detached: set[asyncio.Task] = set()
+
+
+def _line(coupon_code: str, *, ok: bool, status_code: int, detail: str | None = None, **extra) -> dict:
+    return {"coupon_code": coupon_code, "ok": ok, "status_code": status_code, "detail": detail, **extra}
+
+
+async def reserve_bulk_issuance(
+    db: AsyncSession,
+    *,
+    items: list[tuple[str, str]],  # [(coupon_code, udid)]
+    note: str | None,
+) -> tuple[list[dict], list[dict]]:
+    """
+    Reserve every (coupon_code, udid) pair in ONE statement (batch reserve,
+    SKIP LOCKED) and commit. Returns (result lines for pairs that cannot be
+    issued, reserved work items {coupon_code, udid, plan_id, snapshot}).
+    """
+    rejected: list[dict] = []
+    pairs: dict[str, str] = {}
+    for code, udid in items:
+        code = (code or "").strip()
+        clean_udid = (udid or "").strip()
+        if not code:
+            continue
+        if not coupon_code_filter.might_exist(code):
+            # unknown codes (typos / guesses) never reach Postgres
+            rejected.append(_line(code, ok=False, status_code=404, detail="Coupon not found"))
+        elif code in pairs:
+            rejected.append(_line(code, ok=False, status_code=400, detail="Duplicate coupon code in request"))
+        elif not clean_udid:
+            rejected.append(_line(code, ok=False, status_code=400, detail="udid is required"))
+        else:
+            pairs[code] = clean_udid
+
+    if not pairs:
+        return rejected, []
+
+    try:
+        # category per code first (plain read, category does not change with status):
+        # pairs without one are never reserved
+        res = await db.execute(
+            select(
+                Coupon.coupon_code,
+                Coupon.plan_id,
+                Coupon.coupon_category_id,
+                Coupon.coupon_category_version_id,
+            ).where(Coupon.coupon_code.in_(list(pairs)))
+        )
+        snapshots: dict[tuple, dict | None] = {}
+        info: dict[str, tuple[int, dict | None]] = {}
+        for code, plan_id, category_id, version_id in res.all():
+            key = (version_id, category_id, int(plan_id))
+            if key not in snapshots:
+                snapshots[key] = await load_category_snapshot(
+                    db,
+                    coupon_category_version_id=version_id,
+                    coupon_category_id=category_id,
+                    plan_id=int(plan_id),
+                )
+            info[str(code)] = (int(plan_id), snapshots[key])
+
+        codes = [c for c in pairs if c not in info or info[c][1] is not None]
+        for c in pairs:
+            if c in info and info[c][1] is None:
+                rejected.append(_line(c, ok=False, status_code=400, detail="Coupon has no category configured"))
+
+        outcomes = []
+        if codes:
+            outcomes = await apply_batch_transition(
+                db,
+                action="reserve",
+                actor_user_id=None,
+                codes=codes,
+                udids=[pairs[c] for c in codes],
+                notes=note or None,
+                event_meta={"source": "bot_bulk"},
+            )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    reserved: list[dict] = []
+    for o in outcomes:
+        code = o["coupon_code"]
+        if o["outcome"] == OUTCOME_OK:
+            plan_id, snapshot = info[code]
+            reserved.append({"coupon_code": code, "udid": pairs[code], "plan_id": plan_id, "snapshot": snapshot})
+        elif o["outcome"] == OUTCOME_NOT_FOUND:
+            coupon_code_filter.record_miss()
+            rejected.append(_line(code, ok=False, status_code=404, detail="Coupon not found"))
+        elif o["outcome"] == OUTCOME_LOCKED or o["status"] == "reserved":
+            rejected.append(_line(code, ok=False, status_code=409, detail="Coupon is being issued"))
+        else:
+            rejected.append(_line(code, ok=False, status_code=400, detail="Already used"))
+    return rejected, reserved
+
+
+async def _settle(db: AsyncSession, item: dict, response, exc: Exception | None) -> dict:
+    """Finalize or release one bulk item after its provider call; never raises."""
+    code = item["coupon_code"]
+    if exc is not None:
+        keep_reserved, reason, status_code = provider_failure(exc)
+        await release_failed_issuance(
+            db,
+            coupon_code=code,
+            udid=item["udid"],
+            keep_reserved=keep_reserved,
+            reason=reason,
+            step=FAILURE_STEP_PROVIDER_UNKNOWN if keep_reserved else "provider",
+        )
+        return _line(code, ok=False, status_code=status_code, detail=str(exc))
+    try:
+        out = await finalize_issuance(db, coupon=item, udid=item["udid"], response=response)
+    except HTTPException as e:
+        return _line(code, ok=False, status_code=e.status_code, detail=str(e.detail))
+    return _line(
+        code,
+        ok=True,
+        status_code=200,
+        status=out["status"],
+        certificate_id=out["certificate_id"],
+        provider_req_id=out["provider_req_id"],
+        provider_response=out["provider_response"],
+    )
+
+
+async def _settle_rest(tasks: list[asyncio.Task], unstarted: list[str]) -> None:
+    """
+    Client went away: coupons whose provider call never started are
+    unreserved in one statement; calls already started are finalized as they
+    finish.
+    """
+    async with AsyncSessionLocal() as db:
+        if unstarted:
+            try:
+                await apply_batch_transition(
+                    db,
+                    action="unreserve",
+                    actor_user_id=None,
+                    codes=unstarted,
+                    event_meta={"source": "bot_bulk", "reason": "CLIENT_DISCONNECTED"},
+                )
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                logger.exception("could not release %s unstarted bulk issuance(s)", len(unstarted))
+        for fut in asyncio.as_completed(tasks):
+            item, response, exc, started = await fut
+            if started:
+                await _settle(db, item, response, exc)
+
+
+async def iter_bulk_issuance(
+    *,
+    rejected: list[dict],
+    reserved: list[dict],
+    executor: IssuanceExecutor,
+    note: str | None,
+    concurrency: int,
+) -> AsyncIterator[str]:
+    """
+    NDJSON, one object per pair: rejected pairs first, then issued / failed
+    ones in completion order.
+
+    At most `concurrency` provider calls of this request are queued at once
+    (the executor caps the total across requests). Own session, like
+    iter_order_keys: the request-scoped one is closed by the time this runs.
+    If the client disconnects, the calls already started are still
+    finalized in the background so no issued device is left unrecorded;
+    pairs still waiting for a slot are unreserved without calling the provider.
+    """
+    for line in rejected:
+        yield json.dumps(line, default=str) + "\n"
+    if not reserved:
+        return
+
+    sem = asyncio.Semaphore(max(1, int(concurrency)))
+    # set when the client goes away; checked once a slot is acquired
+    abandoned = asyncio.Event()
+    started: set[str] = set()
+
+    async def run(item: dict):
+        async with sem:
+            if abandoned.is_set():
+                return item, None, None, False
+            started.add(item["coupon_code"])
+            snapshot = item["snapshot"]
+            try:
+                response = await executor.issue_device(
+                    udid=item["udid"],
+                    issue_mode=snapshot["issue_mode"],
+                    pool_type=snapshot["pool_type"],
+                    warranty=snapshot["warranty"],
+                    note=note,
+                )
+            except Exception as e:
+                return item, None, e, True
+            return item, response, None, True
+
+    tasks = {asyncio.create_task(run(item)): item["coupon_code"] for item in reserved}
+    settled: set[str] = set()
+    try:
+        async with AsyncSessionLocal() as db:
+            for fut in asyncio.as_completed(list(tasks)):
+                item, response, exc, _ = await fut
+                line = await _settle(db, item, response, exc)
+                settled.add(item["coupon_code"])
+                yield json.dumps(line, default=str) + "\n"
+    finally:
+        abandoned.set()
+        rest = [t for t, code in tasks.items() if code not in settled]
+        if rest:
+            unstarted = [code for code in tasks.values() if code not in started]
+            bg = asyncio.create_task(_settle_rest(rest, unstarted))
+            _detached.add(bg)
+            bg.add_done_callback(_detached.discard)
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime, timezone
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.db import AsyncSessionLocal
+from app.models.coupon import Coupon
+from app.models.coupon_generation_batch import CouponGenerationBatch
+from app.models.plan import Plan
+from app.services.coupon_codes import allocate_coupon_codes
+from app.services.coupon_inventory import record_minted
+from app.services.coupon_category_versions import load_coupon_category_columns
+from app.services.coupon_owner_paths import load_coupon_owner_columns
+
+
+class CouponBatchError(Exception):
+    pass
+
+
+BATCH_CODES_FORMATS = ("text", "ndjson")
+
+# codes COPY'd per round trip; also the server-side cursor page size for downloads
+COPY_CHUNK = 10000
+
+# allocator codes only collide with pre-allocator (random) codes, which are
+# skipped by ON CONFLICT and topped up; give up after this many extra rounds
+_MAX_EXTRA_ROUNDS = 20
+
+
+_STAGE_SQL = text(
+    "CREATE TEMP TABLE IF NOT EXISTS _coupon_codes_stage (coupon_code text NOT NULL) ON COMMIT DROP"
+)
+
+# Staged codes -> coupons (collisions skipped) -> one "generated" event per
+# inserted coupon, in one statement; nothing is sent back to the client.
+# Every bind is CAST: under DISTINCT an untyped parameter resolves to text.
+_MINT_FROM_STAGE_SQL = text(
+    """
+    WITH ins AS (
+        INSERT INTO public.coupons
+            (coupon_code, plan_id, status, created_by_user_id, owner_user_id, notes, generation_batch_id,
+             owner_path, owner_bucket_depth1, coupon_category_id, coupon_category_version_id)
+        SELECT DISTINCT s.coupon_code, CAST(:plan_id AS bigint), 'unused', CAST(:created_by_user_id AS bigint),
+               CAST(:owner_user_id AS bigint), CAST(:notes AS text), CAST(:batch_id AS bigint),
+               CAST(:owner_path AS ltree), CAST(:owner_bucket_depth1 AS bigint),
+               CAST(:coupon_category_id AS integer), CAST(:coupon_category_version_id AS bigint)
+        FROM _coupon_codes_stage s
+        ON CONFLICT (coupon_code) DO NOTHING
+        RETURNING coupon_code
+    )
+    INSERT INTO public.coupon_events (coupon_code, actor_user_id, event_type, meta)
+    SELECT ins.coupon_code, CAST(:created_by_user_id AS bigint), 'generated', CAST(:meta AS jsonb)
+    FROM ins
+    """
+)
+
+
+async def admin_generate_coupon_batch(
+    db: AsyncSession,
+    *,
+    plan_id: int,
+    count: int,
+    created_by_user_id: int,
+    owner_user_id: int | None,
+    notes: str | None,
+    chunk_size: int = COPY_CHUNK,
+) -> CouponGenerationBatch:
+    """
+    Bulk admin generation for restocks (100k+ coupons).
+
+    Codes are streamed into a temp table with COPY (asyncpg binary COPY on the
+    session's own connection, so it is part of the same transaction), then
+    moved into coupons + coupon_events set-based. Only one chunk of codes is in
+    memory at a time and no ORM objects are created.
+    """
+    plan = await db.get(Plan, plan_id)
+    if not plan:
+        raise HTTPException(status_code=404, detail="Plan not found")
+    if not plan.is_active:
+        raise HTTPException(status_code=400, detail="Plan is not active")
+
+    try:
+        batch = CouponGenerationBatch(
+            plan_id=int(plan_id),
+            owner_user_id=int(owner_user_id) if owner_user_id is not None else None,
+            created_by_user_id=int(created_by_user_id),
+            requested_count=int(count),
+            notes=notes,
+        )
+        db.add(batch)
+        await db.flush()
+
+        await db.execute(_STAGE_SQL)
+        conn = await db.connection()
+        raw = await conn.get_raw_connection()
+        driver_conn = raw.driver_connection  # asyncpg connection
+
+        params = {
+            **await load_coupon_owner_columns(db, owner_user_id),
+            **await load_coupon_category_columns(db, plan_id),
+            "plan_id": int(plan_id),
+            "created_by_user_id": int(created_by_user_id),
+            "owner_user_id": int(owner_user_id) if owner_user_id is not None else None,
+            "notes": notes,
+            "batch_id": int(batch.id),
+            "meta": json.dumps(
+                {
+                    "plan_id": int(plan_id),
+                    "owner_user_id": owner_user_id,
+                    "notes": notes,
+                    "generation_batch_id": int(batch.id),
+                }
+            ),
+        }
+
+        generated = 0
+        max_rounds = -(-int(count) // int(chunk_size)) + _MAX_EXTRA_ROUNDS
+        rounds = 0
+        while generated < int(count):
+            rounds += 1
+            if rounds > max_rounds:
+                raise HTTPException(status_code=500, detail="Failed to generate unique coupon codes")
+
+            n = min(int(chunk_size), int(count) - generated)
+            await db.execute(text("TRUNCATE _coupon_codes_stage"))
+            await driver_conn.copy_records_to_table(
+                "_coupon_codes_stage",
+                records=[(code,) for code in await allocate_coupon_codes(db, n, skip_existing=False)],
+                columns=["coupon_code"],
+            )
+            res = await db.execute(_MINT_FROM_STAGE_SQL, params)
+            generated += int(res.rowcount or 0)
+
+        await record_minted(db, owner_user_id=owner_user_id, plan_id=plan_id, count=generated)
+
+        batch.generated_count = generated
+        batch.completed_at = datetime.now(timezone.utc)
+
+        await db.commit()
+        return batch
+
+    except Exception:
+        await db.rollback()
+        raise
+
+
+async def get_coupon_batch(db: AsyncSession, *, batch_id: int) -> CouponGenerationBatch:
+    batch = await db.get(CouponGenerationBatch, int(batch_id))
+    if not batch:
+        raise CouponBatchError("Generation batch not found.")
+    return batch
+
+
+async def iter_batch_codes(
+    *,
+    batch_id: int,
+    fmt: str = "text",
+    chunk_size: int = COPY_CHUNK,
+) -> AsyncIterator[str]:
+    """
+    Stream the codes minted by one generation batch (own session +
+    server-side cursor, same pattern as order_keys.iter_order_keys).
+    """
+    if fmt not in BATCH_CODES_FORMATS:
+        raise CouponBatchError(f"Unknown codes format: {fmt}")
+
+    stmt = (
+        select(Coupon.coupon_code)
+        .where(Coupon.generation_batch_id == int(batch_id))
+        .order_by(Coupon.coupon_code.asc())
+        .execution_options(yield_per=int(chunk_size))
+    )
+
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(stmt)
+        async for partition in result.partitions():
+            if fmt == "ndjson":
+                yield "".join(json.dumps({"coupon_code": code}) + "\n" for (code,) in partition)
+            else:
+                yield "".join(f"{code}\n" for (code,) in partition)
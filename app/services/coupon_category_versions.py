@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.coupon_category_version import CouponCategoryVersion
+
+
+# Coupons reference an immutable coupon_category_versions row instead of each
+# carrying a JSON copy of the category (coupons.coupon_category_snapshot).
+# A version is identified by sha256("<category id>:<snapshot jsonb text>"),
+# computed in SQL on both the mint and backfill paths; jsonb text output is
+# canonical (key order / whitespace), so equal configs always share one row.
+# The snapshot has the shape of build_coupon_category_snapshot() minus
+# frozen_at (that would make every copy unique): the version's created_at
+# takes its place.
+
+BACKFILL_BATCH = 5000
+
+_SNAPSHOT_SQL = """
+    jsonb_build_object(
+        'version', 1,
+        'provider', cc.provider,
+        'issue_mode', cc.issue_mode,
+        'pool_type', cc.pool_type,
+        'warranty', cc.warranty,
+        'extra_params', COALESCE(CAST(cc.extra_params AS jsonb), '{}'::jsonb)
+    )
+"""
+
+_HASH_SQL = "sha256(convert_to(COALESCE(CAST({cat} AS text), '0') || ':' || CAST({snap} AS text), 'UTF8'))"
+
+# The plan's category as it is now -> its version (inserted if this config is
+# new), in one round trip. The fallback SELECT finds an existing version; it
+# misses only if another transaction inserted the same version after this
+# statement started (caller retries once).
+_PLAN_VERSION_SQL = text(
+    f"""
+    WITH cat AS (
+        SELECT cc.id AS category_id, {_SNAPSHOT_SQL} AS snap
+        FROM public.plans p
+        JOIN public.coupon_categories cc ON cc.id = p.coupon_category_id
+        WHERE p.id = :plan_id
+    ),
+    h AS (
+        SELECT cat.*, {_HASH_SQL.format(cat="cat.category_id", snap="cat.snap")} AS hash
+        FROM cat
+    ),
+    ins AS (
+        INSERT INTO public.coupon_category_versions (coupon_category_id, content_hash, snapshot)
+        SELECT h.category_id, h.hash, h.snap FROM h
+        ON CONFLICT (content_hash) DO NOTHING
+        RETURNING id
+    )
+    SELECT
+        h.category_id,
+        COALESCE(
+            (SELECT id FROM ins),
+            (SELECT v.id FROM public.coupon_category_versions v WHERE v.content_hash = h.hash)
+        ) AS version_id
+    FROM h
+    """
+)
+
+
+async def load_coupon_category_columns(db: AsyncSession, plan_id: int) -> dict:
+    """
+    Values for Coupon(coupon_category_id=..., coupon_category_version_id=...)
+    for a coupon of `plan_id` minted now (caller's transaction). Both None if
+    the plan has no category.
+    """
+    for _ in range(2):
+        res = await db.execute(_PLAN_VERSION_SQL, {"plan_id": int(plan_id)})
+        row = res.first()
+        if row is None:
+            return {"coupon_category_id": None, "coupon_category_version_id": None}
+        if row[1] is not None:
+            return {"coupon_category_id": int(row[0]), "coupon_category_version_id": int(row[1])}
+    raise RuntimeError(f"could not resolve coupon category version for plan {plan_id}")
+
+
+class CategoryVersionCache:
+    """
+    In-process LRU of version id -> snapshot dict. Versions never change, so
+    entries are never invalidated; the bot serves a coupon's category with one
+    dict lookup instead of reading and parsing JSON per coupon row.
+    """
+
+    def __init__(self, *, maxsize: int):
+        self.maxsize = max(1, int(maxsize))
+        self._items: OrderedDict[int, dict] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, db: AsyncSession, version_id: int) -> dict | None:
+        vid = int(version_id)
+        snap = self._items.get(vid)
+        if snap is not None:
+            self._items.move_to_end(vid)
+            self.hits += 1
+            return snap
+
+        self.misses += 1
+        res = await db.execute(
+            select(CouponCategoryVersion.snapshot, CouponCategoryVersion.created_at).where(
+                CouponCategoryVersion.id == vid
+            )
+        )
+        row = res.first()
+        if row is None:
+            return None
+        snap = {**row[0], "frozen_at": row[1].isoformat() if row[1] else None}
+        self._items[vid] = snap
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+        return snap
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._items),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+category_version_cache = CategoryVersionCache(maxsize=settings.COUPON_CATEGORY_VERSION_CACHE_SIZE)
+
+
+_BACKFILL_SQL = text(
+    f"""
+    WITH todo AS (
+        SELECT
+            c.coupon_code,
+            c.coupon_category_id AS category_id,
+            CAST(c.coupon_category_snapshot AS jsonb) - 'frozen_at' AS snap
+        FROM public.coupons c
+        WHERE c.coupon_category_version_id IS NULL
+          AND c.coupon_category_snapshot IS NOT NULL
+          AND CAST(c.coupon_category_snapshot AS jsonb) <> '{{}}'::jsonb
+        LIMIT :limit
+        FOR UPDATE OF c SKIP LOCKED
+    ),
+    h AS (
+        SELECT todo.*, {_HASH_SQL.format(cat="todo.category_id", snap="todo.snap")} AS hash
+        FROM todo
+    ),
+    ins AS (
+        INSERT INTO public.coupon_category_versions (coupon_category_id, content_hash, snapshot)
+        SELECT DISTINCT ON (h.hash) h.category_id, h.hash, h.snap
+        FROM h
+        ORDER BY h.hash
+        ON CONFLICT (content_hash) DO NOTHING
+        RETURNING id, content_hash
+    ),
+    ver AS (
+        SELECT id, content_hash FROM ins
+        UNION ALL
+        SELECT v.id, v.content_hash
+        FROM public.coupon_category_versions v
+        WHERE v.content_hash IN (SELECT hash FROM h)
+    )
+    UPDATE public.coupons c
+    SET coupon_category_version_id = ver.id
+    FROM h
+    JOIN ver ON ver.content_hash = h.hash
+    WHERE c.coupon_code = h.coupon_code
+    """
+)
+
+
+async def backfill_coupon_category_versions(db: AsyncSession, *, batch_size: int = BACKFILL_BATCH) -> int:
+    """
+    Point coupons minted before versions existed at the version matching their
+    stored coupon_category_snapshot (creating versions as needed). One short
+    transaction per batch. Once it returns 0 the snapshot column is unused.
+    Returns the number of coupons updated.
+    """
+    total = 0
+    while True:
+        try:
+            res = await db.execute(_BACKFILL_SQL, {"limit": int(batch_size)})
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        n = int(res.rowcount or 0)
+        total += n
+        if n < int(batch_size):
+            return total
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import logging
+import re
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from heapq import merge
+
+from sqlalchemy import select, text
+
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.models.coupon import Coupon
+from app.services.coupon_codes import unpermute32
+
+logger = logging.getLogger(__name__)
+
+
+# Same shape as coupon_code_format_chk
+_CODE_RE = re.compile(r"^Certify-([0-9a-f]{8})$")
+
+# rows per round trip for the startup scan
+_SCAN_CHUNK = 20000
+
+# recent additions are kept in a set and merged into the sorted array past this
+_MERGE_THRESHOLD = 50000
+
+# One sample per scan: the sequence position, and the start of the oldest
+# transaction still running anywhere in the database at that moment.
+_SAMPLE_SQL = text(
+    """
+    SELECT
+        clock_timestamp() AS sampled_at,
+        (SELECT last_value FROM coupon_code_seq) AS seq_last,
+        (
+            SELECT min(a.xact_start)
+            FROM pg_stat_activity a
+            WHERE a.datname = current_database()
+              AND a.pid <> pg_backend_pid()
+              AND a.xact_start IS NOT NULL
+        ) AS oldest_xact_start
+    """
+)
+
+
+def _suffix(coupon_code: str) -> int | None:
+    m = _CODE_RE.match(coupon_code or "")
+    return int(m.group(1), 16) if m else None
+
+
+class CouponCodeFilter:
+    """
+    Per-process membership index of every coupon code, so the bot edge can
+    answer 404 for codes that do not exist without a database lookup.
+
+    Codes are 32-bit numbers ("Certify-" + 8 hex), so instead of a Bloom filter
+    this keeps an exact sorted array('I') of the suffixes (4 bytes per code, no
+    false positives among checked codes) plus a small set of recent additions.
+
+    Codes minted by other workers since the last refresh are not in the array
+    yet, so "not present" is only trusted for codes whose allocator sequence
+    value (unpermute32(suffix)) is at or below `watermark`: a value that every
+    transaction that could have allocated it has already finished with, and
+    that a completed scan therefore saw. Anything above it goes to the database.
+
+    Refresh (PeriodicTask): the first run streams every code; later runs read
+    only coupons created since the oldest transaction that was still running
+    at the previous scan (ix_coupons_created_at_code).
+    """
+
+    def __init__(self, *, enabled: bool = True):
+        self.enabled = bool(enabled)
+        self._sorted = array("I")
+        self._recent: set[int] = set()
+        self.watermark = -1  # nothing can be rejected by value until the first refresh after a scan
+        self.ready = False
+        self._samples: list[tuple[datetime, int]] = []
+        self._scan_since: datetime | None = None
+        self.lookups = 0
+        self.rejected = 0
+        self.passed = 0
+        self.passed_missing = 0  # passed to the database and not found there
+        self.last_refresh_at: datetime | None = None
+
+    def __len__(self) -> int:
+        return len(self._sorted) + len(self._recent)
+
+    def _contains(self, suffix: int) -> bool:
+        if suffix in self._recent:
+            return True
+        i = bisect_left(self._sorted, suffix)
+        return i < len(self._sorted) and self._sorted[i] == suffix
+
+    def _merge_recent(self) -> None:
+        if not self._recent:
+            return
+        self._sorted = array("I", merge(self._sorted, sorted(self._recent)))
+        self._recent = set()
+
+    def might_exist(self, coupon_code: str) -> bool:
+        """False only if the code certainly does not exist."""
+        if not (self.enabled and self.ready):
+            return True
+        self.lookups += 1
+        suffix = _suffix(coupon_code)
+        if suffix is None or (not self._contains(suffix) and unpermute32(suffix) <= self.watermark):
+            self.rejected += 1
+            return False
+        self.passed += 1
+        return True
+
+    def record_miss(self) -> None:
+        """A code that passed the filter was not in the database (measured false positive)."""
+        self.passed_missing += 1
+
+    async def refresh(self) -> int:
+        """Full scan on the first call, incremental afterwards. Returns codes added."""
+        if not self.enabled:
+            return 0
+
+        added = 0
+        async with AsyncSessionLocal() as db:
+            sample = (await db.execute(_SAMPLE_SQL)).mappings().one()
+            sampled_at = sample["sampled_at"]
+            oldest = sample["oldest_xact_start"]
+
+            stmt = select(Coupon.coupon_code)
+            if self._scan_since is not None:
+                stmt = stmt.where(Coupon.created_at >= self._scan_since)
+            else:
+                # primary key order == numeric suffix order, so the array comes out sorted
+                stmt = stmt.order_by(Coupon.coupon_code.asc())
+
+            result = await db.stream(stmt.execution_options(yield_per=_SCAN_CHUNK))
+            full = self._scan_since is None
+            fresh = array("I")
+            in_order = True
+            async for partition in result.partitions():
+                for (code,) in partition:
+                    suffix = _suffix(code)
+                    if suffix is None:
+                        continue
+                    if full:
+                        if fresh and suffix <= fresh[-1]:
+                            in_order = False
+                        fresh.append(suffix)
+                    elif not self._contains(suffix):
+                        self._recent.add(suffix)
+                    added += 1
+            await db.rollback()
+
+        if full:
+            self._sorted = fresh if in_order else array("I", sorted(set(fresh)))
+            self._recent = set()
+            logger.info(
+                "coupon code filter built: %s codes, %s bytes",
+                len(self._sorted),
+                self._sorted.itemsize * len(self._sorted),
+            )
+        elif len(self._recent) > _MERGE_THRESHOLD:
+            self._merge_recent()
+
+        # Every transaction that committed after this scan's snapshot was
+        # running at `sampled_at` (or started later), so it started at or
+        # after `oldest`: the next incremental scan starts there.
+        self._scan_since = oldest if oldest is not None else sampled_at
+
+        # A sample is safe once no transaction that was running when it was
+        # taken is still running: all values it covers are committed (and
+        # scanned) or rolled back.
+        self._samples.append((sampled_at, int(sample["seq_last"])))
+        safe = [s for s in self._samples if oldest is None or s[0] < oldest]
+        if safe:
+            self.watermark = max(self.watermark, max(v for _, v in safe))
+            self._samples = [s for s in self._samples if s not in safe]
+
+        self.ready = True
+        self.last_refresh_at = sampled_at
+        return added
+
+    def stats(self) -> dict:
+        passed = self.passed
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "codes": len(self),
+            "sorted_codes": len(self._sorted),
+            "recent_codes": len(self._recent),
+            "memory_bytes": self._sorted.itemsize * len(self._sorted) + sys.getsizeof(self._recent),
+            "watermark": self.watermark,
+            "lookups": self.lookups,
+            "rejected": self.rejected,
+            "passed": passed,
+            # share of passed lookups that the database then did not find
+            "false_positive_rate": (self.passed_missing / passed) if passed else 0.0,
+            "last_refresh_at": self.last_refresh_at,
+        }
+
+
+coupon_code_filter = CouponCodeFilter(enabled=settings.COUPON_CODE_FILTER_ENABLED)
+
+
+async def refresh_coupon_code_filter() -> int:
+    return await coupon_code_filter.refresh()
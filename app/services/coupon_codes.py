@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import hashlib
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.coupon import Coupon
+
+
+class CouponCodeError(Exception):
+    pass
+
+
+# Coupon codes are "Certify-" + 8 hex digits (coupon_code_format_chk), i.e. a
+# 32-bit number. Instead of drawing random numbers and probing the table, every
+# code is permute32(nextval('coupon_code_seq')):
+#   - a Feistel network is a bijection on 32 bits, so distinct sequence values
+#     give distinct codes (no probes, no retries)
+#   - the round function is keyed (COUPON_CODE_KEY), so consecutive sequence
+#     values give unrelated-looking codes and the next code cannot be guessed
+#     from issued ones without the key
+# The key must never change after codes were issued.
+
+_ROUNDS = 8
+_HALF_MASK = 0xFFFF
+
+
+def _derive_key(secret: str) -> bytes:
+    return hashlib.sha256(secret.encode("utf-8")).digest()  # 32 bytes = blake2s max key
+
+
+_KEY = _derive_key(settings.COUPON_CODE_KEY)
+
+
+def _round(key: bytes, r: int, half: int) -> int:
+    d = hashlib.blake2s(bytes((r,)) + half.to_bytes(2, "big"), key=key, digest_size=2).digest()
+    return int.from_bytes(d, "big")
+
+
+def permute32(value: int, key: bytes = _KEY) -> int:
+    left = (int(value) >> 16) & _HALF_MASK
+    right = int(value) & _HALF_MASK
+    for r in range(_ROUNDS):
+        left, right = right, left ^ _round(key, r, right)
+    return (left << 16) | right
+
+
+def unpermute32(value: int, key: bytes = _KEY) -> int:
+    left = (int(value) >> 16) & _HALF_MASK
+    right = int(value) & _HALF_MASK
+    for r in reversed(range(_ROUNDS)):
+        left, right = right ^ _round(key, r, left), left
+    return (left << 16) | right
+
+
+def code_for_value(value: int) -> str:
+    return f"Certify-{permute32(value):08x}"
+
+
+async def reserve_coupon_code_values(db: AsyncSession, n: int) -> list[int]:
+    """n sequence values in one round trip (not necessarily contiguous)."""
+    if n <= 0:
+        return []
+    res = await db.execute(
+        text("SELECT nextval('coupon_code_seq') FROM generate_series(1, :n)"),
+        {"n": int(n)},
+    )
+    return [int(v) for v in res.scalars().all()]
+
+
+async def allocate_coupon_codes(db: AsyncSession, n: int, *, skip_existing: bool | None = None) -> list[str]:
+    """
+    n unique coupon codes.
+
+    Allocator codes never collide with each other. Codes minted before the
+    allocator existed (random) can, so while COUPON_CODE_LEGACY_CHECK is on the
+    batch is checked against the table in ONE query and hits are replaced.
+    Callers that insert with ON CONFLICT DO NOTHING pass skip_existing=False.
+    """
+    if skip_existing is None:
+        skip_existing = settings.COUPON_CODE_LEGACY_CHECK
+
+    codes = [code_for_value(v) for v in await reserve_coupon_code_values(db, n)]
+    if not skip_existing:
+        return codes
+
+    for _ in range(20):
+        res = await db.execute(select(Coupon.coupon_code).where(Coupon.coupon_code.in_(codes)))
+        taken = set(res.scalars().all())
+        if not taken:
+            return codes
+        codes = [c for c in codes if c not in taken]
+        codes += [code_for_value(v) for v in await reserve_coupon_code_values(db, len(taken))]
+
+    raise CouponCodeError("Failed to allocate unique coupon codes.")
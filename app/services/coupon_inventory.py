@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from collections import defaultdict
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.coupon_inventory import CouponInventoryCount
+
+
+COUPON_STATUSES = ("unused", "reserved", "used", "void")
+
+# coupons.owner_user_id is nullable; the counter key is not
+NO_OWNER = 0
+
+InventoryKey = tuple[int, int, str]  # (owner_user_id, plan_id, status)
+
+
+def _owner_key(owner_user_id: int | None) -> int:
+    return int(owner_user_id) if owner_user_id is not None else NO_OWNER
+
+
+async def apply_inventory_deltas(db: AsyncSession, deltas: dict[InventoryKey, int]) -> None:
+    """
+    Add deltas to coupon_inventory_counts in ONE upsert (caller's transaction,
+    no commit). Keys are written in sorted order so two transactions touching
+    the same counters always lock them in the same order (no deadlocks).
+    """
+    rows = [
+        {"owner_user_id": owner, "plan_id": plan, "status": status, "count": int(delta)}
+        for (owner, plan, status), delta in sorted(deltas.items())
+        if int(delta) != 0
+    ]
+    if not rows:
+        return
+
+    stmt = pg_insert(CouponInventoryCount).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        constraint="coupon_inventory_counts_pkey",
+        set_={"count": CouponInventoryCount.count + stmt.excluded.count},
+    )
+    await db.execute(stmt)
+
+
+async def record_minted(db: AsyncSession, *, owner_user_id: int | None, plan_id: int, count: int) -> None:
+    await apply_inventory_deltas(db, {(_owner_key(owner_user_id), int(plan_id), "unused"): int(count)})
+
+
+async def record_transition(
+    db: AsyncSession,
+    *,
+    owner_user_id: int | None,
+    plan_id: int,
+    from_status: str,
+    to_status: str,
+    count: int = 1,
+) -> None:
+    if from_status == to_status:
+        return
+    owner = _owner_key(owner_user_id)
+    await apply_inventory_deltas(
+        db,
+        {
+            (owner, int(plan_id), from_status): -int(count),
+            (owner, int(plan_id), to_status): int(count),
+        },
+    )
+
+
+async def record_transitions(db: AsyncSession, changes: list[tuple[int | None, int, str, str]]) -> None:
+    """Many transitions at once: [(owner_user_id, plan_id, from_status, to_status)] -> one upsert."""
+    deltas: dict[InventoryKey, int] = defaultdict(int)
+    for owner_user_id, plan_id, from_status, to_status in changes:
+        if from_status == to_status:
+            continue
+        owner = _owner_key(owner_user_id)
+        deltas[(owner, int(plan_id), from_status)] -= 1
+        deltas[(owner, int(plan_id), to_status)] += 1
+    await apply_inventory_deltas(db, deltas)
+
+
+async def get_inventory(
+    db: AsyncSession,
+    *,
+    owner_user_ids: list[int] | None,
+    plan_id: int | None = None,
+) -> list[dict]:
+    """
+    [{owner_user_id, plan_id, unused, reserved, used, void, total}], one entry
+    per (owner, plan). Reads only counter rows, never coupons.
+    """
+    stmt = select(
+        CouponInventoryCount.owner_user_id,
+        CouponInventoryCount.plan_id,
+        CouponInventoryCount.status,
+        CouponInventoryCount.count,
+    )
+    if owner_user_ids is not None:
+        stmt = stmt.where(CouponInventoryCount.owner_user_id.in_([int(x) for x in owner_user_ids]))
+    if plan_id is not None:
+        stmt = stmt.where(CouponInventoryCount.plan_id == int(plan_id))
+
+    res = await db.execute(stmt)
+
+    by_key: dict[tuple[int, int], dict] = defaultdict(dict)
+    for owner, plan, status, count in res.all():
+        by_key[(int(owner), int(plan))][status] = int(count)
+
+    out: list[dict] = []
+    for (owner, plan), counts in sorted(by_key.items()):
+        row = {
+            "owner_user_id": owner if owner != NO_OWNER else None,
+            "plan_id": plan,
+        }
+        for status in COUPON_STATUSES:
+            row[status] = counts.get(status, 0)
+        row["total"] = sum(row[s] for s in COUPON_STATUSES)
+        out.append(row)
+    return out
+
+
+async def rebuild_inventory_counts(db: AsyncSession) -> int:
+    """
+    Recompute every counter from coupons (initial backfill / repair).
+    Locks the counter table for the duration so concurrent deltas wait.
+    Returns the number of counter rows written.
+    """
+    try:
+        await db.execute(text("LOCK TABLE public.coupon_inventory_counts IN EXCLUSIVE MODE"))
+        await db.execute(delete(CouponInventoryCount))
+        res = await db.execute(
+            text(
+                """
+                INSERT INTO public.coupon_inventory_counts (owner_user_id, plan_id, status, count)
+                SELECT COALESCE(owner_user_id, 0), plan_id, status, count(*)
+                FROM public.coupons
+                GROUP BY 1, 2, 3
+                """
+            )
+        )
+        await db.commit()
+        return int(res.rowcount or 0)
+    except Exception:
+        await db.rollback()
+        raise
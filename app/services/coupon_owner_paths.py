@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.db import engine
+from app.models.user import User
+
+
+# coupons.owner_path / coupons.owner_bucket_depth1 are copies of the owner's
+# users.path (and its depth-1 ancestor) so subtree coupon queries can filter
+# on coupons alone (GiST on owner_path) instead of joining users per row.
+# Coupon ownership is set when a coupon is minted and user paths never move,
+# so writing them at mint time (plus the backfill below) keeps them exact.
+# The backfill runs once from the lifespan at startup (one worker, advisory
+# lock); until it has reached a pre-existing coupon, seller and report
+# queries fall back to users.path for it.
+
+BACKFILL_BATCH = 5000
+
+
+def bucket_depth1_from_path(path: Optional[str]) -> Optional[int]:
+    """
+    'u1.u7.u42' -> 7: the depth-1 ancestor (top-level seller under the admin
+    root) of the path's user; the user itself if it is at depth 1; None for
+    the root.
+    """
+    if not path:
+        return None
+    labels = str(path).split(".")
+    if len(labels) < 2 or not labels[1].startswith("u"):
+        return None
+    try:
+        return int(labels[1][1:])
+    except ValueError:
+        return None
+
+
+def direct_child_bucket(
+    *, seller_path: str, seller_id: int, owner_id: Optional[int], owner_path: Optional[str]
+) -> Optional[int]:
+    """
+    Bucket a coupon owner inside the seller's subtree into the seller itself
+    or the seller's direct child above it (grandchildren are never exposed).
+    """
+    if owner_id is None or owner_path is None:
+        return None
+    sp = str(seller_path)
+    op = str(owner_path)
+    if op == sp:
+        return int(seller_id)
+    prefix = sp + "."
+    if not op.startswith(prefix):
+        # outside subtree (should not happen if queries are correct)
+        return int(seller_id)
+    rest = op[len(prefix) :]
+    first = rest.split(".", 1)[0]
+    if first.startswith("u"):
+        try:
+            return int(first[1:])
+        except Exception:
+            return int(seller_id)
+    return int(seller_id)
+
+
+def coupon_owner_columns(owner: Optional[User]) -> dict:
+    """Values for Coupon(owner_path=..., owner_bucket_depth1=...) from an already loaded owner."""
+    path = str(owner.path) if owner is not None and owner.path else None
+    return {"owner_path": path, "owner_bucket_depth1": bucket_depth1_from_path(path)}
+
+
+async def load_coupon_owner_columns(db: AsyncSession, owner_user_id: Optional[int]) -> dict:
+    if owner_user_id is None:
+        return coupon_owner_columns(None)
+    res = await db.execute(select(User.path).where(User.id == int(owner_user_id)))
+    path = res.scalar_one_or_none()
+    path = str(path) if path else None
+    return {"owner_path": path, "owner_bucket_depth1": bucket_depth1_from_path(path)}
+
+
+_BACKFILL_LOCK_ID = 43_0001
+
+# One batch: the next :limit coupons by primary key after :after (keyset, so
+# the walk reads the table once however many batches it takes), of which the
+# drifted ones are updated. Reports where to resume.
+_BACKFILL_SQL = text(
+    """
+    WITH chunk AS (
+        SELECT c.coupon_code
+        FROM public.coupons c
+        WHERE c.coupon_code > :after
+        ORDER BY c.coupon_code
+        LIMIT :limit
+    ),
+    todo AS (
+        SELECT c.coupon_code, u.path
+        FROM chunk k
+        JOIN public.coupons c ON c.coupon_code = k.coupon_code
+        JOIN public.users u ON u.id = c.owner_user_id
+        WHERE c.owner_path IS DISTINCT FROM u.path
+        FOR UPDATE OF c SKIP LOCKED
+    ),
+    upd AS (
+        UPDATE public.coupons c
+        SET owner_path = t.path,
+            owner_bucket_depth1 = CASE
+                WHEN nlevel(t.path) >= 2 THEN CAST(substr(ltree2text(subpath(t.path, 1, 1)), 2) AS bigint)
+            END
+        FROM todo t
+        WHERE c.coupon_code = t.coupon_code
+        RETURNING 1
+    )
+    SELECT
+        (SELECT count(*) FROM chunk) AS scanned,
+        (SELECT max(coupon_code) FROM chunk) AS last_code,
+        (SELECT count(*) FROM upd) AS updated
+    """
+)
+
+
+async def backfill_coupon_owner_paths(db: AsyncSession, *, batch_size: int = BACKFILL_BATCH) -> int:
+    """
+    Fill owner_path / owner_bucket_depth1 for coupons written before the
+    columns existed (or repair drift). Walks coupons by coupon_code, one
+    short transaction per batch. Returns the number of coupons updated.
+    """
+    total = 0
+    after = ""
+    while True:
+        try:
+            res = await db.execute(_BACKFILL_SQL, {"after": after, "limit": int(batch_size)})
+            row = res.one()
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        total += int(row.updated)
+        if int(row.scanned) < int(batch_size):
+            return total
+        after = str(row.last_code)
+
+
+async def run_coupon_owner_path_backfill() -> dict:
+    """
+    Startup entry point: one worker walks the table, the others skip it.
+    The session-level advisory lock lives on a dedicated connection for the
+    whole walk (the per-batch commits keep it). updated=-1 if another worker
+    holds the lock.
+    """
+    async with engine.connect() as conn:
+        got = await conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": _BACKFILL_LOCK_ID})
+        locked = bool(got.scalar_one())
+        await conn.commit()
+        if not locked:
+            return {"updated": -1}
+        try:
+            async with AsyncSession(bind=conn, expire_on_commit=False, autoflush=False) as db:
+                return {"updated": await backfill_coupon_owner_paths(db)}
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _BACKFILL_LOCK_ID})
+            await conn.commit()
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import json
+import logging
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.models.plan import Plan
+from app.models.user import User
+from app.services.coupon_batches import admin_generate_coupon_batch
+from app.services.coupon_inventory import apply_inventory_deltas, get_inventory
+from app.services.coupon_owner_paths import coupon_owner_columns
+
+logger = logging.getLogger(__name__)
+
+
+# Optional inventory mode (COUPON_POOL_ENABLED): every active plan keeps a pool
+# of pre-minted `unused` coupons owned by a system account
+# (COUPON_POOL_OWNER_USER_ID). Purchases take coupons from the pool and hand
+# them to the buyer's chosen owner instead of INSERTing new rows; a background
+# job tops the pools up. An empty / short pool just falls back to minting.
+
+_REFILL_LOCK_ID = 29_0003
+
+
+def pool_enabled() -> bool:
+    return bool(settings.COUPON_POOL_ENABLED) and settings.COUPON_POOL_OWNER_USER_ID is not None
+
+
+# picked -> N pooled coupons, skipping rows another purchase is claiming
+# upd    -> reassign ownership (and created_at: the buyer's coupon starts now),
+#           detach from the refill batch
+# ev     -> "assigned" event per coupon
+# items  -> order_items rows
+_CLAIM_SQL = text(
+    """
+    WITH picked AS (
+        SELECT c.coupon_code
+        FROM public.coupons c
+        WHERE c.plan_id = :plan_id
+          AND c.owner_user_id = :pool_owner_user_id
+          AND c.status = 'unused'
+        ORDER BY c.created_at, c.coupon_code
+        LIMIT :quantity
+        FOR UPDATE OF c SKIP LOCKED
+    ),
+    upd AS (
+        UPDATE public.coupons c
+        SET owner_user_id = :owner_user_id,
+            owner_path = CAST(:owner_path AS ltree),
+            owner_bucket_depth1 = CAST(:owner_bucket_depth1 AS bigint),
+            created_by_user_id = :actor_user_id,
+            notes = CAST(:notes AS text),
+            -- sold: no longer part of the refill batch (batch code downloads, batch void)
+            generation_batch_id = NULL,
+            created_at = now()
+        FROM picked p
+        WHERE c.coupon_code = p.coupon_code
+        RETURNING c.coupon_code
+    ),
+    ev AS (
+        INSERT INTO public.coupon_events (coupon_code, actor_user_id, event_type, meta)
+        SELECT u.coupon_code, :actor_user_id, 'assigned', CAST(:meta AS jsonb)
+        FROM upd u
+    ),
+    items AS (
+        INSERT INTO public.order_items (order_id, coupon_code)
+        SELECT :order_id, u.coupon_code
+        FROM upd u
+    )
+    SELECT coupon_code FROM upd ORDER BY coupon_code
+    """
+)
+
+
+async def claim_pooled_coupons(
+    db: AsyncSession,
+    *,
+    plan_id: int,
+    quantity: int,
+    owner: User,
+    actor_user_id: int,
+    order_id: int,
+    notes: str | None,
+    meta: dict,
+) -> list[str]:
+    """
+    Take up to `quantity` pooled coupons for one paid order in ONE statement
+    (caller's transaction, no commit): reassign owner, log the event, create the
+    order items, and move the inventory counters from the pool to the owner.
+
+    Returns the claimed codes (possibly fewer than asked; caller mints the rest).
+    """
+    if not pool_enabled() or int(quantity) <= 0:
+        return []
+
+    pool_owner_id = int(settings.COUPON_POOL_OWNER_USER_ID)
+    res = await db.execute(
+        _CLAIM_SQL,
+        {
+            **coupon_owner_columns(owner),
+            "plan_id": int(plan_id),
+            "pool_owner_user_id": pool_owner_id,
+            "quantity": int(quantity),
+            "owner_user_id": int(owner.id),
+            "actor_user_id": int(actor_user_id),
+            "notes": notes,
+            "order_id": int(order_id),
+            "meta": json.dumps({**meta, "source": "pool"}),
+        },
+    )
+    codes = [str(c) for c in res.scalars().all()]
+
+    if codes:
+        await apply_inventory_deltas(
+            db,
+            {
+                (pool_owner_id, int(plan_id), "unused"): -len(codes),
+                (int(owner.id), int(plan_id), "unused"): len(codes),
+            },
+        )
+    return codes
+
+
+async def refill_coupon_pools() -> dict:
+    """
+    Background job: top every active plan's pool up to COUPON_POOL_HIGH_WATER
+    once it drops below COUPON_POOL_LOW_WATER. Pool levels come from
+    coupon_inventory_counts (no coupon scan); minting goes through the bulk
+    COPY path (one generation batch per refill).
+
+    One transaction per plan, guarded by a per-plan advisory lock so two
+    workers never refill the same pool at once.
+    Returns {plan_id: minted} for the plans that were refilled.
+    """
+    if not pool_enabled():
+        return {}
+
+    pool_owner_id = int(settings.COUPON_POOL_OWNER_USER_ID)
+    high = int(settings.COUPON_POOL_HIGH_WATER)
+    low = int(settings.COUPON_POOL_LOW_WATER)
+
+    async with AsyncSessionLocal() as db:
+        res = await db.execute(select(Plan.id).where(Plan.is_active.is_(True)).order_by(Plan.id.asc()))
+        plan_ids = [int(x) for x in res.scalars().all()]
+
+    refilled: dict[int, int] = {}
+    for plan_id in plan_ids:
+        async with AsyncSessionLocal() as db:
+            got = await db.execute(
+                text("SELECT pg_try_advisory_xact_lock(:k, CAST(:plan_id AS integer))"),
+                {"k": _REFILL_LOCK_ID, "plan_id": plan_id},
+            )
+            if not got.scalar_one():
+                await db.rollback()
+                continue
+
+            rows = await get_inventory(db, owner_user_ids=[pool_owner_id], plan_id=plan_id)
+            level = sum(int(r["unused"]) for r in rows)
+            if level >= low:
+                await db.rollback()
+                continue
+
+            try:
+                # commits (and so releases the lock) when the batch is done
+                batch = await admin_generate_coupon_batch(
+                    db,
+                    plan_id=plan_id,
+                    count=high - level,
+                    created_by_user_id=pool_owner_id,
+                    owner_user_id=pool_owner_id,
+                    notes="pool refill",
+                )
+            except Exception:
+                logger.exception("coupon pool refill failed for plan %s", plan_id)
+                continue
+            refilled[plan_id] = int(batch.generated_count)
+
+    if refilled:
+        logger.info("coupon pools refilled: %s", refilled)
+    return refilled
+
+
+async def pool_levels(db: AsyncSession) -> list[dict]:
+    """Current pool size per plan (from the inventory counters)."""
+    if not pool_enabled():
+        return []
+    rows = await get_inventory(db, owner_user_ids=[int(settings.COUPON_POOL_OWNER_USER_ID)], plan_id=None)
+    return [{"plan_id": int(r["plan_id"]), "unused": int(r["unused"])} for r in rows]
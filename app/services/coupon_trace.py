@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from sqlalchemy import select
+from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.certificate import Certificate
@@ -10,12 +10,98 @@ from app.models.order import Order
 from app.models.order_item import OrderItem
 from app.models.plan import Plan
 from app.models.user import User
+from app.services.coupon_transitions import _udid_hash_bytes
 
 
 class CouponTraceError(Exception):
     pass
 
 
+UDID_LOOKUP_LIMIT = 100
+
+# Every coupon linked to a UDID (reserved for it, used by it, or certified for
+# it) with its state, plan, order and certificate, in ONE statement. The hash
+# columns and certificates.udid are btree-indexed, so this never scans coupons.
+_FIND_BY_UDID_SQL = text(
+    """
+    WITH hits AS (
+        SELECT coupon_code, 'reserved' AS matched_on FROM public.coupons WHERE reserved_udid_hash = :udid_hash
+        UNION ALL
+        SELECT coupon_code, 'used' FROM public.coupons WHERE used_udid_hash = :udid_hash
+        UNION ALL
+        SELECT coupon_code, 'certificate' FROM public.certificates WHERE udid = :udid
+    ),
+    codes AS (
+        SELECT coupon_code, array_agg(DISTINCT matched_on) AS matched_on
+        FROM hits
+        GROUP BY coupon_code
+    )
+    SELECT
+        c.coupon_code,
+        c.status,
+        c.plan_id,
+        p.title AS plan_title,
+        c.owner_user_id,
+        c.reserved_udid_suffix,
+        c.reserved_at,
+        c.used_udid_suffix,
+        c.used_at,
+        c.last_failure_reason,
+        c.created_at,
+        codes.matched_on,
+        o.order_no,
+        o.tx_id,
+        o.buyer_user_id,
+        cert.serial AS certificate_serial,
+        cert.created_at AS certificate_created_at
+    FROM codes
+    JOIN public.coupons c ON c.coupon_code = codes.coupon_code
+    LEFT JOIN public.plans p ON p.id = c.plan_id
+    LEFT JOIN public.order_items oi ON oi.coupon_code = c.coupon_code
+    LEFT JOIN public.orders o ON o.id = oi.order_id
+    LEFT JOIN public.certificates cert ON cert.coupon_code = c.coupon_code
+    ORDER BY c.created_at DESC, c.coupon_code DESC
+    LIMIT :limit
+    """
+)
+
+
+async def find_by_udid(db: AsyncSession, *, udid: str, limit: int = UDID_LOOKUP_LIMIT) -> list[dict]:
+    clean_udid = (udid or "").strip()
+    if not clean_udid:
+        raise CouponTraceError("udid is required.")
+
+    res = await db.execute(
+        _FIND_BY_UDID_SQL,
+        {"udid_hash": _udid_hash_bytes(clean_udid), "udid": clean_udid, "limit": int(limit)},
+    )
+
+    out: list[dict] = []
+    for r in res.mappings().all():
+        out.append(
+            {
+                "coupon_code": r["coupon_code"],
+                "status": r["status"],
+                "plan_id": int(r["plan_id"]),
+                "plan_title": r["plan_title"] or "",
+                "owner_user_id": int(r["owner_user_id"]) if r["owner_user_id"] is not None else None,
+                "matched_on": sorted(r["matched_on"] or []),
+                "reserved_udid_suffix": r["reserved_udid_suffix"],
+                "reserved_at": r["reserved_at"],
+                "used_udid_suffix": r["used_udid_suffix"],
+                "used_at": r["used_at"],
+                "last_failure_reason": r["last_failure_reason"],
+                "created_at": r["created_at"],
+                "order_no": int(r["order_no"]) if r["order_no"] is not None else None,
+                "tx_id": str(r["tx_id"]) if r["tx_id"] else None,
+                "buyer_user_id": int(r["buyer_user_id"]) if r["buyer_user_id"] is not None else None,
+                "certificate_serial": r["certificate_serial"],
+                "certificate_created_at": r["certificate_created_at"],
+            }
+        )
+    return out
+
+
 async def _username_map(db: AsyncSession, user_ids: list[int]) -> dict[int, str]:
     user_ids = [int(x) for x in set(user_ids) if x is not None]
     if not user_ids:
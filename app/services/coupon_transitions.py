@@ -0,0 +1,605 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.coupon_inventory import record_transitions
+from app.services.outbox import COUPON_STATUS_CHANGED, emit_coupon_status_changed_many
+
+
+BATCH_MAX_CODES = 5000
+
+# Per-code outcomes of a batch transition
+OUTCOME_OK = "ok"
+OUTCOME_NOT_FOUND = "not_found"
+OUTCOME_WRONG_STATE = "wrong_state"
+OUTCOME_LOCKED = "locked"  # eligible, but another transaction holds it (SKIP LOCKED)
+
+# Failure steps meaning "the provider may have issued the device": such a
+# reservation is held for an admin (admin unreserve / void) and never swept.
+FAILURE_STEP_PROVIDER_UNKNOWN = "provider_unknown"
+FAILURE_STEP_FINALIZE = "finalize"
+HELD_FAILURE_STEPS = (FAILURE_STEP_PROVIDER_UNKNOWN, FAILURE_STEP_FINALIZE)
+
+
+def _udid_suffix(udid: str) -> str:
+    u = (udid or "").strip()
+    if len(u) <= 6:
+        return u
+    return u[-6:]
+
+
+def _udid_hash_bytes(udid: str) -> bytes:
+    # deterministic hash for indexing/matching without exposing whole value
+    u = (udid or "").strip().encode("utf-8")
+    return hashlib.sha256(u).digest()
+
+
+@dataclass(frozen=True)
+class _Transition:
+    event_type: str
+    from_statuses: tuple[str, ...]
+    set_clause: str
+    # extra condition on the locked row (single-coupon CAS only)
+    cas_guard: str = ""
+
+
+_FAILURE_SET = """
+    last_failure_reason = COALESCE(CAST(:failure_reason AS text), c.last_failure_reason),
+    last_failure_step = CASE WHEN CAST(:failure_reason AS text) IS NULL THEN c.last_failure_step ELSE :failure_step END,
+    last_failed_at = CASE WHEN CAST(:failure_reason AS text) IS NULL THEN c.last_failed_at ELSE now() END
+"""
+
+_TRANSITIONS: dict[str, _Transition] = {
+    "void": _Transition(
+        event_type="voided",
+        from_statuses=("unused", "reserved"),
+        set_clause="status = 'void'," + _FAILURE_SET,
+    ),
+    "unreserve": _Transition(
+        event_type="unreserved",
+        from_statuses=("reserved",),
+        set_clause="""
+            status = 'unused',
+            reserved_by_user_id = NULL,
+            reserved_udid = NULL,
+            reserved_udid_hash = NULL,
+            reserved_udid_suffix = NULL,
+            reserved_at = NULL,
+        """
+        + _FAILURE_SET,
+    ),
+    "reserve": _Transition(
+        event_type="reserved",
+        from_statuses=("unused",),
+        set_clause="""
+            status = 'reserved',
+            reserved_by_user_id = :actor_user_id,
+            reserved_udid = r.udid,
+            reserved_udid_hash = r.udid_hash,
+            reserved_udid_suffix = r.udid_suffix,
+            reserved_at = now(),
+            notes = COALESCE(CAST(:notes AS text), c.notes)
+        """,
+    ),
+}
+
+
+# Single-coupon compare-and-set transitions (transition_coupon). Same shape as
+# _TRANSITIONS, but every value comes from bound parameters.
+
+# No udid given (admin actions): any reservation. With a udid: only that one,
+# so a reservation that was swept and re-taken meanwhile is left alone.
+_RESERVED_BY_UDID = (
+    "AND (CAST(:udid_hash AS bytea) IS NULL OR c.reserved_udid_hash = CAST(:udid_hash AS bytea))"
+)
+_CAS_TRANSITIONS: dict[str, _Transition] = {
+    # re-voiding is allowed (as before), only used coupons cannot be voided
+    "void": _Transition(
+        event_type="voided",
+        from_statuses=("unused", "reserved", "void"),
+        set_clause=_TRANSITIONS["void"].set_clause,
+    ),
+    # with a udid: only if the reservation is still the caller's
+    "unreserve": _Transition(
+        event_type="unreserved",
+        from_statuses=("reserved",),
+        set_clause=_TRANSITIONS["unreserve"].set_clause,
+        cas_guard=_RESERVED_BY_UDID,
+    ),
+    "reserve": _Transition(
+        event_type="reserved",
+        from_statuses=("unused",),
+        set_clause="""
+            status = 'reserved',
+            reserved_by_user_id = :actor_user_id,
+            reserved_udid = :udid,
+            reserved_udid_hash = :udid_hash,
+            reserved_udid_suffix = :udid_suffix,
+            reserved_at = now(),
+            notes = COALESCE(CAST(:notes AS text), c.notes)
+        """,
+    ),
+    # provisioning failure: stays reserved (the sweeper frees it after the TTL)
+    "fail": _Transition(
+        event_type="failed",
+        from_statuses=("reserved",),
+        set_clause="status = c.status," + _FAILURE_SET,
+        cas_guard=_RESERVED_BY_UDID,
+    ),
+    # provider issued the device for the reserved udid
+    "use": _Transition(
+        event_type="used",
+        from_statuses=("reserved",),
+        set_clause="""
+            status = 'used',
+            used_by_user_id = COALESCE(CAST(:actor_user_id AS bigint), c.reserved_by_user_id),
+            used_udid = :udid,
+            used_udid_hash = :udid_hash,
+            used_udid_suffix = :udid_suffix,
+            used_at = now(),
+            provider_req_id = COALESCE(CAST(:provider_req_id AS text), c.provider_req_id),
+            notes = COALESCE(CAST(:notes AS text), c.notes)
+        """,
+        cas_guard=_RESERVED_BY_UDID,
+    ),
+}
+
+
+def _cas_statement(t: _Transition) -> str:
+    """
+    One round trip for a single-coupon transition:
+      cur -> the row as it is now (locked, so from_status is exact)
+      upd -> UPDATE ... only if cur.status is an expected one
+      ev / inv / ob -> coupon_events row, inventory counters, outbox event
+    The final SELECT always returns one row: current_status NULL means
+    not found, upd columns NULL means wrong state.
+    """
+    statuses = ", ".join(f"'{st}'" for st in t.from_statuses)
+    return f"""
+    WITH cur AS (
+        SELECT c.coupon_code, c.status
+        FROM public.coupons c
+        WHERE c.coupon_code = :coupon_code
+        FOR UPDATE
+    ),
+    upd AS (
+        UPDATE public.coupons c
+        SET {t.set_clause}
+        FROM cur
+        WHERE c.coupon_code = cur.coupon_code
+          AND cur.status IN ({statuses})
+          {t.cas_guard}
+        RETURNING c.*, cur.status AS from_status
+    ),
+    ev AS (
+        INSERT INTO public.coupon_events (coupon_code, actor_user_id, event_type, meta)
+        SELECT u.coupon_code, :actor_user_id, :event_type, CAST(:meta AS jsonb)
+        FROM upd u
+    ),
+    inv AS (
+        INSERT INTO public.coupon_inventory_counts (owner_user_id, plan_id, status, count)
+        SELECT COALESCE(u.owner_user_id, 0), u.plan_id, d.status, d.delta
+        FROM upd u
+        CROSS JOIN LATERAL (VALUES (u.from_status, -1), (u.status, 1)) AS d(status, delta)
+        WHERE u.from_status <> u.status
+        ORDER BY 1, 2, 3
+        ON CONFLICT ON CONSTRAINT coupon_inventory_counts_pkey
+        DO UPDATE SET count = public.coupon_inventory_counts.count + EXCLUDED.count
+    ),
+    ob AS (
+        INSERT INTO public.outbox_events (event_type, payload)
+        SELECT :outbox_event_type, jsonb_build_object(
+            'coupon_code', u.coupon_code,
+            'from', u.from_status,
+            'to', u.status,
+            'actor_user_id', CAST(:actor_user_id AS bigint),
+            'plan_id', u.plan_id,
+            'owner_user_id', u.owner_user_id
+        )
+        FROM upd u
+        WHERE u.from_status <> u.status
+    )
+    SELECT cur.status AS current_status, upd.*
+    FROM (SELECT 1) AS one
+    LEFT JOIN cur ON TRUE
+    LEFT JOIN upd ON TRUE
+    """
+
+
+_CAS_SQL = {action: text(_cas_statement(t)) for action, t in _CAS_TRANSITIONS.items()}
+
+
+@dataclass(frozen=True)
+class CouponTransitionResult:
+    outcome: str  # ok | not_found | wrong_state
+    current_status: str | None
+    # the updated coupon row (+ from_status), only when outcome == "ok"
+    coupon: dict | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.outcome == OUTCOME_OK
+
+
+async def transition_coupon(
+    db: AsyncSession,
+    *,
+    action: str,
+    coupon_code: str,
+    actor_user_id: int | None,
+    udid: str | None = None,
+    notes: str | None = None,
+    reason: str | None = None,
+    failure_step: str | None = None,
+    provider_req_id: str | None = None,
+    event_meta: dict | None = None,
+) -> CouponTransitionResult:
+    """
+    Compare-and-set transition of one coupon, in ONE statement (caller's
+    transaction, no commit): the status check, the update, the coupon event,
+    the inventory counters and the outbox event.
+
+    Never raises for a missing coupon or a wrong status; check `.outcome`.
+    For unreserve / fail / use, passing `udid` also requires the reservation
+    to be for that udid (wrong_state otherwise).
+    """
+    t = _CAS_TRANSITIONS.get(action)
+    if t is None:
+        raise ValueError(f"Unknown coupon transition: {action}")
+
+    clean_udid = (udid or "").strip()
+    params = {
+        "coupon_code": coupon_code,
+        "actor_user_id": int(actor_user_id) if actor_user_id is not None else None,
+        "event_type": t.event_type,
+        "outbox_event_type": COUPON_STATUS_CHANGED,
+        "meta": json.dumps(event_meta or {}),
+        "failure_reason": reason,
+        "failure_step": failure_step,
+        "notes": notes,
+        "udid": clean_udid or None,
+        "udid_hash": _udid_hash_bytes(clean_udid) if clean_udid else None,
+        "udid_suffix": _udid_suffix(clean_udid) if clean_udid else None,
+        "provider_req_id": provider_req_id,
+    }
+
+    res = await db.execute(_CAS_SQL[action], params)
+    row = res.mappings().one()
+
+    if row["current_status"] is None:
+        return CouponTransitionResult(outcome=OUTCOME_NOT_FOUND, current_status=None)
+    if row["coupon_code"] is None:
+        return CouponTransitionResult(outcome=OUTCOME_WRONG_STATE, current_status=row["current_status"])
+
+    coupon = {k: v for k, v in row.items() if k != "current_status"}
+    return CouponTransitionResult(outcome=OUTCOME_OK, current_status=coupon["status"], coupon=coupon)
+
+
+def _statement(t: _Transition, *, by_filter: bool, with_udids: bool, reserved_first: bool = False) -> str:
+    """
+    One statement per batch:
+      locked -> eligible rows, FOR UPDATE SKIP LOCKED (never waits on a row
+                someone else is transitioning)
+      upd    -> the transition, UPDATE ... RETURNING
+      ev     -> one coupon_events row per updated coupon
+    In code-list mode the final SELECT classifies every requested code from the
+    same snapshot; in filter mode it returns the updated rows only.
+    """
+    # inlined (constants from _TRANSITIONS) so the planner can match partial indexes
+    statuses = ", ".join(f"'{st}'" for st in t.from_statuses)
+
+    if with_udids:
+        req = """
+        req AS (
+            SELECT * FROM unnest(
+                CAST(:codes AS text[]), CAST(:udids AS text[]),
+                CAST(:udid_hashes AS bytea[]), CAST(:udid_suffixes AS text[])
+            ) WITH ORDINALITY AS t(coupon_code, udid, udid_hash, udid_suffix, ord)
+        ),"""
+    elif not by_filter:
+        req = """
+        req AS (
+            SELECT * FROM unnest(CAST(:codes AS text[])) WITH ORDINALITY AS t(coupon_code, ord)
+        ),"""
+    else:
+        req = ""
+
+    if by_filter:
+        # oldest reservations first when sweeping by age (partial index
+        # ix_coupons_reserved_at_reserved), otherwise creation order
+        order_by = "c.reserved_at, c.coupon_code" if reserved_first else "c.created_at, c.coupon_code"
+        # age filter (sweeper): skip reservations held after an unknown provider outcome
+        held_steps = ", ".join(f"'{st}'" for st in HELD_FAILURE_STEPS)
+        locked = f"""
+        locked AS (
+            SELECT c.coupon_code, c.status AS from_status
+            FROM public.coupons c
+            WHERE c.status IN ({statuses})
+              AND (CAST(:plan_id AS bigint) IS NULL OR c.plan_id = CAST(:plan_id AS bigint))
+              AND (CAST(:owner_user_id AS bigint) IS NULL OR c.owner_user_id = CAST(:owner_user_id AS bigint))
+              AND (CAST(:generation_batch_id AS bigint) IS NULL
+                   OR c.generation_batch_id = CAST(:generation_batch_id AS bigint))
+              AND (CAST(:reserved_before AS timestamptz) IS NULL
+                   OR (c.reserved_at < CAST(:reserved_before AS timestamptz)
+                       AND NOT COALESCE(c.last_failure_step IN ({held_steps})
+                                        AND c.last_failed_at >= c.reserved_at, false)))
+            ORDER BY {order_by}
+            LIMIT :limit
+            FOR UPDATE OF c SKIP LOCKED
+        ),"""
+    else:
+        locked = f"""
+        locked AS (
+            SELECT c.coupon_code, c.status AS from_status
+            FROM public.coupons c
+            JOIN req r ON r.coupon_code = c.coupon_code
+            WHERE c.status IN ({statuses})
+            ORDER BY c.coupon_code
+            FOR UPDATE OF c SKIP LOCKED
+        ),"""
+
+    upd_from = "FROM locked l, req r" if with_udids else "FROM locked l"
+    upd_where = "c.coupon_code = l.coupon_code" + (" AND r.coupon_code = c.coupon_code" if with_udids else "")
+    meta = (
+        "jsonb_build_object('udid_suffix', u.reserved_udid_suffix, 'batch', true) || CAST(:meta AS jsonb)"
+        if with_udids
+        else "CAST(:meta AS jsonb)"
+    )
+
+    head = f"""
+    WITH {req}
+    {locked}
+    upd AS (
+        UPDATE public.coupons c
+        SET {t.set_clause}
+        {upd_from}
+        WHERE {upd_where}
+        RETURNING c.coupon_code, l.from_status, c.status AS to_status, c.plan_id, c.owner_user_id,
+                  c.reserved_udid_suffix
+    ),
+    ev AS (
+        INSERT INTO public.coupon_events (coupon_code, actor_user_id, event_type, meta)
+        SELECT u.coupon_code, :actor_user_id, :event_type, {meta}
+        FROM upd u
+    )
+    """
+
+    if by_filter:
+        return head + """
+    SELECT u.coupon_code, 'ok' AS outcome, u.to_status AS status,
+           u.from_status, u.plan_id, u.owner_user_id
+    FROM upd u
+    ORDER BY u.coupon_code
+    """
+
+    return head + f"""
+    SELECT
+        r.coupon_code,
+        CASE
+            WHEN u.coupon_code IS NOT NULL THEN 'ok'
+            WHEN c.coupon_code IS NULL THEN 'not_found'
+            WHEN c.status IN ({statuses}) THEN 'locked'
+            ELSE 'wrong_state'
+        END AS outcome,
+        COALESCE(u.to_status, c.status) AS status,
+        u.from_status,
+        u.plan_id,
+        u.owner_user_id
+    FROM req r
+    LEFT JOIN upd u ON u.coupon_code = r.coupon_code
+    LEFT JOIN public.coupons c ON c.coupon_code = r.coupon_code
+    ORDER BY r.ord
+    """
+
+
+async def apply_batch_transition(
+    db: AsyncSession,
+    *,
+    action: str,
+    actor_user_id: int | None,
+    codes: list[str] | None = None,
+    udids: list[str] | None = None,
+    plan_id: int | None = None,
+    owner_user_id: int | None = None,
+    generation_batch_id: int | None = None,
+    reserved_before: datetime | None = None,
+    limit: int = BATCH_MAX_CODES,
+    reason: str | None = None,
+    failure_step: str | None = None,
+    notes: str | None = None,
+    event_meta: dict | None = None,
+) -> list[dict]:
+    """
+    Transition many coupons in one statement (caller's transaction, no commit).
+
+    Either `codes` (per-code outcomes, in request order) or a filter
+    (plan_id / owner_user_id / generation_batch_id / reserved_before, up to
+    `limit` rows; only transitioned rows are returned).
+
+    Inventory counters and outbox events for the transitioned rows are written
+    in bulk in the same transaction.
+    """
+    t = _TRANSITIONS.get(action)
+    if t is None:
+        raise ValueError(f"Unknown coupon transition: {action}")
+
+    by_filter = codes is None
+    with_udids = action == "reserve"
+    if with_udids and (by_filter or udids is None or len(udids) != len(codes)):
+        raise ValueError("reserve needs one udid per code")
+
+    params: dict = {
+        "actor_user_id": int(actor_user_id) if actor_user_id is not None else None,
+        "event_type": t.event_type,
+        # reserve: merged into the per-row udid_suffix meta
+        "meta": json.dumps(
+            event_meta if event_meta is not None else ({} if with_udids else {"reason": reason, "batch": True})
+        ),
+        "failure_reason": reason,
+        "failure_step": failure_step,
+        "notes": notes,
+    }
+    if by_filter:
+        params.update(
+            {
+                "plan_id": int(plan_id) if plan_id is not None else None,
+                "owner_user_id": int(owner_user_id) if owner_user_id is not None else None,
+                "generation_batch_id": int(generation_batch_id) if generation_batch_id is not None else None,
+                "reserved_before": reserved_before,
+                "limit": int(limit),
+            }
+        )
+    else:
+        params["codes"] = list(codes)
+        if with_udids:
+            clean = [(u or "").strip() for u in udids]
+            params["udids"] = clean
+            params["udid_hashes"] = [_udid_hash_bytes(u) for u in clean]
+            params["udid_suffixes"] = [_udid_suffix(u) for u in clean]
+
+    sql = _statement(t, by_filter=by_filter, with_udids=with_udids, reserved_first=reserved_before is not None)
+    res = await db.execute(text(sql), params)
+    rows = [dict(r) for r in res.mappings().all()]
+
+    done = [r for r in rows if r["outcome"] == OUTCOME_OK]
+    if done:
+        await record_transitions(
+            db, [(r["owner_user_id"], int(r["plan_id"]), r["from_status"], r["status"]) for r in done]
+        )
+        await emit_coupon_status_changed_many(
+            db,
+            [
+                {
+                    "coupon_code": r["coupon_code"],
+                    "from_status": r["from_status"],
+                    "to_status": r["status"],
+                    "actor_user_id": params["actor_user_id"],
+                    "plan_id": int(r["plan_id"]),
+                    "owner_user_id": int(r["owner_user_id"]) if r["owner_user_id"] is not None else None,
+                }
+                for r in done
+            ],
+        )
+
+    return [{"coupon_code": r["coupon_code"], "outcome": r["outcome"], "status": r["status"]} for r in rows]
+
+
+def _dedupe(codes: list[str]) -> list[str]:
+    seen: set[str] = set()
+    out: list[str] = []
+    for c in codes:
+        c = (c or "").strip()
+        if c and c not in seen:
+            seen.add(c)
+            out.append(c)
+    return out
+
+
+def _summary(action: str, requested: int, outcomes: list[dict]) -> dict:
+    counts = {OUTCOME_OK: 0, OUTCOME_NOT_FOUND: 0, OUTCOME_WRONG_STATE: 0, OUTCOME_LOCKED: 0}
+    for o in outcomes:
+        counts[o["outcome"]] = counts.get(o["outcome"], 0) + 1
+    return {
+        "action": action,
+        "requested": requested,
+        "updated": counts[OUTCOME_OK],
+        "not_found": counts[OUTCOME_NOT_FOUND],
+        "wrong_state": counts[OUTCOME_WRONG_STATE],
+        "locked": counts[OUTCOME_LOCKED],
+        "outcomes": outcomes,
+    }
+
+
+async def admin_batch_transition(
+    db: AsyncSession,
+    *,
+    action: str,
+    actor_user_id: int | None,
+    codes: list[str] | None = None,
+    plan_id: int | None = None,
+    owner_user_id: int | None = None,
+    generation_batch_id: int | None = None,
+    limit: int = BATCH_MAX_CODES,
+    reason: str | None = None,
+) -> dict:
+    """Batch void / unreserve for admins (codes or filter). Commits."""
+    if codes is not None:
+        codes = _dedupe(codes)
+        if not codes:
+            raise HTTPException(status_code=400, detail="coupon_codes is empty")
+        if len(codes) > BATCH_MAX_CODES:
+            raise HTTPException(status_code=400, detail=f"Too many coupon_codes (max {BATCH_MAX_CODES})")
+    elif plan_id is None and owner_user_id is None and generation_batch_id is None:
+        raise HTTPException(status_code=400, detail="Provide coupon_codes or at least one filter")
+
+    step = {"void": "admin_void", "unreserve": "admin_unreserve"}[action]
+    prefix = {"void": "VOID", "unreserve": "ADMIN_UNRESERVE"}[action]
+
+    try:
+        outcomes = await apply_batch_transition(
+            db,
+            action=action,
+            actor_user_id=actor_user_id,
+            codes=codes,
+            plan_id=plan_id,
+            owner_user_id=owner_user_id,
+            generation_batch_id=generation_batch_id,
+            limit=min(int(limit), BATCH_MAX_CODES),
+            reason=f"{prefix}: {reason}" if reason else None,
+            failure_step=step,
+        )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    return _summary(action, len(codes) if codes is not None else len(outcomes), outcomes)
+
+
+async def admin_batch_reserve(
+    db: AsyncSession,
+    *,
+    items: list[tuple[str, str]],  # [(coupon_code, udid)]
+    notes: str | None,
+    actor_user_id: int | None,
+) -> dict:
+    seen: set[str] = set()
+    codes: list[str] = []
+    udids: list[str] = []
+    for code, udid in items:
+        code = (code or "").strip()
+        if not code or code in seen:
+            continue
+        if not (udid or "").strip():
+            raise HTTPException(status_code=400, detail=f"udid is required ({code})")
+        seen.add(code)
+        codes.append(code)
+        udids.append(udid)
+
+    if not codes:
+        raise HTTPException(status_code=400, detail="items is empty")
+    if len(codes) > BATCH_MAX_CODES:
+        raise HTTPException(status_code=400, detail=f"Too many items (max {BATCH_MAX_CODES})")
+
+    try:
+        outcomes = await apply_batch_transition(
+            db,
+            action="reserve",
+            actor_user_id=actor_user_id,
+            codes=codes,
+            udids=udids,
+            notes=notes,
+        )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    return _summary("reserve", len(codes), outcomes)
@@ -1,30 +1,37 @@
 # app/services/coupons.py
 from __future__ import annotations
 
-import hashlib
-import secrets
-from datetime import datetime, timezone
+import base64
+from datetime import datetime
 
 from fastapi import HTTPException
-from sqlalchemy import Integer, String, case, cast, desc, func, select
+from sqlalchemy import and_, desc, func, or_, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import aliased
 
 from app.models.coupon import Coupon
 from app.models.coupon_event import CouponEvent
+from app.models.order import Order
+from app.models.order_item import OrderItem
 from app.models.plan import Plan
 from app.models.user import User
 
 # ✅ NEW: paid “generate coupons” uses the purchase engine (wallet + ledger + profit share + paid order)
-from app.services.purchases import PurchaseError, purchase_plan_and_distribute
+from app.services.purchases import INLINE_KEYS_MAX_QUANTITY, PurchaseError, purchase_plan_and_distribute
+from app.services.coupon_codes import CouponCodeError, allocate_coupon_codes
+from app.services.coupon_inventory import get_inventory, record_minted
+from app.services.coupon_category_versions import load_coupon_category_columns
+from app.services.coupon_owner_paths import bucket_depth1_from_path, direct_child_bucket, load_coupon_owner_columns
+from app.services.coupon_transitions import (
+    OUTCOME_NOT_FOUND,
+    OUTCOME_WRONG_STATE,
+    CouponTransitionResult,
+    _udid_suffix,
+    transition_coupon,
+)
 from app.services.wallet import InsufficientBalance
 
 
-def _generate_coupon_code() -> str:
-    # DB constraint requires: Certify-[0-9a-f]{8}
-    return f"Certify-{secrets.token_hex(4)}"
-
-
 async def _log_event(
     db: AsyncSession,
     *,
@@ -60,14 +67,23 @@ async def admin_generate_coupons(
     created: list[Coupon] = []
 
     try:
-        for _ in range(count):
+        codes = await allocate_coupon_codes(db, count)
+    except CouponCodeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    try:
+        owner_columns = await load_coupon_owner_columns(db, owner_user_id)
+        category_columns = await load_coupon_category_columns(db, plan_id)
+        for code in codes:
             c = Coupon(
-                coupon_code=_generate_coupon_code(),
+                coupon_code=code,
                 plan_id=plan_id,
                 status="unused",
                 created_by_user_id=created_by_user_id,
                 owner_user_id=owner_user_id,
                 notes=notes,
+                **owner_columns,
+                **category_columns,
             )
             db.add(c)
             created.append(c)
@@ -80,6 +96,8 @@ async def admin_generate_coupons(
                 meta={"plan_id": plan_id, "owner_user_id": owner_user_id, "notes": notes},
             )
 
+        await record_minted(db, owner_user_id=owner_user_id, plan_id=plan_id, count=len(created))
+
         await db.commit()
 
         for c in created[:50]:
@@ -92,47 +110,33 @@ async def admin_generate_coupons(
         raise
 
 
+def _raise_for_outcome(res: CouponTransitionResult, *, wrong_state: str) -> None:
+    if res.outcome == OUTCOME_NOT_FOUND:
+        raise HTTPException(status_code=404, detail="Coupon not found")
+    if res.outcome == OUTCOME_WRONG_STATE:
+        raise HTTPException(status_code=400, detail=wrong_state.format(current=res.current_status))
+
+
 async def admin_unreserve_coupon(
     db: AsyncSession,
     *,
     coupon_code: str,
     reason: str | None,
     actor_user_id: int | None,
-) -> Coupon:
-    stmt = select(Coupon).where(Coupon.coupon_code == coupon_code).with_for_update()
-    res = await db.execute(stmt)
-    coupon = res.scalar_one_or_none()
-
-    if not coupon:
-        raise HTTPException(status_code=404, detail="Coupon not found")
-
-    if coupon.status != "reserved":
-        raise HTTPException(status_code=400, detail="Coupon is not reserved")
-
+) -> dict:
     try:
-        coupon.status = "unused"
-        coupon.reserved_by_user_id = None
-        coupon.reserved_udid = None
-        coupon.reserved_udid_hash = None
-        coupon.reserved_udid_suffix = None
-        coupon.reserved_at = None
-
-        if reason:
-            coupon.last_failure_reason = f"ADMIN_UNRESERVE: {reason}"
-            coupon.last_failure_step = "admin_unreserve"
-            coupon.last_failed_at = datetime.now(timezone.utc)
-
-        await _log_event(
+        res = await transition_coupon(
             db,
-            coupon_code=coupon.coupon_code,
+            action="unreserve",
+            coupon_code=coupon_code,
             actor_user_id=actor_user_id,
-            event_type="unreserved",
-            meta={"reason": reason},
+            reason=f"ADMIN_UNRESERVE: {reason}" if reason else None,
+            failure_step="admin_unreserve",
+            event_meta={"reason": reason},
         )
-
+        _raise_for_outcome(res, wrong_state="Coupon is not reserved")
         await db.commit()
-        await db.refresh(coupon)
-        return coupon
+        return res.coupon
 
     except Exception:
         await db.rollback()
@@ -145,55 +149,26 @@ async def admin_void_coupon(
     coupon_code: str,
     reason: str | None,
     actor_user_id: int | None,
-) -> Coupon:
-    stmt = select(Coupon).where(Coupon.coupon_code == coupon_code).with_for_update()
-    res = await db.execute(stmt)
-    coupon = res.scalar_one_or_none()
-
-    if not coupon:
-        raise HTTPException(status_code=404, detail="Coupon not found")
-
-    if coupon.status == "used":
-        raise HTTPException(status_code=400, detail="Cannot void a used coupon")
-
+) -> dict:
     try:
-        coupon.status = "void"
-
-        if reason:
-            coupon.last_failure_reason = f"VOID: {reason}"
-            coupon.last_failure_step = "admin_void"
-            coupon.last_failed_at = datetime.now(timezone.utc)
-
-        await _log_event(
+        res = await transition_coupon(
             db,
-            coupon_code=coupon.coupon_code,
+            action="void",
+            coupon_code=coupon_code,
             actor_user_id=actor_user_id,
-            event_type="voided",
-            meta={"reason": reason},
+            reason=f"VOID: {reason}" if reason else None,
+            failure_step="admin_void",
+            event_meta={"reason": reason},
         )
-
+        _raise_for_outcome(res, wrong_state="Cannot void a used coupon")
         await db.commit()
-        await db.refresh(coupon)
-        return coupon
+        return res.coupon
 
     except Exception:
         await db.rollback()
         raise
 
 
-def _udid_suffix(udid: str) -> str:
-    u = (udid or "").strip()
-    if len(u) <= 6:
-        return u
-    return u[-6:]
-
-
-def _udid_hash_bytes(udid: str) -> bytes:
-    # deterministic hash for indexing/matching without exposing whole value
-    u = (udid or "").strip().encode("utf-8")
-    return hashlib.sha256(u).digest()
-
-
 async def admin_reserve_coupon(
     db: AsyncSession,
     *,
@@ -201,43 +176,24 @@ async def admin_reserve_coupon(
     udid: str,
     notes: str | None,
     actor_user_id: int | None,
-) -> Coupon:
-    stmt = select(Coupon).where(Coupon.coupon_code == coupon_code).with_for_update()
-    res = await db.execute(stmt)
-    coupon = res.scalar_one_or_none()
-
-    if not coupon:
-        raise HTTPException(status_code=404, detail="Coupon not found")
-
-    if coupon.status != "unused":
-        raise HTTPException(status_code=400, detail=f"Coupon is not unused (current: {coupon.status})")
-
+) -> dict:
     clean_udid = (udid or "").strip()
     if not clean_udid:
         raise HTTPException(status_code=400, detail="udid is required")
 
     try:
-        coupon.status = "reserved"
-        coupon.reserved_by_user_id = actor_user_id
-        coupon.reserved_udid = clean_udid
-        coupon.reserved_udid_suffix = _udid_suffix(clean_udid)
-        coupon.reserved_udid_hash = _udid_hash_bytes(clean_udid)
-        coupon.reserved_at = datetime.now(timezone.utc)
-
-        if notes:
-            coupon.notes = notes
-
-        await _log_event(
+        res = await transition_coupon(
             db,
-            coupon_code=coupon.coupon_code,
+            action="reserve",
+            coupon_code=coupon_code,
             actor_user_id=actor_user_id,
-            event_type="reserved",
-            meta={"udid_suffix": coupon.reserved_udid_suffix},
+            udid=clean_udid,
+            notes=notes or None,
+            event_meta={"udid_suffix": _udid_suffix(clean_udid)},
         )
-
+        _raise_for_outcome(res, wrong_state="Coupon is not unused (current: {current})")
         await db.commit()
-        await db.refresh(coupon)
-        return coupon
+        return res.coupon
 
     except Exception:
         await db.rollback()
@@ -251,62 +207,40 @@ async def admin_mark_coupon_failed(
     reason: str,
     step: str | None,
     actor_user_id: int | None,
-) -> Coupon:
-    stmt = select(Coupon).where(Coupon.coupon_code == coupon_code).with_for_update()
-    res = await db.execute(stmt)
-    coupon = res.scalar_one_or_none()
-
-    if not coupon:
-        raise HTTPException(status_code=404, detail="Coupon not found")
-
-    if coupon.status != "reserved":
-        raise HTTPException(status_code=400, detail=f"Coupon is not reserved (current: {coupon.status})")
-
+) -> dict:
     clean_reason = (reason or "").strip()
     if not clean_reason:
         raise HTTPException(status_code=400, detail="reason is required")
+    clean_step = (step or "unknown").strip()
 
     try:
-        coupon.last_failure_reason = clean_reason
-        coupon.last_failure_step = (step or "unknown").strip()
-        coupon.last_failed_at = datetime.now(timezone.utc)
-
-        await _log_event(
+        # IMPORTANT: stays reserved (your rule)
+        res = await transition_coupon(
             db,
-            coupon_code=coupon.coupon_code,
+            action="fail",
+            coupon_code=coupon_code,
             actor_user_id=actor_user_id,
-            event_type="failed",
-            meta={"reason": clean_reason, "step": coupon.last_failure_step},
+            reason=clean_reason,
+            failure_step=clean_step,
+            event_meta={"reason": clean_reason, "step": clean_step},
         )
-
-        # IMPORTANT: stays reserved (your rule)
+        _raise_for_outcome(res, wrong_state="Coupon is not reserved (current: {current})")
         await db.commit()
-        await db.refresh(coupon)
-        return coupon
+        return res.coupon
 
     except Exception:
         await db.rollback()
         raise
 
 
-async def seller_generate_coupons(
+async def _load_seller_and_owner(
     db: AsyncSession,
     *,
-    plan_id: int,
-    count: int,
     seller_user_id: int,
     owner_user_id: int | None,
-    notes: str | None,
-) -> list[Coupon]:
+) -> tuple[User, int]:
     """
-    ✅ PRODUCTION CHANGE (PAID COUPON GENERATION):
-    Seller "generate coupons" is a REAL purchase:
-      - uses wallet balance (debit seller)
-      - posts wallet_ledger rows (purchase_debit + profit/admin credits)
-      - applies multi-level hierarchical profit sharing
-      - creates a paid order + order_items + coupons atomically
-
-    Owner rule:
+    Owner rule shared by paid seller generation flows:
       - coupons can be owned by seller OR seller's DIRECT child only (no grandchildren).
     """
     # Load seller
@@ -329,6 +263,37 @@ async def seller_generate_coupons(
         if parent_id != int(seller_user_id):
             raise HTTPException(status_code=403, detail="Seller can only generate coupons for self or direct children")
 
+    return seller, target_owner_id
+
+
+async def seller_generate_coupons(
+    db: AsyncSession,
+    *,
+    plan_id: int,
+    count: int,
+    seller_user_id: int,
+    owner_user_id: int | None,
+    notes: str | None,
+) -> list[Coupon]:
+    """
+    ✅ PRODUCTION CHANGE (PAID COUPON GENERATION):
+    Seller "generate coupons" is a REAL purchase:
+      - uses wallet balance (debit seller)
+      - posts wallet_ledger rows (purchase_debit + profit/admin credits)
+      - applies multi-level hierarchical profit sharing
+      - creates a paid order + order_items + coupons atomically
+
+    Owner rule:
+      - coupons can be owned by seller OR seller's DIRECT child only (no grandchildren).
+    """
+    seller, target_owner_id = await _load_seller_and_owner(
+        db, seller_user_id=seller_user_id, owner_user_id=owner_user_id
+    )
+
+    # Above the inline-keys cap the purchase runs with deferred delivery and the
+    # rows are read back through the order (same response for up to 500 coupons)
+    include_keys = int(count) <= INLINE_KEYS_MAX_QUANTITY
+
     # Paid purchase flow (this function commits/rolls back internally)
     try:
         result = await purchase_plan_and_distribute(
@@ -338,41 +303,187 @@ async def seller_generate_coupons(
             quantity=int(count),
             note=notes,
             owner_user_id=target_owner_id,
+            include_keys=include_keys,
         )
     except InsufficientBalance as e:
         raise HTTPException(status_code=400, detail=str(e))
     except PurchaseError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-    coupon_codes = result.get("coupon_codes") or []
-    if not coupon_codes:
+    # Return Coupon ORM rows for those codes (matches router response_model=list[AdminCouponResponse])
+    if include_keys:
+        stmt = select(Coupon).where(Coupon.coupon_code.in_(result.get("coupon_codes") or []))
+    else:
+        stmt = (
+            select(Coupon)
+            .join(OrderItem, OrderItem.coupon_code == Coupon.coupon_code)
+            .join(Order, Order.id == OrderItem.order_id)
+            .where(Order.order_no == int(result["order_no"]))
+        )
+    res2 = await db.execute(stmt.order_by(Coupon.created_at.desc()))
+    coupons = list(res2.scalars().all())
+    if not coupons:
         raise HTTPException(status_code=500, detail="Purchase succeeded but no coupons were generated")
+    return coupons
 
-    # Return Coupon ORM rows for those codes (matches router response_model=list[AdminCouponResponse])
-    res2 = await db.execute(
-        select(Coupon).where(Coupon.coupon_code.in_(coupon_codes)).order_by(Coupon.created_at.desc())
+
+async def seller_generate_coupons_deferred(
+    db: AsyncSession,
+    *,
+    plan_id: int,
+    count: int,
+    seller_user_id: int,
+    owner_user_id: int | None,
+    notes: str | None,
+) -> dict:
+    """
+    Same paid purchase as seller_generate_coupons, but for large orders:
+      - keys are NOT collected in memory or re-queried after commit
+      - returns the order number immediately; keys are downloaded via the
+        streaming /sellers/orders/{order_no}/keys endpoint
+    """
+    seller, target_owner_id = await _load_seller_and_owner(
+        db, seller_user_id=seller_user_id, owner_user_id=owner_user_id
     )
-    return list(res2.scalars().all())
 
+    try:
+        result = await purchase_plan_and_distribute(
+            db=db,
+            buyer=seller,
+            plan_id=int(plan_id),
+            quantity=int(count),
+            note=notes,
+            owner_user_id=target_owner_id,
+            include_keys=False,
+        )
+    except InsufficientBalance as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PurchaseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "order_no": int(result["order_no"]),
+        "tx_id": str(result["tx_id"]),
+        "plan_id": int(result["plan_id"]),
+        "quantity": int(result["quantity"]),
+        "total_paid_cents": int(result["total_paid_cents"]),
+        "coupon_owner_user_id": int(result["coupon_owner_user_id"]),
+        "keys_download_url": f"/sellers/orders/{int(result['order_no'])}/keys",
+    }
+
+
+# Plain columns for list endpoints (matches AdminCouponResponse): selecting the
+# Coupon entity would also selectin-load Coupon.plan for every row.
+_COUPON_LIST_COLUMNS = (
+    Coupon.coupon_code,
+    Coupon.plan_id,
+    Coupon.status,
+    Coupon.created_by_user_id,
+    Coupon.owner_user_id,
+    Coupon.reserved_by_user_id,
+    Coupon.reserved_udid_suffix,
+    Coupon.reserved_at,
+    Coupon.used_by_user_id,
+    Coupon.used_udid_suffix,
+    Coupon.used_at,
+    Coupon.last_failure_reason,
+    Coupon.last_failure_step,
+    Coupon.last_failed_at,
+    Coupon.provider_req_id,
+    Coupon.notes,
+    Coupon.created_at,
+)
+
+
+def encode_coupon_cursor(created_at: datetime, coupon_code: str) -> str:
+    raw = f"{created_at.isoformat()}|{coupon_code}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_coupon_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        ts, code = raw.split("|", 1)
+        return datetime.fromisoformat(ts), code
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-async def seller_list_coupons(
+
+def _coupon_list_stmt(
+    *,
+    status: str | None,
+    plan_id: int | None,
+    owner_user_ids: list[int] | None,
+):
+    stmt = select(*_COUPON_LIST_COLUMNS)
+
+    if owner_user_ids is not None:
+        stmt = stmt.where(Coupon.owner_user_id.in_([int(x) for x in owner_user_ids]))
+    if status:
+        stmt = stmt.where(Coupon.status == status)
+    if plan_id:
+        stmt = stmt.where(Coupon.plan_id == int(plan_id))
+
+    return stmt.order_by(Coupon.created_at.desc(), Coupon.coupon_code.desc())
+
+
+async def list_coupon_rows(
     db: AsyncSession,
     *,
-    seller_user_id: int,
     status: str | None,
     plan_id: int | None,
-    owner_user_id: int | None,
+    owner_user_ids: list[int] | None,
     limit: int,
-    offset: int,
-) -> list[Coupon]:
+    offset: int = 0,
+) -> list[dict]:
     """
-    Seller can list coupons where owner is:
-      - self
-      - direct children
+    Newest first, plain list (the original list endpoints' shape).
+    """
+    stmt = _coupon_list_stmt(status=status, plan_id=plan_id, owner_user_ids=owner_user_ids)
+    res = await db.execute(stmt.limit(int(limit)).offset(int(offset)))
+    return [dict(r) for r in res.mappings().all()]
 
-    If owner_user_id is provided, it must be self or direct child.
+
+async def list_coupons_page(
+    db: AsyncSession,
+    *,
+    status: str | None,
+    plan_id: int | None,
+    owner_user_ids: list[int] | None,
+    cursor: str | None,
+    limit: int,
+) -> dict:
+    """
+    Newest first, keyset-paginated on (created_at, coupon_code).
+    Returns {"items": [...], "next_cursor": str | None}.
+    """
+    stmt = _coupon_list_stmt(status=status, plan_id=plan_id, owner_user_ids=owner_user_ids)
+    if cursor:
+        ts, code = decode_coupon_cursor(cursor)
+        stmt = stmt.where(tuple_(Coupon.created_at, Coupon.coupon_code) < tuple_(ts, code))
+
+    res = await db.execute(stmt.limit(int(limit) + 1))
+    rows = [dict(r) for r in res.mappings().all()]
+
+    next_cursor = None
+    if len(rows) > int(limit):
+        rows = rows[: int(limit)]
+        last = rows[-1]
+        next_cursor = encode_coupon_cursor(last["created_at"], last["coupon_code"])
+
+    return {"items": rows, "next_cursor": next_cursor}
+
+
+async def _seller_visible_owner_ids(
+    db: AsyncSession,
+    *,
+    seller_user_id: int,
+    owner_user_id: int | None,
+) -> list[int]:
+    """
+    Owners a seller may look at: self + direct children.
+    If owner_user_id is provided, it must be one of them.
     """
-    # Compute allowed owner ids: self + direct children
     child_res = await db.execute(select(User.id).where(User.parent_id == int(seller_user_id)))
     child_ids = [int(x) for x in child_res.scalars().all()]
     allowed_owner_ids = [int(seller_user_id)] + child_ids
@@ -383,15 +494,74 @@ async def seller_list_coupons(
             raise HTTPException(status_code=403, detail="Seller can only query self or direct children")
         allowed_owner_ids = [oid]
 
-    stmt = select(Coupon).where(Coupon.owner_user_id.in_(allowed_owner_ids)).order_by(Coupon.created_at.desc())
+    return allowed_owner_ids
 
-    if status:
-        stmt = stmt.where(Coupon.status == status)
-    if plan_id:
-        stmt = stmt.where(Coupon.plan_id == int(plan_id))
 
-    res = await db.execute(stmt.limit(int(limit)).offset(int(offset)))
-    return res.scalars().all()
+async def seller_list_coupons(
+    db: AsyncSession,
+    *,
+    seller_user_id: int,
+    status: str | None,
+    plan_id: int | None,
+    owner_user_id: int | None,
+    limit: int,
+    offset: int,
+) -> list[dict]:
+    """
+    Seller can list coupons where owner is:
+      - self
+      - direct children
+
+    If owner_user_id is provided, it must be self or direct child.
+    """
+    allowed_owner_ids = await _seller_visible_owner_ids(
+        db, seller_user_id=seller_user_id, owner_user_id=owner_user_id
+    )
+
+    return await list_coupon_rows(
+        db,
+        status=status,
+        plan_id=plan_id,
+        owner_user_ids=allowed_owner_ids,
+        limit=limit,
+        offset=offset,
+    )
+
+
+async def seller_list_coupons_page(
+    db: AsyncSession,
+    *,
+    seller_user_id: int,
+    status: str | None,
+    plan_id: int | None,
+    owner_user_id: int | None,
+    limit: int,
+    cursor: str | None,
+) -> dict:
+    """Same visibility as seller_list_coupons, keyset-paginated."""
+    allowed_owner_ids = await _seller_visible_owner_ids(
+        db, seller_user_id=seller_user_id, owner_user_id=owner_user_id
+    )
+
+    return await list_coupons_page(
+        db,
+        status=status,
+        plan_id=plan_id,
+        owner_user_ids=allowed_owner_ids,
+        cursor=cursor,
+        limit=limit,
+    )
+
+
+async def seller_coupon_inventory(
+    db: AsyncSession,
+    *,
+    seller_user_id: int,
+    owner_user_id: int | None,
+    plan_id: int | None,
+) -> list[dict]:
+    owner_ids = await _seller_visible_owner_ids(db, seller_user_id=seller_user_id, owner_user_id=owner_user_id)
+    return await get_inventory(db, owner_user_ids=owner_ids, plan_id=plan_id)
 
 
 def _ltree_is_descendant_expr(user_path_col, ancestor_path: str):
@@ -399,33 +569,27 @@ def _ltree_is_descendant_expr(user_path_col, ancestor_path: str):
     return user_path_col.op("<@")(ancestor_path)
 
 
-def _direct_child_bucket_user_id_expr(
-    *,
-    leaf_id_col,
-    leaf_path_col,
-    seller_user_id: int,
-    seller_path_nlevel: int,
-):
+def _owner_in_subtree_expr(owner_user, seller_path: str):
     """
-    Bucket any leaf user in seller subtree into:
-      - seller_user_id (if leaf == seller)
-      - else direct child id derived from leaf.path by slicing ONE segment after seller.
-
-    seller_path_nlevel is computed in Python (seller.depth + 1) to avoid calling
-    nlevel() on a VARCHAR parameter (which breaks on Postgres).
+    Coupon owner is inside the seller subtree. Filters on the denormalized
+    coupons.owner_path / owner_bucket_depth1; coupons minted before those
+    columns existed (NULL until the backfill reaches them) are scoped through
+    `owner_user`, which the caller outer-joins only for those rows
+    (_owner_user_join).
     """
-    # child label ltree like: 'u123'
-    child_label_ltree = func.subpath(leaf_path_col, int(seller_path_nlevel), 1)
-    child_label_txt = cast(child_label_ltree, String)
+    in_subtree = _ltree_is_descendant_expr(Coupon.owner_path, str(seller_path))
+    seller_bucket = bucket_depth1_from_path(str(seller_path))
+    if seller_bucket is not None:
+        # same top-level seller: equality on the bucket column narrows before the ltree test
+        in_subtree = and_(Coupon.owner_bucket_depth1 == int(seller_bucket), in_subtree)
+    return or_(
+        in_subtree,
+        and_(Coupon.owner_path.is_(None), _ltree_is_descendant_expr(owner_user.path, str(seller_path))),
+    )
 
-    # strip leading "u" => "123"
-    child_id_txt = func.substr(child_label_txt, 2)
-    child_id_int = cast(child_id_txt, Integer)
 
-    return case(
-        (leaf_id_col == int(seller_user_id), int(seller_user_id)),
-        else_=child_id_int,
-    )
+def _owner_user_join(owner_user):
+    return and_(Coupon.owner_path.is_(None), owner_user.id == Coupon.owner_user_id)
 
 
 async def seller_recent_coupon_events_rollup(
@@ -442,31 +606,28 @@ async def seller_recent_coupon_events_rollup(
     Returns dicts matching RecentCouponEventOut fields:
       id, coupon_code, actor_user_id, event_type, created_at, status
     """
-    Owner = aliased(User)
-
-    # Bucket by coupon owner path (not by raw actor) to avoid leaking grandchildren.
-    seller_path_nlevel = int(getattr(seller_user, "depth", 0)) + 1
-
-    bucket_actor_id = _direct_child_bucket_user_id_expr(
-        leaf_id_col=Owner.id,
-        leaf_path_col=Owner.path,
-        seller_user_id=int(seller_user.id),
-        seller_path_nlevel=seller_path_nlevel,
-    ).label("bucket_actor_user_id")
+    # Bucket by coupon owner (not by raw actor) to avoid leaking grandchildren.
+    # Under the root the bucket is the stored owner_bucket_depth1; deeper
+    # sellers bucket from the owner path in Python (no per-row subpath()).
+    seller_path = str(seller_user.path)
+    bucket_is_depth1 = bucket_depth1_from_path(seller_path) is None
+    OwnerUser = aliased(User)
 
     stmt = (
         select(
             CouponEvent.id,
             CouponEvent.coupon_code,
-            bucket_actor_id,
+            Coupon.owner_user_id,
+            Coupon.owner_bucket_depth1,
+            func.coalesce(Coupon.owner_path, OwnerUser.path),
             CouponEvent.event_type,
             CouponEvent.created_at,
             Coupon.status,
         )
         .select_from(CouponEvent)
         .join(Coupon, Coupon.coupon_code == CouponEvent.coupon_code)
-        .join(Owner, Owner.id == Coupon.owner_user_id)
-        .where(_ltree_is_descendant_expr(Owner.path, str(seller_user.path)))
+        .outerjoin(OwnerUser, _owner_user_join(OwnerUser))
+        .where(_owner_in_subtree_expr(OwnerUser, seller_path))
         .order_by(CouponEvent.created_at.desc(), CouponEvent.id.desc())
         .limit(int(limit))
         .offset(int(offset))
@@ -475,14 +636,23 @@ async def seller_recent_coupon_events_rollup(
     res = await db.execute(stmt)
     items: list[dict] = []
     for r in res.all():
+        if bucket_is_depth1 and r[3] is not None:
+            bucket = int(r[3])
+        else:
+            bucket = direct_child_bucket(
+                seller_path=seller_path,
+                seller_id=int(seller_user.id),
+                owner_id=(int(r[2]) if r[2] is not None else None),
+                owner_path=(str(r[4]) if r[4] is not None else None),
+            )
         items.append(
             {
                 "id": int(r[0]),
                 "coupon_code": str(r[1]),
-                "actor_user_id": (int(r[2]) if r[2] is not None else None),
-                "event_type": str(r[3]),
-                "created_at": r[4],
-                "status": str(r[5]),
+                "actor_user_id": bucket,
+                "event_type": str(r[5]),
+                "created_at": r[6],
+                "status": str(r[7]),
             }
         )
     return items
@@ -501,12 +671,12 @@ async def seller_coupon_events_for_code_bucketed(
     We return CouponEvent ORM rows; router will map to output schema while bucketizing actor_user_id.
     """
     # Ensure coupon exists and is within seller subtree by OWNER
-    Owner = aliased(User)
+    OwnerUser = aliased(User)
     stmt = (
         select(Coupon)
-        .join(Owner, Owner.id == Coupon.owner_user_id)
+        .outerjoin(OwnerUser, _owner_user_join(OwnerUser))
         .where(Coupon.coupon_code == coupon_code)
-        .where(_ltree_is_descendant_expr(Owner.path, str(seller_user.path)))
+        .where(_owner_in_subtree_expr(OwnerUser, str(seller_user.path)))
     )
     res = await db.execute(stmt)
     coupon = res.scalar_one_or_none()
@@ -0,0 +1,372 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+import httpx
+
+from app.core.config import settings
+from app.integrations.geek_api_client import GeekApiClient, GeekApiError, issue_endpoint
+
+logger = logging.getLogger(__name__)
+
+
+ISSUE_ENDPOINTS = ("adddevice", "addyydevice")
+
+# latency samples kept per endpoint for the percentiles in stats()
+_LATENCY_WINDOW = 1000
+
+
+class IssuanceError(Exception):
+    """The provider rejected the device (not retried)."""
+
+
+class IssuanceOutcomeUnknown(IssuanceError):
+    """The request reached the provider but no answer came back (timeout, 5xx): it may have been issued."""
+
+
+class IssuanceUnavailable(Exception):
+    """Fail fast, nothing was issued: circuit open, queue full, executor stopped, or retries exhausted."""
+
+
+def _is_transient(exc: Exception) -> bool:
+    """
+    Retry only when the provider certainly did NOT add the device: issuing is
+    not idempotent, so e.g. a read timeout (request may have been processed) is final.
+    """
+    if isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    if isinstance(exc, GeekApiError):
+        return exc.status_code in (429, 502, 503)
+    return False
+
+
+def _is_provider_failure(exc: Exception) -> bool:
+    """Counts against the circuit breaker (the provider misbehaved, not the device)."""
+    if isinstance(exc, httpx.TransportError):
+        return True
+    if isinstance(exc, GeekApiError):
+        return exc.status_code is not None and (exc.status_code >= 500 or exc.status_code == 429)
+    return False
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive transient failures;
+    open fails fast for `reset_seconds`, then half-open lets ONE probe through:
+    success closes it, failure re-opens it. A probe that never reaches the
+    provider gives its slot back (release_probe); one that has not reported
+    within `reset_seconds` is given up on and the next call probes instead.
+    """
+
+    def __init__(self, *, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = int(failure_threshold)
+        self.reset_seconds = float(reset_seconds)
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._probe_started_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        now = time.monotonic()
+        if self.state == "open" and now - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+            self._probing = False
+        if self.state == "half_open" and (not self._probing or now - self._probe_started_at >= self.reset_seconds):
+            self._probing = True
+            self._probe_started_at = now
+            return True
+        return False
+
+    def release_probe(self) -> None:
+        """The admitted probe was dropped before calling the provider."""
+        if self.state == "half_open":
+            self._probing = False
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning("issuance circuit opened after %s failure(s)", self.failures)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+
+@dataclass
+class _Job:
+    kwargs: dict
+    future: asyncio.Future
+    # admitted as the half-open probe of its endpoint's breaker
+    probe: bool = False
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class _EndpointMetrics:
+    submitted: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    rejected: int = 0
+    retries: int = 0
+    in_flight: int = 0
+    wait_ms: deque = field(default_factory=lambda: deque(maxlen=_LATENCY_WINDOW))
+    call_ms: deque = field(default_factory=lambda: deque(maxlen=_LATENCY_WINDOW))
+
+
+def _percentile(samples, p: float) -> float | None:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 1)
+
+
+class IssuanceExecutor:
+    """
+    Provider calls go through here instead of running inline in the request:
+
+      - one bounded queue + `concurrency` workers per endpoint
+        (adddevice / addyydevice), so a slow endpoint cannot starve the other
+        and the total number of concurrent provider calls is capped
+      - transient failures are retried with full-jitter exponential backoff
+      - one circuit breaker per endpoint fails fast while the provider is down
+      - queue depth, in-flight, outcome counters and wait/call latency
+        percentiles in stats()
+
+    Started/stopped from the FastAPI lifespan.
+    """
+
+    def __init__(
+        self,
+        *,
+        provider=None,
+        concurrency: int,
+        queue_max: int,
+        max_attempts: int,
+        backoff_base_seconds: float,
+        backoff_max_seconds: float,
+        breaker_threshold: int,
+        breaker_reset_seconds: float,
+        drain_seconds: float = 10.0,
+    ):
+        self._provider = provider
+        self.concurrency = int(concurrency)
+        self.queue_max = int(queue_max)
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff_base_seconds = float(backoff_base_seconds)
+        self.backoff_max_seconds = float(backoff_max_seconds)
+        self.drain_seconds = float(drain_seconds)
+        self._queues: dict[str, asyncio.Queue] = {}
+        self._workers: list[asyncio.Task] = []
+        # provider calls currently running (one task per call)
+        self._calls: set[asyncio.Task] = set()
+        self.breakers = {
+            ep: CircuitBreaker(failure_threshold=breaker_threshold, reset_seconds=breaker_reset_seconds)
+            for ep in ISSUE_ENDPOINTS
+        }
+        self.metrics = {ep: _EndpointMetrics() for ep in ISSUE_ENDPOINTS}
+
+    @property
+    def provider(self):
+        # default: GeekApiClient on the shared pooled connection (resolved lazily
+        # so the executor can be built before the lifespan opens the pool)
+        return self._provider if self._provider is not None else GeekApiClient()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        for ep in ISSUE_ENDPOINTS:
+            q: asyncio.Queue = asyncio.Queue(maxsize=self.queue_max)
+            self._queues[ep] = q
+            for i in range(self.concurrency):
+                self._workers.append(asyncio.create_task(self._worker(ep, q), name=f"issuance-{ep}-{i}"))
+
+    async def stop(self) -> None:
+        """
+        Stop taking jobs, fail the queued ones (never sent: IssuanceUnavailable),
+        give calls already at the provider up to `drain_seconds` to finish, then
+        cancel the rest (IssuanceOutcomeUnknown: they may have been issued).
+        """
+        queues, self._queues = self._queues, {}
+        for q in queues.values():
+            while not q.empty():
+                job: _Job = q.get_nowait()
+                q.task_done()
+                if not job.future.done():
+                    job.future.set_exception(IssuanceUnavailable("Issuance executor stopped"))
+
+        if self._calls:
+            await asyncio.wait(set(self._calls), timeout=self.drain_seconds)
+
+        for t in self._workers:
+            t.cancel()
+        for t in self._workers:
+            try:
+                await t
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._workers = []
+
+    async def issue_device(
+        self,
+        *,
+        udid: str,
+        issue_mode: str,
+        pool_type: int,
+        warranty: int,
+        note: str | None = None,
+    ):
+        """Queue one provider call and wait for its result (same return value as GeekApiClient.issue_device)."""
+        ep = issue_endpoint(issue_mode)
+        m = self.metrics[ep]
+        q = self._queues.get(ep)
+        if q is None:
+            m.rejected += 1
+            raise IssuanceUnavailable("Issuance executor is not running")
+        breaker = self.breakers[ep]
+        if not breaker.allow():
+            m.rejected += 1
+            raise IssuanceUnavailable(f"Provider {ep} is unavailable (circuit open)")
+
+        job = _Job(
+            kwargs={"udid": udid, "issue_mode": issue_mode, "pool_type": pool_type, "warranty": warranty, "note": note},
+            future=asyncio.get_running_loop().create_future(),
+            probe=breaker.state == "half_open",
+        )
+        try:
+            q.put_nowait(job)
+        except asyncio.QueueFull:
+            m.rejected += 1
+            if job.probe:
+                breaker.release_probe()
+            raise IssuanceUnavailable(f"Provider {ep} queue is full")
+        m.submitted += 1
+        return await job.future
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter: uniform(0, min(max, base * 2^attempt))
+        return random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * (2 ** attempt)))
+
+    async def _worker(self, ep: str, q: asyncio.Queue) -> None:
+        m = self.metrics[ep]
+        breaker = self.breakers[ep]
+        while True:
+            job: _Job = await q.get()
+            try:
+                if job.future.done():  # caller went away
+                    if job.probe:
+                        breaker.release_probe()
+                    continue
+                m.wait_ms.append((time.monotonic() - job.enqueued_at) * 1000)
+                m.in_flight += 1
+                call = asyncio.create_task(self._call(ep, job, breaker, m))
+                self._calls.add(call)
+                try:
+                    result = await call
+                finally:
+                    self._calls.discard(call)
+                    m.in_flight -= 1
+                if not job.future.done():
+                    job.future.set_result(result)
+                m.succeeded += 1
+            except asyncio.CancelledError:
+                # stopped while the call was at the provider: it may have gone through
+                m.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(IssuanceOutcomeUnknown("Issuance executor stopped during the provider call"))
+                raise
+            except Exception as e:
+                m.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                q.task_done()
+
+    async def _call(self, ep: str, job: _Job, breaker: CircuitBreaker, m: _EndpointMetrics):
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                result = await self.provider.issue_device(**job.kwargs)
+            except Exception as e:
+                m.call_ms.append((time.monotonic() - started) * 1000)
+                if not _is_transient(e):
+                    if _is_provider_failure(e):
+                        breaker.record_failure()
+                        raise IssuanceOutcomeUnknown(str(e)) from e
+                    # the provider answered: it is up, the device was refused
+                    breaker.record_success()
+                    raise IssuanceError(str(e)) from e
+                breaker.record_failure()
+                attempt += 1
+                if attempt >= self.max_attempts or not breaker.allow():
+                    raise IssuanceUnavailable(f"Provider {ep} unavailable: {e}") from e
+                m.retries += 1
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            m.call_ms.append((time.monotonic() - started) * 1000)
+            breaker.record_success()
+            return result
+
+    def stats(self) -> dict:
+        out = {}
+        for ep in ISSUE_ENDPOINTS:
+            m = self.metrics[ep]
+            q = self._queues.get(ep)
+            out[ep] = {
+                "queue_depth": q.qsize() if q is not None else 0,
+                "in_flight": m.in_flight,
+                "submitted": m.submitted,
+                "succeeded": m.succeeded,
+                "failed": m.failed,
+                "rejected": m.rejected,
+                "retries": m.retries,
+                "circuit": self.breakers[ep].state,
+                "wait_ms_p50": _percentile(m.wait_ms, 0.50),
+                "wait_ms_p95": _percentile(m.wait_ms, 0.95),
+                "call_ms_p50": _percentile(m.call_ms, 0.50),
+                "call_ms_p95": _percentile(m.call_ms, 0.95),
+            }
+        return {"running": self.running, "concurrency_per_endpoint": self.concurrency, "endpoints": out}
+
+
+def _default_provider():
+    if settings.GEEK_PROVIDER_MOCK:
+        from app.integrations.geek_mock import MockGeekProvider
+
+        return MockGeekProvider()
+    return None
+
+
+issuance_executor = IssuanceExecutor(
+    provider=_default_provider(),
+    concurrency=settings.ISSUANCE_CONCURRENCY_PER_ENDPOINT,
+    queue_max=settings.ISSUANCE_QUEUE_MAX,
+    max_attempts=settings.ISSUANCE_MAX_ATTEMPTS,
+    backoff_base_seconds=settings.ISSUANCE_BACKOFF_BASE_SECONDS,
+    backoff_max_seconds=settings.ISSUANCE_BACKOFF_MAX_SECONDS,
+    breaker_threshold=settings.ISSUANCE_BREAKER_THRESHOLD,
+    breaker_reset_seconds=settings.ISSUANCE_BREAKER_RESET_SECONDS,
+    drain_seconds=settings.ISSUANCE_DRAIN_SECONDS,
+)
+
+
+def get_issuance_executor() -> IssuanceExecutor:
+    """FastAPI dependency."""
+    return issuance_executor
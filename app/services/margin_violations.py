@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.db import AsyncSessionLocal
+from app.services.outbox import emit_event
+
+logger = logging.getLogger(__name__)
+
+
+MARGIN_VIOLATIONS_DETECTED = "margin_violations_detected"
+
+# Same lock id in every worker => only one of them runs the nightly scan
+_NIGHTLY_SCAN_LOCK_ID = 29_0001
+
+
+# Edge prices with an optional proposed change applied ("effective"), limited to
+# edges whose CHILD is inside the scanned subtree. For every such edge the
+# parent's cost is resolved in the same statement:
+#   - admin parent  -> admin_plan_base_prices
+#   - other parent  -> incoming edge (parent.parent -> parent), taken from the
+#                      effective set first so the proposed price is honoured.
+# A violation is an edge priced below its parent's cost, i.e. a purchase through
+# that edge would fail with "negative profit detected in chain".
+_VIOLATIONS_SQL = """
+WITH proposed AS (
+    SELECT
+        CAST(:p_parent AS bigint) AS parent_user_id,
+        CAST(:p_child AS bigint) AS child_user_id,
+        CAST(:p_plan AS bigint) AS plan_id,
+        CAST(:p_price AS integer) AS price_cents
+),
+scoped AS (
+    SELECT ep.parent_user_id, ep.child_user_id, ep.plan_id, ep.price_cents, ep.is_admin_override
+    FROM public.seller_edge_plan_prices ep
+    JOIN public.users uc ON uc.id = ep.child_user_id
+    WHERE (CAST(:root_path AS ltree) IS NULL OR uc.path <@ CAST(:root_path AS ltree))
+      AND (CAST(:plan_id AS bigint) IS NULL OR ep.plan_id = CAST(:plan_id AS bigint))
+),
+effective AS (
+    SELECT
+        s.parent_user_id,
+        s.child_user_id,
+        s.plan_id,
+        COALESCE(pr.price_cents, s.price_cents) AS price_cents,
+        s.is_admin_override
+    FROM scoped s
+    LEFT JOIN proposed pr
+      ON pr.parent_user_id = s.parent_user_id
+     AND pr.child_user_id = s.child_user_id
+     AND pr.plan_id = s.plan_id
+    UNION ALL
+    SELECT pr.parent_user_id, pr.child_user_id, pr.plan_id, pr.price_cents, FALSE
+    FROM proposed pr
+    WHERE pr.parent_user_id IS NOT NULL
+      AND (CAST(:plan_id AS bigint) IS NULL OR pr.plan_id = CAST(:plan_id AS bigint))
+      AND NOT EXISTS (
+          SELECT 1 FROM scoped s
+          WHERE s.parent_user_id = pr.parent_user_id
+            AND s.child_user_id = pr.child_user_id
+            AND s.plan_id = pr.plan_id
+      )
+)
+SELECT
+    e.parent_user_id,
+    e.child_user_id,
+    e.plan_id,
+    e.price_cents,
+    CASE
+        WHEN up.role = 'admin' THEN b.base_price_cents
+        ELSE COALESCE(inc.price_cents, inc_raw.price_cents)
+    END AS parent_cost_cents,
+    e.is_admin_override
+FROM effective e
+JOIN public.users up ON up.id = e.parent_user_id
+LEFT JOIN public.admin_plan_base_prices b
+  ON b.plan_id = e.plan_id
+LEFT JOIN effective inc
+  ON inc.child_user_id = e.parent_user_id
+ AND inc.parent_user_id = up.parent_id
+ AND inc.plan_id = e.plan_id
+LEFT JOIN public.seller_edge_plan_prices inc_raw
+  ON inc_raw.child_user_id = e.parent_user_id
+ AND inc_raw.parent_user_id = up.parent_id
+ AND inc_raw.plan_id = e.plan_id
+WHERE e.price_cents < (
+    CASE
+        WHEN up.role = 'admin' THEN b.base_price_cents
+        ELSE COALESCE(inc.price_cents, inc_raw.price_cents)
+    END
+)
+ORDER BY up.depth ASC, e.parent_user_id ASC, e.child_user_id ASC, e.plan_id ASC
+LIMIT :limit
+"""
+
+
+async def find_margin_violations(
+    db: AsyncSession,
+    *,
+    root_path: str | None,
+    plan_id: int | None = None,
+    proposed: tuple[int, int, int, int] | None = None,  # (parent, child, plan, price_cents)
+    limit: int = 1000,
+) -> list[dict]:
+    """
+    Every edge (inside root_path's subtree, by child) priced below its parent's
+    cost, in one query. With `proposed`, the result reflects the tree AFTER that
+    edge price change, so it can be shown before committing it.
+    """
+    p_parent, p_child, p_plan, p_price = proposed if proposed is not None else (None, None, None, None)
+
+    res = await db.execute(
+        text(_VIOLATIONS_SQL),
+        {
+            "p_parent": p_parent,
+            "p_child": p_child,
+            "p_plan": p_plan,
+            "p_price": p_price,
+            "root_path": str(root_path) if root_path else None,
+            "plan_id": plan_id,
+            "limit": int(limit),
+        },
+    )
+
+    out: list[dict] = []
+    for r in res.mappings().all():
+        price = int(r["price_cents"])
+        cost = int(r["parent_cost_cents"])
+        out.append(
+            {
+                "parent_user_id": int(r["parent_user_id"]),
+                "child_user_id": int(r["child_user_id"]),
+                "plan_id": int(r["plan_id"]),
+                "price_cents": price,
+                "parent_cost_cents": cost,
+                "shortfall_cents": cost - price,
+                "is_admin_override": bool(r["is_admin_override"]),
+            }
+        )
+    return out
+
+
+async def preview_edge_price_change(
+    db: AsyncSession,
+    *,
+    parent_user_id: int,
+    child_user_id: int,
+    plan_id: int,
+    price_cents: int,
+    limit: int = 1000,
+) -> list[dict]:
+    """
+    Pre-commit preview: violations in the child's subtree (plus the edge itself)
+    if (parent -> child, plan) were priced at price_cents.
+    """
+    res = await db.execute(
+        text("SELECT path FROM public.users WHERE id = :uid"),
+        {"uid": int(child_user_id)},
+    )
+    child_path = res.scalar_one_or_none()
+    if child_path is None:
+        return []
+
+    return await find_margin_violations(
+        db,
+        root_path=str(child_path),
+        plan_id=int(plan_id),
+        proposed=(int(parent_user_id), int(child_user_id), int(plan_id), int(price_cents)),
+        limit=limit,
+    )
+
+
+async def run_nightly_margin_scan(limit: int = 1000) -> int:
+    """
+    Whole-tree scan. Only one worker runs it (transaction-scoped advisory lock);
+    findings are published as an outbox event so notification consumers can act.
+    Returns the number of violations found (-1 if another worker holds the lock).
+    """
+    async with AsyncSessionLocal() as db:
+        got = await db.execute(text("SELECT pg_try_advisory_xact_lock(:k)"), {"k": _NIGHTLY_SCAN_LOCK_ID})
+        if not got.scalar_one():
+            await db.rollback()
+            return -1
+
+        violations = await find_margin_violations(db, root_path=None, limit=limit)
+        if violations:
+            await emit_event(
+                db,
+                event_type=MARGIN_VIOLATIONS_DETECTED,
+                payload={"count": len(violations), "truncated": len(violations) >= limit, "items": violations[:100]},
+            )
+            logger.warning("margin scan: %s edge(s) priced below parent cost", len(violations))
+        await db.commit()
+        return len(violations)
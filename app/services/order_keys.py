@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import json
+from typing import AsyncIterator
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.db import AsyncSessionLocal
+from app.models.order import Order
+from app.models.order_item import OrderItem
+
+
+class OrderKeysError(Exception):
+    pass
+
+
+KEYS_FORMATS = ("text", "ndjson")
+
+# rows fetched per round trip from the server-side cursor
+KEYS_STREAM_CHUNK = 1000
+
+
+async def get_order_for_keys(db: AsyncSession, *, order_no: int) -> dict:
+    # Only the columns needed for the permission check; do NOT touch Order.items
+    # (lazy="selectin" would load every order_item into memory).
+    res = await db.execute(
+        select(Order.id, Order.order_no, Order.buyer_user_id, Order.quantity).where(Order.order_no == int(order_no))
+    )
+    row = res.first()
+    if row is None:
+        raise OrderKeysError("Order not found.")
+    return {
+        "order_id": int(row[0]),
+        "order_no": int(row[1]),
+        "buyer_user_id": int(row[2]),
+        "quantity": int(row[3]),
+    }
+
+
+async def iter_order_keys(
+    *,
+    order_id: int,
+    fmt: str = "text",
+    chunk_size: int = KEYS_STREAM_CHUNK,
+) -> AsyncIterator[str]:
+    """
+    Stream the coupon keys of one order, in order_items insertion order.
+
+    Uses its own session + a server-side cursor (AsyncSession.stream), so memory
+    stays constant no matter how many keys the order has. The request-scoped
+    session from get_db is already closed by the time a StreamingResponse body
+    is iterated, which is why it is not reused here.
+
+    fmt:
+      - "text":   one coupon code per line (same as keys_text)
+      - "ndjson": one {"coupon_code": ..., "serial": ...} object per line
+    """
+    if fmt not in KEYS_FORMATS:
+        raise OrderKeysError(f"Unknown keys format: {fmt}")
+
+    stmt = (
+        select(OrderItem.coupon_code, OrderItem.serial)
+        .where(OrderItem.order_id == int(order_id))
+        .order_by(OrderItem.id.asc())
+        .execution_options(yield_per=int(chunk_size))
+    )
+
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(stmt)
+        async for partition in result.partitions():
+            lines: list[str] = []
+            for coupon_code, serial in partition:
+                if fmt == "ndjson":
+                    lines.append(json.dumps({"coupon_code": coupon_code, "serial": serial or ""}) + "\n")
+                else:
+                    lines.append(f"{coupon_code}\n")
+            yield "".join(lines)
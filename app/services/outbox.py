@@ -0,0 +1,325 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from sqlalchemy import func, or_, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.models.outbox import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+ORDER_PAID = "order_paid"
+LEDGER_POSTED = "ledger_posted"
+COUPON_STATUS_CHANGED = "coupon_status_changed"
+
+# A consumer receives a batch of events of ONE type, in id order.
+# Delivery is at-least-once: a consumer must be idempotent (use event.id).
+OutboxConsumer = Callable[[list[OutboxEvent]], Awaitable[None]]
+
+_consumers: dict[str, list[OutboxConsumer]] = defaultdict(list)
+
+
+def register_consumer(event_type: str, consumer: OutboxConsumer) -> None:
+    _consumers[event_type].append(consumer)
+
+
+def registered_consumers(event_type: str) -> list[OutboxConsumer]:
+    return list(_consumers.get(event_type, []))
+
+
+async def emit_event(db: AsyncSession, *, event_type: str, payload: dict) -> None:
+    """
+    Queue a domain event in the caller's transaction (no flush, no commit).
+    It becomes visible to the dispatcher only if the caller commits.
+    """
+    db.add(OutboxEvent(event_type=event_type, payload=payload))
+
+
+async def emit_coupon_status_changed(
+    db: AsyncSession,
+    *,
+    coupon_code: str,
+    from_status: str | None,
+    to_status: str,
+    actor_user_id: int | None,
+    plan_id: int | None = None,
+    owner_user_id: int | None = None,
+) -> None:
+    await emit_event(
+        db,
+        event_type=COUPON_STATUS_CHANGED,
+        payload={
+            "coupon_code": coupon_code,
+            "from": from_status,
+            "to": to_status,
+            "actor_user_id": actor_user_id,
+            "plan_id": plan_id,
+            "owner_user_id": owner_user_id,
+        },
+    )
+
+
+async def emit_coupon_status_changed_many(db: AsyncSession, changes: list[dict]) -> None:
+    """
+    Bulk variant for batch transitions. Each change has the keys of
+    emit_coupon_status_changed (coupon_code, from_status, to_status,
+    actor_user_id, plan_id, owner_user_id); one outbox row per coupon.
+    """
+    db.add_all(
+        [
+            OutboxEvent(
+                event_type=COUPON_STATUS_CHANGED,
+                payload={
+                    "coupon_code": ch["coupon_code"],
+                    "from": ch["from_status"],
+                    "to": ch["to_status"],
+                    "actor_user_id": ch.get("actor_user_id"),
+                    "plan_id": ch.get("plan_id"),
+                    "owner_user_id": ch.get("owner_user_id"),
+                },
+            )
+            for ch in changes
+        ]
+    )
+
+
+async def emit_ledger_posted(db: AsyncSession, *, tx_id, entries: list, kind: str) -> None:
+    """
+    entries: WalletLedger rows (or anything with user_id / entry_kind / amount_cents).
+    """
+    await emit_event(
+        db,
+        event_type=LEDGER_POSTED,
+        payload={
+            "tx_id": str(tx_id),
+            "kind": kind,
+            "entries": [
+                {
+                    "user_id": int(e.user_id),
+                    "entry_kind": e.entry_kind,
+                    "amount_cents": int(e.amount_cents),
+                    "plan_id": int(e.plan_id) if getattr(e, "plan_id", None) is not None else None,
+                }
+                for e in entries
+            ],
+        },
+    )
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    """Backoff before the next try of an event that has failed `attempts` times."""
+    base = float(settings.OUTBOX_RETRY_BASE_SECONDS)
+    return timedelta(seconds=min(float(settings.OUTBOX_RETRY_MAX_SECONDS), base * (2 ** max(0, attempts - 1))))
+
+
+async def dispatch_batch(batch_size: int) -> tuple[int, int]:
+    """
+    Drain one batch of pending events to registered consumers.
+
+    Rows are claimed with FOR UPDATE SKIP LOCKED, so several workers can run a
+    dispatcher without handing the same event to two of them at once.
+    An event is marked processed only after all of its consumers succeeded;
+    otherwise attempts/last_error are recorded and it is retried after an
+    exponential backoff (next_attempt_at), or dead-lettered (dead_at) once it
+    has failed OUTBOX_MAX_ATTEMPTS times, so failing events never block the
+    ones behind them.
+
+    Returns (events claimed, events processed).
+    """
+    async with AsyncSessionLocal() as db:
+        res = await db.execute(
+            select(OutboxEvent)
+            .where(
+                OutboxEvent.processed_at.is_(None),
+                OutboxEvent.dead_at.is_(None),
+                or_(OutboxEvent.next_attempt_at.is_(None), OutboxEvent.next_attempt_at <= func.now()),
+            )
+            .order_by(OutboxEvent.id.asc())
+            .limit(int(batch_size))
+            .with_for_update(skip_locked=True)
+        )
+        events = list(res.scalars().all())
+        if not events:
+            await db.rollback()
+            return 0, 0
+
+        by_type: dict[str, list[OutboxEvent]] = defaultdict(list)
+        for ev in events:
+            by_type[ev.event_type].append(ev)
+
+        done_ids: list[int] = []
+        failed: dict[int, str] = {}
+
+        for event_type, group in by_type.items():
+            try:
+                for consumer in registered_consumers(event_type):
+                    await consumer(group)
+                done_ids.extend(int(ev.id) for ev in group)
+            except Exception as e:  # consumer failure must not kill the loop
+                logger.exception("outbox consumer failed for %s", event_type)
+                for ev in group:
+                    failed[int(ev.id)] = f"{type(e).__name__}: {e}"[:1000]
+
+        now = datetime.now(timezone.utc)
+        if done_ids:
+            await db.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id.in_(done_ids))
+                .values(processed_at=now, attempts=OutboxEvent.attempts + 1, last_error=None)
+            )
+        attempts_by_id = {int(ev.id): int(ev.attempts or 0) + 1 for ev in events}
+        max_attempts = int(settings.OUTBOX_MAX_ATTEMPTS)
+        for ev_id, err in failed.items():
+            attempts = attempts_by_id[ev_id]
+            dead = attempts >= max_attempts
+            if dead:
+                logger.error("outbox event %s dead-lettered after %s attempts: %s", ev_id, attempts, err)
+            await db.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id == ev_id)
+                .values(
+                    attempts=attempts,
+                    last_error=err,
+                    next_attempt_at=now + _retry_delay(attempts),
+                    dead_at=now if dead else None,
+                )
+            )
+
+        await db.commit()
+        return len(events), len(done_ids)
+
+
+_PURGE_PROCESSED_SQL = text(
+    """
+    WITH doomed AS (
+        SELECT id
+        FROM public.outbox_events
+        WHERE processed_at < :cutoff
+        ORDER BY processed_at
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    DELETE FROM public.outbox_events e
+    USING doomed
+    WHERE e.id = doomed.id
+    """
+)
+
+
+async def purge_processed_events(*, retention: timedelta, batch_size: int, max_batches: int = 20) -> int:
+    """
+    Retention for the outbox table: delete processed events older than
+    `retention`. Pending and dead-lettered rows are never touched.
+
+    One short transaction per batch (so row locks and WAL stay small), at most
+    max_batches per call; whatever is left goes on the next call.
+    Returns the number of rows deleted.
+    """
+    cutoff = datetime.now(timezone.utc) - retention
+    total = 0
+    for _ in range(int(max_batches)):
+        async with AsyncSessionLocal() as db:
+            res = await db.execute(_PURGE_PROCESSED_SQL, {"cutoff": cutoff, "limit": int(batch_size)})
+            await db.commit()
+        n = int(res.rowcount or 0)
+        total += n
+        if n < int(batch_size):
+            break
+    if total:
+        logger.info("outbox retention: purged %s processed events older than %s", total, cutoff.isoformat())
+    return total
+
+
+class OutboxDispatcher:
+    """
+    In-process async dispatcher, started/stopped from the FastAPI lifespan.
+    Keeps draining while batches are full and making progress, sleeps
+    poll_seconds when idle or when a whole batch failed. Every
+    purge_interval_seconds it also purges processed events older than
+    retention_seconds (0 disables the purge).
+    """
+
+    def __init__(
+        self,
+        *,
+        batch_size: int,
+        poll_seconds: float,
+        retention_seconds: float = 0.0,
+        purge_interval_seconds: float = 600.0,
+        purge_batch_size: int = 5000,
+    ):
+        self.batch_size = int(batch_size)
+        self.poll_seconds = float(poll_seconds)
+        self.retention_seconds = float(retention_seconds)
+        self.purge_interval_seconds = float(purge_interval_seconds)
+        self.purge_batch_size = int(purge_batch_size)
+        self._next_purge_at = 0.0
+        self._task: asyncio.Task | None = None
+        self._stopping = asyncio.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="outbox-dispatcher")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopping.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=self.poll_seconds + 10)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        self._task = None
+
+    async def _maybe_purge(self) -> None:
+        if self.retention_seconds <= 0 or time.monotonic() < self._next_purge_at:
+            return
+        self._next_purge_at = time.monotonic() + self.purge_interval_seconds
+        try:
+            await purge_processed_events(
+                retention=timedelta(seconds=self.retention_seconds),
+                batch_size=self.purge_batch_size,
+            )
+        except Exception:
+            logger.exception("outbox retention purge failed")
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            await self._maybe_purge()
+            try:
+                claimed, processed = await dispatch_batch(self.batch_size)
+            except Exception:
+                logger.exception("outbox dispatch failed")
+                claimed, processed = 0, 0
+
+            if claimed >= self.batch_size and processed > 0:
+                continue
+
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+
+outbox_dispatcher = OutboxDispatcher(
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    poll_seconds=settings.OUTBOX_POLL_SECONDS,
+    retention_seconds=settings.OUTBOX_RETENTION_HOURS * 3600,
+    purge_interval_seconds=settings.OUTBOX_PURGE_INTERVAL_SECONDS,
+    purge_batch_size=settings.OUTBOX_PURGE_BATCH_SIZE,
+)
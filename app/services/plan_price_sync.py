@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.pricing_cache import notify_pricing_changed
+
+
+# Diff-based "make the rows match this list" for one parent->child edge set and
+# for one seller's seller_plan_prices. Everything happens in ONE statement:
+# data-modifying CTEs all see the rows as they were before the statement, so
+# delete / update / insert are computed against the same current state, and
+# unchanged rows are not touched at all (no dead tuples, no trigger noise).
+
+_SYNC_EDGES_SQL = text(
+    """
+    WITH desired AS (
+        SELECT d.plan_id, d.price_cents
+        FROM unnest(CAST(:plan_ids AS bigint[]), CAST(:prices AS integer[])) AS d(plan_id, price_cents)
+    ),
+    deleted AS (
+        DELETE FROM public.seller_edge_plan_prices ep
+        WHERE ep.parent_user_id = :parent_user_id
+          AND ep.child_user_id = :child_user_id
+          AND ep.plan_id <> ALL(CAST(:plan_ids AS bigint[]))
+        RETURNING ep.plan_id
+    ),
+    updated AS (
+        UPDATE public.seller_edge_plan_prices ep
+        SET price_cents = d.price_cents,
+            currency = :currency,
+            is_admin_override = FALSE,
+            updated_by_user_id = :updated_by_user_id,
+            updated_at = now()
+        FROM desired d
+        WHERE ep.parent_user_id = :parent_user_id
+          AND ep.child_user_id = :child_user_id
+          AND ep.plan_id = d.plan_id
+          AND (ep.price_cents, ep.currency, ep.is_admin_override)
+              IS DISTINCT FROM (d.price_cents, CAST(:currency AS varchar), FALSE)
+        RETURNING ep.plan_id
+    ),
+    inserted AS (
+        INSERT INTO public.seller_edge_plan_prices
+            (parent_user_id, child_user_id, plan_id, price_cents, currency, is_admin_override, updated_by_user_id)
+        SELECT :parent_user_id, :child_user_id, d.plan_id, d.price_cents, :currency, FALSE, :updated_by_user_id
+        FROM desired d
+        WHERE NOT EXISTS (
+            SELECT 1 FROM public.seller_edge_plan_prices ep
+            WHERE ep.parent_user_id = :parent_user_id
+              AND ep.child_user_id = :child_user_id
+              AND ep.plan_id = d.plan_id
+        )
+        RETURNING plan_id
+    )
+    SELECT 'inserted' AS op, plan_id FROM inserted
+    UNION ALL SELECT 'updated', plan_id FROM updated
+    UNION ALL SELECT 'deleted', plan_id FROM deleted
+    """
+)
+
+_SYNC_SELLER_PLAN_PRICES_SQL = text(
+    """
+    WITH desired AS (
+        SELECT d.plan_id, d.price_cents
+        FROM unnest(CAST(:plan_ids AS bigint[]), CAST(:prices AS integer[])) AS d(plan_id, price_cents)
+    ),
+    deleted AS (
+        DELETE FROM public.seller_plan_prices s
+        WHERE s.seller_id = :seller_id
+          AND s.plan_id <> ALL(CAST(:plan_ids AS bigint[]))
+        RETURNING s.plan_id
+    ),
+    updated AS (
+        UPDATE public.seller_plan_prices s
+        SET price_cents = d.price_cents,
+            currency = :currency,
+            updated_at = now()
+        FROM desired d
+        WHERE s.seller_id = :seller_id
+          AND s.plan_id = d.plan_id
+          AND (s.price_cents, s.currency) IS DISTINCT FROM (d.price_cents, CAST(:currency AS text))
+        RETURNING s.plan_id
+    ),
+    inserted AS (
+        INSERT INTO public.seller_plan_prices (seller_id, plan_id, price_cents, currency)
+        SELECT :seller_id, d.plan_id, d.price_cents, :currency
+        FROM desired d
+        WHERE NOT EXISTS (
+            SELECT 1 FROM public.seller_plan_prices s
+            WHERE s.seller_id = :seller_id AND s.plan_id = d.plan_id
+        )
+        RETURNING plan_id
+    )
+    SELECT 'inserted' AS op, plan_id FROM inserted
+    UNION ALL SELECT 'updated', plan_id FROM updated
+    UNION ALL SELECT 'deleted', plan_id FROM deleted
+    """
+)
+
+
+def _split(plan_prices: list[tuple[int, int]]) -> tuple[list[int], list[int]]:
+    plan_ids = [int(pid) for pid, _ in plan_prices]
+    if len(plan_ids) != len(set(plan_ids)):
+        raise ValueError("Duplicate plan_id in plan_prices")
+    return plan_ids, [int(price) for _, price in plan_prices]
+
+
+def _collect(rows) -> dict:
+    out: dict[str, list[int]] = {"inserted": [], "updated": [], "deleted": []}
+    for op, plan_id in rows:
+        out[op].append(int(plan_id))
+    for ids in out.values():
+        ids.sort()
+    return out
+
+
+def has_changes(diff: dict) -> bool:
+    return bool(diff["inserted"] or diff["updated"] or diff["deleted"])
+
+
+async def sync_edge_prices(
+    db: AsyncSession,
+    *,
+    parent_user_id: int,
+    child_user_id: int,
+    plan_prices: list[tuple[int, int]],  # [(plan_id, price_cents)]
+    updated_by_user_id: int,
+    currency: str = "USD",
+) -> dict:
+    """
+    Make seller_edge_plan_prices for parent->child match plan_prices exactly,
+    writing only the delta. Returns {"inserted": [...], "updated": [...], "deleted": [...]}
+    (plan ids). The pricing cache is notified only if something changed.
+    """
+    plan_ids, prices = _split(plan_prices)
+    res = await db.execute(
+        _SYNC_EDGES_SQL,
+        {
+            "parent_user_id": int(parent_user_id),
+            "child_user_id": int(child_user_id),
+            "plan_ids": plan_ids,
+            "prices": prices,
+            "currency": currency,
+            "updated_by_user_id": int(updated_by_user_id),
+        },
+    )
+    diff = _collect(res.all())
+    if has_changes(diff):
+        await notify_pricing_changed(db)
+    return diff
+
+
+async def sync_seller_plan_prices(
+    db: AsyncSession,
+    *,
+    seller_id: int,
+    plan_prices: list[tuple[int, int]],  # [(plan_id, price_cents)]
+    currency: str = "USD",
+) -> dict:
+    """
+    Same as sync_edge_prices, for the seller's own seller_plan_prices rows.
+    """
+    plan_ids, prices = _split(plan_prices)
+    res = await db.execute(
+        _SYNC_SELLER_PLAN_PRICES_SQL,
+        {
+            "seller_id": int(seller_id),
+            "plan_ids": plan_ids,
+            "prices": prices,
+            "currency": currency,
+        },
+    )
+    return _collect(res.all())
@@ -4,6 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 
 from app.models.plan import Plan
+from app.services.pricing_cache import notify_pricing_changed
 
 
 async def admin_create_plan(db: AsyncSession, *, data) -> Plan:
@@ -65,6 +66,8 @@ async def admin_update_plan(db: AsyncSession, *, plan_id: int, data) -> Plan:
     plan.is_active = data.is_active
 
     try:
+        # cached seller plan lists carry title/code/is_active
+        await notify_pricing_changed(db)
         await db.commit()
     except IntegrityError:
         await db.rollback()
@@ -77,6 +80,7 @@ async def admin_update_plan(db: AsyncSession, *, plan_id: int, data) -> Plan:
 async def admin_set_plan_active(db: AsyncSession, *, plan_id: int, is_active: bool) -> Plan:
     plan = await admin_get_plan(db, plan_id=plan_id)
     plan.is_active = is_active
+    await notify_pricing_changed(db)
     await db.commit()
     await db.refresh(plan)
     return plan
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.db import AsyncSessionLocal
+from app.models.pricing import SellerEdgePlanPrice
+from app.models.user import User
+
+
+class PriceMatrixError(Exception):
+    pass
+
+
+class PriceMatrixCursorError(PriceMatrixError):
+    pass
+
+
+MATRIX_FORMATS = ("csv", "ndjson")
+
+# rows fetched per round trip from the server-side cursor
+MATRIX_STREAM_CHUNK = 2000
+
+MATRIX_PAGE_MAX = 2000
+
+MATRIX_COLUMNS = (
+    "parent_user_id",
+    "child_user_id",
+    "child_username",
+    "plan_id",
+    "price_cents",
+    "currency",
+    "is_admin_override",
+    "updated_at",
+)
+
+
+async def get_subtree_root_path(db: AsyncSession, *, root_user_id: int) -> str:
+    res = await db.execute(select(User.path).where(User.id == int(root_user_id)))
+    path = res.scalar_one_or_none()
+    if path is None:
+        raise PriceMatrixError("User not found.")
+    return str(path)
+
+
+def _matrix_stmt(*, root_path: str, plan_id: Optional[int]):
+    # Edges whose PARENT is inside the root subtree (same scope as the old
+    # list_edges_within_subtree), ordered by the edge primary key so both the
+    # stream and the keyset pages walk seller_edge_plan_prices_pkey.
+    parent = User.__table__.alias("u_parent")
+    child = User.__table__.alias("u_child")
+
+    stmt = (
+        select(
+            SellerEdgePlanPrice.parent_user_id,
+            SellerEdgePlanPrice.child_user_id,
+            child.c.username.label("child_username"),
+            SellerEdgePlanPrice.plan_id,
+            SellerEdgePlanPrice.price_cents,
+            SellerEdgePlanPrice.currency,
+            SellerEdgePlanPrice.is_admin_override,
+            SellerEdgePlanPrice.updated_at,
+        )
+        .join(parent, parent.c.id == SellerEdgePlanPrice.parent_user_id)
+        .join(child, child.c.id == SellerEdgePlanPrice.child_user_id)
+        .where(parent.c.path.op("<@")(root_path))
+    )
+    if plan_id is not None:
+        stmt = stmt.where(SellerEdgePlanPrice.plan_id == int(plan_id))
+    return stmt.order_by(
+        SellerEdgePlanPrice.parent_user_id.asc(),
+        SellerEdgePlanPrice.child_user_id.asc(),
+        SellerEdgePlanPrice.plan_id.asc(),
+    )
+
+
+async def list_edges_within_subtree(
+    db: AsyncSession,
+    *,
+    root_path: str,
+    plan_id: Optional[int] = None,
+) -> list[SellerEdgePlanPrice]:
+    """Unpaged subtree edges (GET /sellers/prices/subtree, kept for existing clients)."""
+    parent = User.__table__.alias("u_parent")
+    stmt = (
+        select(SellerEdgePlanPrice)
+        .join(parent, parent.c.id == SellerEdgePlanPrice.parent_user_id)
+        .where(parent.c.path.op("<@")(root_path))
+    )
+    if plan_id is not None:
+        stmt = stmt.where(SellerEdgePlanPrice.plan_id == int(plan_id))
+    stmt = stmt.order_by(
+        SellerEdgePlanPrice.parent_user_id.asc(),
+        SellerEdgePlanPrice.child_user_id.asc(),
+        SellerEdgePlanPrice.plan_id.asc(),
+    )
+    res = await db.execute(stmt)
+    return list(res.scalars().all())
+
+
+def _row_to_dict(r) -> dict:
+    return {
+        "parent_user_id": int(r.parent_user_id),
+        "child_user_id": int(r.child_user_id),
+        "child_username": r.child_username,
+        "plan_id": int(r.plan_id),
+        "price_cents": int(r.price_cents),
+        "currency": r.currency,
+        "is_admin_override": bool(r.is_admin_override),
+        "updated_at": r.updated_at,
+    }
+
+
+def encode_matrix_cursor(row: dict) -> str:
+    return f"{row['parent_user_id']}:{row['child_user_id']}:{row['plan_id']}"
+
+
+def decode_matrix_cursor(cursor: str) -> tuple[int, int, int]:
+    try:
+        parent_id, child_id, plan_id = (int(x) for x in cursor.split(":"))
+    except ValueError:
+        raise PriceMatrixCursorError("Invalid cursor.")
+    return parent_id, child_id, plan_id
+
+
+async def list_price_matrix_page(
+    db: AsyncSession,
+    *,
+    root_path: str,
+    plan_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = 500,
+) -> dict:
+    """
+    One keyset page of the subtree price matrix.
+    `cursor` is the next_cursor of the previous page (None for the first page).
+    """
+    limit = max(1, min(int(limit), MATRIX_PAGE_MAX))
+
+    stmt = _matrix_stmt(root_path=root_path, plan_id=plan_id)
+    if cursor:
+        stmt = stmt.where(
+            tuple_(
+                SellerEdgePlanPrice.parent_user_id,
+                SellerEdgePlanPrice.child_user_id,
+                SellerEdgePlanPrice.plan_id,
+            )
+            > tuple_(*decode_matrix_cursor(cursor))
+        )
+
+    res = await db.execute(stmt.limit(limit + 1))
+    rows = [_row_to_dict(r) for r in res.all()]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_matrix_cursor(rows[-1])
+
+    return {"items": rows, "next_cursor": next_cursor}
+
+
+async def iter_price_matrix(
+    *,
+    root_path: str,
+    plan_id: Optional[int] = None,
+    fmt: str = "csv",
+    chunk_size: int = MATRIX_STREAM_CHUNK,
+) -> AsyncIterator[str]:
+    """
+    Stream the whole subtree price matrix (one line per child x plan edge).
+
+    Own session + server-side cursor, same as order_keys.iter_order_keys:
+    only one partition is held in memory at a time.
+    """
+    if fmt not in MATRIX_FORMATS:
+        raise PriceMatrixError(f"Unknown export format: {fmt}")
+
+    stmt = _matrix_stmt(root_path=root_path, plan_id=plan_id).execution_options(yield_per=int(chunk_size))
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if fmt == "csv":
+        writer.writerow(MATRIX_COLUMNS)
+
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(stmt)
+        async for partition in result.partitions():
+            for r in partition:
+                row = _row_to_dict(r)
+                updated_at = row["updated_at"].isoformat() if row["updated_at"] is not None else None
+                if fmt == "ndjson":
+                    buf.write(json.dumps({**row, "updated_at": updated_at}) + "\n")
+                else:
+                    writer.writerow([updated_at if c == "updated_at" else row[c] for c in MATRIX_COLUMNS])
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+
+    tail = buf.getvalue()
+    if tail:
+        yield tail
@@ -4,13 +4,15 @@ from dataclasses import dataclass
 from typing import List, Optional, Tuple
 
 from fastapi import HTTPException
-from sqlalchemy import and_, select, text
+from sqlalchemy import and_, func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.pricing import AdminPlanBasePrice, SellerEdgePlanPrice
 from app.models.user import User
-from app.services.seller_plans import seller_has_plan_enabled  # ✅ ADDED
+from app.services.seller_plans import get_seller_plan_costs
+from app.services.pricing_cache import notify_pricing_changed, pricing_cache
 
 
 @dataclass
@@ -32,7 +34,7 @@ async def _get_user_or_404(db: AsyncSession, user_id: int) -> User:
     return user
 
 
-async def _ensure_child_is_direct(db: AsyncSession, parent_user_id: int, child_user_id: int) -> None:
+async def ensure_child_is_direct(db: AsyncSession, parent_user_id: int, child_user_id: int) -> None:
     # direct relationship required for seller-managed edges
     res = await db.execute(
         select(User.id).where(and_(User.id == child_user_id, User.parent_id == parent_user_id))
@@ -45,26 +47,16 @@ async def determine_parent_cost(db: AsyncSession, parent_user_id: int, plan_id:
     parent = await _get_user_or_404(db, parent_user_id)
 
     if parent.role == "admin":
-        res = await db.execute(select(AdminPlanBasePrice).where(AdminPlanBasePrice.plan_id == plan_id))
-        base = res.scalar_one_or_none()
+        base = await pricing_cache.get_base_price(db, plan_id)
         if not base:
             raise HTTPException(status_code=400, detail="Admin base price not set for this plan_id")
-        return ParentCost(parent_cost_cents=base.base_price_cents, currency=base.currency, source="admin_base_price")
+        return ParentCost(parent_cost_cents=base.price_cents, currency=base.currency, source="admin_base_price")
 
     # seller/agent/etc: cost comes from edge (parent.parent -> parent)
     if parent.parent_id is None:
         raise HTTPException(status_code=400, detail="Parent has no parent_id; cannot determine parent cost")
 
-    res = await db.execute(
-        select(SellerEdgePlanPrice).where(
-            and_(
-                SellerEdgePlanPrice.parent_user_id == parent.parent_id,
-                SellerEdgePlanPrice.child_user_id == parent.id,
-                SellerEdgePlanPrice.plan_id == plan_id,
-            )
-        )
-    )
-    edge = res.scalar_one_or_none()
+    edge = await pricing_cache.get_edge_price(db, parent.parent_id, parent.id, plan_id)
     if not edge:
         raise HTTPException(
             status_code=400,
@@ -74,6 +66,45 @@ async def determine_parent_cost(db: AsyncSession, parent_user_id: int, plan_id:
     return ParentCost(parent_cost_cents=edge.price_cents, currency=edge.currency, source="edge_price")
 
 
+_PARENT_COSTS_SQL = text(
+    """
+    SELECT b.plan_id, b.base_price_cents AS cost_cents, b.currency, 'admin_base_price' AS source
+    FROM public.users u
+    JOIN public.admin_plan_base_prices b ON b.plan_id = ANY(:plan_ids)
+    WHERE u.id = :parent_user_id AND u.role = 'admin'
+    UNION ALL
+    SELECT e.plan_id, e.price_cents AS cost_cents, e.currency, 'edge_price' AS source
+    FROM public.users u
+    JOIN public.seller_edge_plan_prices e
+      ON e.parent_user_id = u.parent_id
+     AND e.child_user_id = u.id
+     AND e.plan_id = ANY(:plan_ids)
+    WHERE u.id = :parent_user_id AND u.role <> 'admin'
+    """
+)
+
+
+async def determine_parent_costs(db: AsyncSession, parent_user_id: int, plan_ids: list[int]) -> dict[int, ParentCost]:
+    """
+    determine_parent_cost for many plans in ONE query:
+      - admin parent: admin base prices
+      - other parent: incoming edge (parent.parent -> parent)
+
+    Plans without a cost are absent from the result (callers decide whether
+    that is an error), so a seller's result keys are also exactly the plans
+    that seller has enabled.
+    """
+    ids = sorted({int(x) for x in plan_ids})
+    if not ids:
+        return {}
+
+    res = await db.execute(_PARENT_COSTS_SQL, {"parent_user_id": int(parent_user_id), "plan_ids": ids})
+    return {
+        int(r["plan_id"]): ParentCost(parent_cost_cents=int(r["cost_cents"]), currency=r["currency"], source=r["source"])
+        for r in res.mappings().all()
+    }
+
+
 # -------------------------
 # Admin: base prices
 # -------------------------
@@ -103,6 +134,7 @@ async def admin_upsert_base_price(
         db.add(row)
 
     try:
+        await notify_pricing_changed(db)
         await db.commit()
     except IntegrityError:
         await db.rollback()
@@ -139,28 +171,29 @@ async def upsert_edge_price_seller(
     currency: str,
 ) -> SellerEdgePlanPrice:
     # Must be direct child
-    await _ensure_child_is_direct(db, current_user_id, child_user_id)
+    await ensure_child_is_direct(db, current_user_id, child_user_id)
 
     # ✅ Enforce: seller can only pass down plans they have
-    # Seller "has" a plan if there exists an incoming edge price (parent -> seller) for that plan.
-    has_plan = await seller_has_plan_enabled(db, seller_user_id=current_user_id, plan_id=plan_id)
-    if not has_plan:
+    # Seller "has" a plan if there exists an incoming edge price (parent -> seller) for that plan;
+    # the same (cached) lookup gives the cost for the margin rule.
+    plan_costs = await get_seller_plan_costs(db, seller_user_id=current_user_id)
+    parent_cost = plan_costs.get(int(plan_id))
+    if parent_cost is None:
         raise HTTPException(
             status_code=400,
             detail="Plan not enabled for this seller. Admin must set (parent -> seller) price first.",
         )
 
     # Enforce margin rule: price >= parent cost
-    parent_cost = await determine_parent_cost(db, current_user_id, plan_id)
     if currency != parent_cost.currency:
         raise HTTPException(
             status_code=400,
             detail=f"Currency mismatch. Parent cost currency is {parent_cost.currency}",
         )
-    if price_cents < parent_cost.parent_cost_cents:
+    if price_cents < parent_cost.cost_cents:
         raise HTTPException(
             status_code=400,
-            detail=f"Price too low. Must be >= parent cost ({parent_cost.parent_cost_cents} {parent_cost.currency})",
+            detail=f"Price too low. Must be >= parent cost ({parent_cost.cost_cents} {parent_cost.currency})",
         )
 
     res = await db.execute(
@@ -194,6 +227,7 @@ async def upsert_edge_price_seller(
         db.add(row)
 
     try:
+        await notify_pricing_changed(db)
         await db.commit()
     except IntegrityError:
         await db.rollback()
@@ -215,7 +249,7 @@ async def upsert_edge_price_admin_override(
 ) -> SellerEdgePlanPrice:
     # Admin can override ANY edge, and bypass margin rule by definition.
     # But we still require the edge to be a real direct parent->child in the tree.
-    await _ensure_child_is_direct(db, parent_user_id, child_user_id)
+    await ensure_child_is_direct(db, parent_user_id, child_user_id)
 
     res = await db.execute(
         select(SellerEdgePlanPrice).where(
@@ -246,6 +280,7 @@ async def upsert_edge_price_admin_override(
         db.add(row)
 
     try:
+        await notify_pricing_changed(db)
         await db.commit()
     except IntegrityError:
         await db.rollback()
@@ -255,6 +290,187 @@ async def upsert_edge_price_admin_override(
     return row
 
 
+# -------------------------
+# Bulk edge prices (seller/admin)
+# -------------------------
+
+def _ensure_unique_edge_keys(keys: list[tuple[int, int, int]]) -> None:
+    # ON CONFLICT DO UPDATE cannot touch the same row twice in one statement
+    seen: set[tuple[int, int, int]] = set()
+    dupes: list[tuple[int, int, int]] = []
+    for k in keys:
+        if k in seen:
+            dupes.append(k)
+        seen.add(k)
+    if dupes:
+        raise HTTPException(status_code=400, detail=f"Duplicate (parent, child, plan) in items: {dupes[:20]}")
+
+
+async def _ensure_children_are_direct(db: AsyncSession, pairs: set[tuple[int, int]]) -> None:
+    """
+    Set-based ensure_child_is_direct: one query for all (parent, child) pairs.
+    """
+    child_ids = sorted({c for _, c in pairs})
+    res = await db.execute(select(User.id, User.parent_id).where(User.id.in_(child_ids)))
+    parent_of = {int(r[0]): (int(r[1]) if r[1] is not None else None) for r in res.all()}
+
+    bad = sorted(c for p, c in pairs if parent_of.get(c) != p)
+    if bad:
+        raise HTTPException(status_code=400, detail=f"child_user_id(s) not a direct child of parent: {bad[:50]}")
+
+
+async def bulk_upsert_edge_prices_seller(
+    db: AsyncSession,
+    *,
+    current_user_id: int,
+    items: list[tuple[int, int, int, str]],  # [(child_user_id, plan_id, price_cents, currency)]
+) -> dict:
+    """
+    Bulk version of upsert_edge_price_seller.
+
+    The whole matrix is validated with one set-based query (direct children)
+    plus the cached seller plan costs (plan enablement + parent cost per plan)
+    and then written with ONE INSERT ... ON CONFLICT DO UPDATE. Edges that
+    carry an admin override are left untouched (the conflict update is
+    filtered on is_admin_override) and reported back as skipped. All-or-nothing on validation errors.
+    """
+    keys = [(int(current_user_id), int(c), int(p)) for c, p, _, _ in items]
+    _ensure_unique_edge_keys(keys)
+
+    await _ensure_children_are_direct(db, {(int(current_user_id), int(c)) for c, _, _, _ in items})
+
+    plan_ids = sorted({int(p) for _, p, _, _ in items})
+
+    # Seller "has" a plan if there exists an incoming edge price (parent -> seller) for that plan;
+    # the same (cached) lookup gives the cost per plan for the margin rule.
+    costs = await get_seller_plan_costs(db, seller_user_id=int(current_user_id))
+    not_enabled = [pid for pid in plan_ids if pid not in costs]
+    if not_enabled:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Plan(s) not enabled for this seller: {not_enabled}. Admin must set (parent -> seller) price first.",
+        )
+
+    errors: list[str] = []
+    for child_id, plan_id, price_cents, currency in items:
+        cost = costs[int(plan_id)]
+        if currency != cost.currency:
+            errors.append(f"child={child_id} plan={plan_id}: currency mismatch (parent cost is {cost.currency})")
+        elif int(price_cents) < cost.cost_cents:
+            errors.append(
+                f"child={child_id} plan={plan_id}: price too low, must be >= {cost.cost_cents} {cost.currency}"
+            )
+    if errors:
+        raise HTTPException(status_code=400, detail=errors[:50])
+
+    rows = [
+        {
+            "parent_user_id": int(current_user_id),
+            "child_user_id": int(child_id),
+            "plan_id": int(plan_id),
+            "price_cents": int(price_cents),
+            "currency": currency,
+            "is_admin_override": False,
+            "updated_by_user_id": int(current_user_id),
+        }
+        for child_id, plan_id, price_cents, currency in items
+    ]
+
+    ins = pg_insert(SellerEdgePlanPrice).values(rows)
+    stmt = ins.on_conflict_do_update(
+        index_elements=[
+            SellerEdgePlanPrice.parent_user_id,
+            SellerEdgePlanPrice.child_user_id,
+            SellerEdgePlanPrice.plan_id,
+        ],
+        set_={
+            "price_cents": ins.excluded.price_cents,
+            "currency": ins.excluded.currency,
+            "updated_by_user_id": ins.excluded.updated_by_user_id,
+            "updated_at": func.now(),
+        },
+        # sellers cannot change admin-overridden edges
+        where=SellerEdgePlanPrice.is_admin_override.is_(False),
+    ).returning(
+        SellerEdgePlanPrice.parent_user_id,
+        SellerEdgePlanPrice.child_user_id,
+        SellerEdgePlanPrice.plan_id,
+    )
+
+    try:
+        res = await db.execute(stmt)
+        applied = {(int(r[0]), int(r[1]), int(r[2])) for r in res.all()}
+        await notify_pricing_changed(db)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="DB constraint failed (invalid user_id/plan_id?)")
+
+    skipped = [
+        {"parent_user_id": p, "child_user_id": c, "plan_id": pl}
+        for (p, c, pl) in keys
+        if (p, c, pl) not in applied
+    ]
+    return {"applied": len(applied), "skipped_admin_override": skipped}
+
+
+async def bulk_upsert_edge_prices_admin_override(
+    db: AsyncSession,
+    *,
+    admin_user_id: int,
+    items: list[tuple[int, int, int, int, str]],  # [(parent, child, plan, price_cents, currency)]
+) -> dict:
+    """
+    Bulk version of upsert_edge_price_admin_override: direct-edge check for all
+    pairs in one query, then one INSERT ... ON CONFLICT DO UPDATE that marks
+    every written edge as admin override. Margin rule is bypassed by definition.
+    """
+    keys = [(int(p), int(c), int(pl)) for p, c, pl, _, _ in items]
+    _ensure_unique_edge_keys(keys)
+
+    await _ensure_children_are_direct(db, {(int(p), int(c)) for p, c, _, _, _ in items})
+
+    rows = [
+        {
+            "parent_user_id": int(parent_id),
+            "child_user_id": int(child_id),
+            "plan_id": int(plan_id),
+            "price_cents": int(price_cents),
+            "currency": currency,
+            "is_admin_override": True,
+            "updated_by_user_id": int(admin_user_id),
+        }
+        for parent_id, child_id, plan_id, price_cents, currency in items
+    ]
+
+    ins = pg_insert(SellerEdgePlanPrice).values(rows)
+    stmt = ins.on_conflict_do_update(
+        index_elements=[
+            SellerEdgePlanPrice.parent_user_id,
+            SellerEdgePlanPrice.child_user_id,
+            SellerEdgePlanPrice.plan_id,
+        ],
+        set_={
+            "price_cents": ins.excluded.price_cents,
+            "currency": ins.excluded.currency,
+            "is_admin_override": True,
+            "updated_by_user_id": ins.excluded.updated_by_user_id,
+            "updated_at": func.now(),
+        },
+    )
+
+    try:
+        await db.execute(stmt)
+        await notify_pricing_changed(db)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="DB constraint failed (invalid user_id/plan_id?)")
+
+    # admin override always wins: every row is either inserted or updated
+    return {"applied": len(rows), "skipped_admin_override": []}
+
+
 async def list_edges_for_parent(
     db: AsyncSession,
     *,
@@ -267,38 +483,3 @@ async def list_edges_for_parent(
     stmt = stmt.order_by(SellerEdgePlanPrice.child_user_id.asc(), SellerEdgePlanPrice.plan_id.asc())
     res = await db.execute(stmt)
     return list(res.scalars().all())
-
-
-async def list_edges_within_subtree(
-    db: AsyncSession,
-    *,
-    root_user_id: int,
-    plan_id: Optional[int] = None,
-) -> List[SellerEdgePlanPrice]:
-    # We want edges where parent_user is inside root subtree.
-    # Using ltree: parent.path <@ root.path (parent is descendant of root)
-    root = await _get_user_or_404(db, root_user_id)
-
-    # SQLAlchemy + custom ltree type: safest is raw ltree operator via text()
-    # Join seller_edge_plan_prices -> users (parent)
-    sql = """
-    SELECT ep.*
-    FROM public.seller_edge_plan_prices ep
-    JOIN public.users u_parent ON u_parent.id = ep.parent_user_id
-    WHERE u_parent.path <@ :root_path
-    """
-    params = {"root_path": str(root.path)}
-    if plan_id is not None:
-        sql += " AND ep.plan_id = :plan_id"
-        params["plan_id"] = plan_id
-    sql += " ORDER BY ep.parent_user_id, ep.child_user_id, ep.plan_id"
-
-    res = await db.execute(text(sql), params)
-    rows = res.mappings().all()
-
-    # Convert mappings -> ORM objects (simple manual hydration)
-    out: List[SellerEdgePlanPrice] = []
-    for r in rows:
-        obj = SellerEdgePlanPrice(**dict(r))
-        out.append(obj)
-    return out
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import NamedTuple
+
+from sqlalchemy import event, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models.pricing import AdminPlanBasePrice, SellerEdgePlanPrice
+
+logger = logging.getLogger(__name__)
+
+
+PRICING_CHANNEL = "pricing_changed"
+
+
+class CachedPrice(NamedTuple):
+    price_cents: int
+    currency: str
+
+
+class SellerPlanCost(NamedTuple):
+    plan_id: int
+    category: str
+    code: str
+    title: str
+    is_active: bool
+    cost_cents: int
+    currency: str
+
+
+_MISSING = object()
+
+# Plans a user can pass down + their cost, in one query:
+#   - admin: every plan with a base price (cost = base price)
+#   - seller: every plan with an incoming edge (cost = incoming edge price)
+_SELLER_PLAN_COSTS_SQL = text(
+    """
+    SELECT p.id AS plan_id, p.category, p.code, p.title, p.is_active, c.cost_cents, c.currency
+    FROM (
+        SELECT b.plan_id, b.base_price_cents AS cost_cents, b.currency
+        FROM public.users u
+        JOIN public.admin_plan_base_prices b ON TRUE
+        WHERE u.id = :user_id AND u.role = 'admin'
+        UNION ALL
+        SELECT e.plan_id, e.price_cents AS cost_cents, e.currency
+        FROM public.users u
+        JOIN public.seller_edge_plan_prices e
+          ON e.parent_user_id = u.parent_id
+         AND e.child_user_id = u.id
+        WHERE u.id = :user_id AND u.role <> 'admin'
+    ) c
+    JOIN public.plans p ON p.id = c.plan_id
+    ORDER BY p.id ASC
+    """
+)
+
+
+class PricingCache:
+    """
+    Per-process cache of admin base prices (by plan_id), edge prices
+    (by (parent, child, plan)) and per-seller enabled plans with their cost
+    (by seller id). Missing rows are cached too (as None).
+
+    Every pricing write bumps `version` (locally after commit, and in other
+    workers through Postgres LISTEN/NOTIFY). A read that started before a bump
+    does not store its result, so an invalidation can never be undone by a
+    slow concurrent fill. Entries also expire after ttl_seconds as a safety net
+    for a missed notification.
+    """
+
+    def __init__(self, *, ttl_seconds: float, enabled: bool = True, max_sellers: int = 10000):
+        self.ttl_seconds = float(ttl_seconds)
+        self.enabled = bool(enabled)
+        self.max_sellers = int(max_sellers)
+        self.version = 0
+        self._base: dict[int, tuple[float, CachedPrice | None]] = {}
+        self._edges: dict[tuple[int, int, int], tuple[float, CachedPrice | None]] = {}
+        self._seller_plans: dict[int, tuple[float, dict[int, SellerPlanCost]]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.listener_connected = False
+
+    def invalidate(self) -> None:
+        self.version += 1
+        self.invalidations += 1
+        self._base.clear()
+        self._edges.clear()
+        self._seller_plans.clear()
+
+    def _get(self, store: dict, key):
+        if not self.enabled:
+            return _MISSING
+        hit = store.get(key)
+        if hit is None:
+            self.misses += 1
+            return _MISSING
+        stored_at, value = hit
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            store.pop(key, None)
+            self.misses += 1
+            return _MISSING
+        self.hits += 1
+        return value
+
+    def _put(self, store: dict, key, value: CachedPrice | None, version: int) -> None:
+        if self.enabled and version == self.version:
+            store[key] = (time.monotonic(), value)
+
+    async def get_base_price(self, db: AsyncSession, plan_id: int) -> CachedPrice | None:
+        key = int(plan_id)
+        cached = self._get(self._base, key)
+        if cached is not _MISSING:
+            return cached
+
+        version = self.version
+        res = await db.execute(
+            select(AdminPlanBasePrice.base_price_cents, AdminPlanBasePrice.currency).where(
+                AdminPlanBasePrice.plan_id == key
+            )
+        )
+        row = res.first()
+        value = CachedPrice(int(row[0]), row[1]) if row else None
+        self._put(self._base, key, value, version)
+        return value
+
+    async def get_edge_price(
+        self, db: AsyncSession, parent_user_id: int, child_user_id: int, plan_id: int
+    ) -> CachedPrice | None:
+        key = (int(parent_user_id), int(child_user_id), int(plan_id))
+        cached = self._get(self._edges, key)
+        if cached is not _MISSING:
+            return cached
+
+        version = self.version
+        res = await db.execute(
+            select(SellerEdgePlanPrice.price_cents, SellerEdgePlanPrice.currency).where(
+                SellerEdgePlanPrice.parent_user_id == key[0],
+                SellerEdgePlanPrice.child_user_id == key[1],
+                SellerEdgePlanPrice.plan_id == key[2],
+            )
+        )
+        row = res.first()
+        value = CachedPrice(int(row[0]), row[1]) if row else None
+        self._put(self._edges, key, value, version)
+        return value
+
+    async def get_seller_plan_costs(self, db: AsyncSession, seller_user_id: int) -> dict[int, SellerPlanCost]:
+        """
+        {plan_id: SellerPlanCost} for every plan this user can pass down.
+        Inactive plans are included (is_active=False); callers filter.
+        Do not mutate the returned dict.
+        """
+        key = int(seller_user_id)
+        cached = self._get(self._seller_plans, key)
+        if cached is not _MISSING:
+            return cached
+
+        version = self.version
+        res = await db.execute(_SELLER_PLAN_COSTS_SQL, {"user_id": key})
+        value = {
+            int(r["plan_id"]): SellerPlanCost(
+                plan_id=int(r["plan_id"]),
+                category=r["category"],
+                code=r["code"],
+                title=r["title"],
+                is_active=bool(r["is_active"]),
+                cost_cents=int(r["cost_cents"]),
+                currency=r["currency"],
+            )
+            for r in res.mappings().all()
+        }
+        if key not in self._seller_plans and len(self._seller_plans) >= self.max_sellers:
+            # dicts keep insertion order: drop the oldest fill
+            self._seller_plans.pop(next(iter(self._seller_plans)), None)
+        self._put(self._seller_plans, key, value, version)
+        return value
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "invalidations": self.invalidations,
+            "base_entries": len(self._base),
+            "edge_entries": len(self._edges),
+            "seller_entries": len(self._seller_plans),
+            "listener_connected": self.listener_connected,
+        }
+
+
+pricing_cache = PricingCache(
+    ttl_seconds=settings.PRICING_CACHE_TTL_SECONDS,
+    enabled=settings.PRICING_CACHE_ENABLED,
+    max_sellers=settings.PRICING_CACHE_MAX_SELLERS,
+)
+
+
+def _invalidate_after_commit(session) -> None:
+    session.info.pop("pricing_notify_registered", None)
+    pricing_cache.invalidate()
+
+
+async def notify_pricing_changed(db: AsyncSession) -> None:
+    """
+    Call inside every transaction that writes admin_plan_base_prices,
+    seller_edge_plan_prices or plans.
+
+    - pg_notify is transactional: other workers hear about it only on commit
+    - this worker's cache is invalidated right after the commit
+    """
+    await db.execute(select(func.pg_notify(PRICING_CHANNEL, "")))
+    sync_session = db.sync_session
+    if not sync_session.info.get("pricing_notify_registered"):
+        sync_session.info["pricing_notify_registered"] = True
+        event.listen(sync_session, "after_commit", _invalidate_after_commit, once=True)
+
+
+class PricingInvalidationListener:
+    """
+    Keeps one dedicated connection LISTENing on PRICING_CHANNEL and invalidates
+    the local cache on every notification. While disconnected (and right after
+    reconnecting, since notifications may have been missed) the cache is cleared.
+    """
+
+    def __init__(self, *, reconnect_seconds: float = 5.0):
+        self.reconnect_seconds = float(reconnect_seconds)
+        self._task: asyncio.Task | None = None
+        self._stopping = asyncio.Event()
+
+    async def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="pricing-listener")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopping.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._task = None
+        pricing_cache.listener_connected = False
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        pricing_cache.invalidate()
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                async with engine.connect() as conn:
+                    raw = await conn.get_raw_connection()
+                    driver_conn = raw.driver_connection  # asyncpg connection
+                    await driver_conn.add_listener(PRICING_CHANNEL, self._on_notify)
+                    pricing_cache.invalidate()
+                    pricing_cache.listener_connected = True
+                    try:
+                        while not self._stopping.is_set() and not driver_conn.is_closed():
+                            try:
+                                await asyncio.wait_for(self._stopping.wait(), timeout=self.reconnect_seconds)
+                            except asyncio.TimeoutError:
+                                pass
+                    finally:
+                        pricing_cache.listener_connected = False
+                        if not driver_conn.is_closed():
+                            await driver_conn.remove_listener(PRICING_CHANNEL, self._on_notify)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("pricing listener connection failed")
+                pricing_cache.listener_connected = False
+                pricing_cache.invalidate()
+
+            if not self._stopping.is_set():
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.reconnect_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+
+pricing_listener = PricingInvalidationListener()
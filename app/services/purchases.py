@@ -10,10 +10,14 @@ from app.models.user import User
 from app.models.plan import Plan
 from app.models.wallet import WalletAccount, WalletLedger
 from app.services.wallet import _ensure_wallet_account, _lock_accounts, USD, InsufficientBalance
+from app.services.outbox import ORDER_PAID, emit_event, emit_ledger_posted
+from app.services.coupon_codes import CouponCodeError, allocate_coupon_codes
+from app.services.coupon_inventory import record_minted
+from app.services.coupon_category_versions import load_coupon_category_columns
+from app.services.coupon_owner_paths import coupon_owner_columns
+from app.services.coupon_pools import claim_pooled_coupons
 
-# IMPORTANT:
-# These class names MUST match your existing app/models/pricing.py
-from app.models.pricing import AdminPlanBasePrice, SellerEdgePlanPrice
+from app.services.pricing_cache import pricing_cache
 
 # Module E
 from app.models.coupon import Coupon
@@ -26,6 +30,12 @@ class PurchaseError(Exception):
     pass
 
 
+# Inline delivery returns every key in the response body; larger orders must use
+# deferred delivery and download keys from the streaming order-keys endpoint.
+INLINE_KEYS_MAX_QUANTITY = 200
+DEFERRED_KEYS_MAX_QUANTITY = 10000
+
+
 def _now_utc() -> datetime:
     return datetime.utcnow()
 
@@ -48,28 +58,30 @@ async def _get_plan(db: AsyncSession, plan_id: int) -> Plan:
     return p
 
 
+async def _get_ancestors(db: AsyncSession, buyer: User) -> dict[int, User]:
+    """
+    All ancestors of buyer (by ltree path) in one query, keyed by id.
+    Falls back to an empty map if buyer has no path; callers then load per user.
+    """
+    if not buyer.path:
+        return {}
+    res = await db.execute(select(User).where(User.path.op("@>")(buyer.path)))
+    return {int(u.id): u for u in res.scalars().all()}
+
+
+# Prices come from the in-process pricing cache (invalidated on every pricing write)
 async def _get_admin_base_price_cents(db: AsyncSession, plan_id: int) -> int:
-    res = await db.execute(
-        select(AdminPlanBasePrice.base_price_cents).where(AdminPlanBasePrice.plan_id == plan_id)
-    )
-    v = res.scalar_one_or_none()
+    v = await pricing_cache.get_base_price(db, plan_id)
     if v is None:
         raise PurchaseError("Admin base price missing for plan.")
-    return int(v)
+    return int(v.price_cents)
 
 
 async def _get_edge_price_cents(db: AsyncSession, parent_id: int, child_id: int, plan_id: int) -> int:
-    res = await db.execute(
-        select(SellerEdgePlanPrice.price_cents).where(
-            SellerEdgePlanPrice.parent_user_id == parent_id,
-            SellerEdgePlanPrice.child_user_id == child_id,
-            SellerEdgePlanPrice.plan_id == plan_id,
-        )
-    )
-    v = res.scalar_one_or_none()
+    v = await pricing_cache.get_edge_price(db, parent_id, child_id, plan_id)
     if v is None:
         raise PurchaseError(f"Edge price missing for parent={parent_id} child={child_id} plan={plan_id}.")
-    return int(v)
+    return int(v.price_cents)
 
 
 async def purchase_plan_and_distribute(
@@ -79,6 +91,7 @@ async def purchase_plan_and_distribute(
     quantity: int = 1,
     note: str | None = None,
     owner_user_id: int | None = None,
+    include_keys: bool = True,
 ) -> dict:
     """
     Buyer is charged using direct parent -> buyer edge price for plan.
@@ -103,10 +116,21 @@ async def purchase_plan_and_distribute(
       - if owner_user_id is provided:
           - only allowed when buyer is a seller
           - owner_user_id must be buyer itself OR buyer's DIRECT child (no grandchildren)
+
+    Key delivery:
+      - include_keys=True (default): coupon_codes + keys_text are returned inline
+      - include_keys=False: only the order number is returned; keys are fetched
+        later via the streaming order-keys download (app/services/order_keys.py)
     """
     if quantity < 1:
         raise PurchaseError("quantity must be >= 1.")
 
+    max_quantity = INLINE_KEYS_MAX_QUANTITY if include_keys else DEFERRED_KEYS_MAX_QUANTITY
+    if quantity > max_quantity:
+        raise PurchaseError(
+            f"quantity must be <= {max_quantity} for {'inline' if include_keys else 'deferred'} key delivery."
+        )
+
     await _get_plan(db, plan_id)
 
     if buyer.parent_id is None:
@@ -115,12 +139,14 @@ async def purchase_plan_and_distribute(
     # --- Coupon owner logic (who receives the coupons) ---
     coupon_owner_id = int(owner_user_id) if owner_user_id is not None else int(buyer.id)
 
+    coupon_owner = buyer
     if coupon_owner_id != int(buyer.id):
         # Only seller can assign ownership to someone else
         if buyer.role != "seller":
             raise PurchaseError("Only seller can assign coupon ownership to another user.")
 
         owner = await _get_user(db, coupon_owner_id)
+        coupon_owner = owner
 
         # Must be direct child of seller (privacy rule)
         if owner.parent_id != int(buyer.id):
@@ -136,6 +162,8 @@ async def purchase_plan_and_distribute(
     # Build unit credits_by_user (unit profits + unit admin base)
     credits_by_user_unit: dict[int, int] = {}
 
+    ancestors = await _get_ancestors(db, buyer)
+
     current_child = buyer
 
     while True:
@@ -143,7 +171,7 @@ async def purchase_plan_and_distribute(
         if parent_id is None:
             raise PurchaseError("Tree broken: reached user without parent before admin.")
 
-        parent = await _get_user(db, parent_id)
+        parent = ancestors.get(int(parent_id)) or await _get_user(db, parent_id)
 
         sell_price = await _get_edge_price_cents(db, parent.id, current_child.id, plan_id)
 
@@ -214,6 +242,7 @@ async def purchase_plan_and_distribute(
             },
         )
         db.add(debit_entry)
+        ledger_entries: list[WalletLedger] = [debit_entry]
 
         # 2) credits
         total_credits = 0
@@ -228,7 +257,7 @@ async def purchase_plan_and_distribute(
                 .values(balance_cents=acc.balance_cents + cents, updated_at=_now_utc())
             )
 
-            user_obj = await _get_user(db, uid)
+            user_obj = ancestors.get(int(uid)) or await _get_user(db, uid)
 
             if user_obj.role == "admin":
                 # admin credit contains base*qty + profit
@@ -248,6 +277,7 @@ async def purchase_plan_and_distribute(
                     meta={"plan_id": plan_id, "quantity": quantity},
                 )
                 db.add(base_entry)
+                ledger_entries.append(base_entry)
 
                 if admin_profit > 0:
                     profit_entry = WalletLedger(
@@ -262,6 +292,7 @@ async def purchase_plan_and_distribute(
                         meta={"plan_id": plan_id, "quantity": quantity},
                     )
                     db.add(profit_entry)
+                    ledger_entries.append(profit_entry)
             else:
                 profit_entry = WalletLedger(
                     tx_id=tx_id,
@@ -275,6 +306,7 @@ async def purchase_plan_and_distribute(
                     meta={"plan_id": plan_id, "quantity": quantity},
                 )
                 db.add(profit_entry)
+                ledger_entries.append(profit_entry)
 
         if total_credits != total_paid_cents:
             raise PurchaseError(f"Internal mismatch: credits({total_credits}) != purchase({total_paid_cents}).")
@@ -296,23 +328,40 @@ async def purchase_plan_and_distribute(
         db.add(order)
         await db.flush()  # ensures order.id and order.order_no
 
-        # Generate coupons immediately (no inventory), assign to coupon_owner_id, create items
         coupon_codes: list[str] = []
 
-        for _ in range(quantity):
-            code: str | None = None
-
-            # Avoid mid-loop rollback: pre-check for collisions
-            for _attempt in range(20):
-                candidate = f"Certify-{uuid4().hex[:8]}"
-                exists = await db.execute(select(Coupon.coupon_code).where(Coupon.coupon_code == candidate))
-                if exists.scalar_one_or_none() is None:
-                    code = candidate
-                    break
-
-            if code is None:
-                raise PurchaseError("Failed to generate unique coupon code.")
-
+        # Pool mode: take pre-minted coupons (ownership handover, no INSERTs) ...
+        pooled_codes = await claim_pooled_coupons(
+            db,
+            plan_id=plan_id,
+            quantity=quantity,
+            owner=coupon_owner,
+            actor_user_id=int(buyer.id),
+            order_id=int(order.id),
+            notes=note,
+            meta={
+                "source": "purchase",
+                "order_no": order.order_no,
+                "tx_id": str(tx_id),
+                "plan_id": plan_id,
+                "quantity": quantity,
+                "coupon_owner_id": coupon_owner_id,
+            },
+        )
+        if include_keys:
+            coupon_codes.extend(pooled_codes)
+        mint_quantity = int(quantity) - len(pooled_codes)
+
+        # ... and generate the rest immediately, assign to coupon_owner_id, create items.
+        # Collision-free allocator: one sequence round trip for the whole order
+        try:
+            new_codes = await allocate_coupon_codes(db, mint_quantity) if mint_quantity > 0 else []
+        except CouponCodeError as e:
+            raise PurchaseError(str(e))
+
+        owner_columns = coupon_owner_columns(coupon_owner)
+        category_columns = await load_coupon_category_columns(db, plan_id) if new_codes else {}
+        for code in new_codes:
             coupon = Coupon(
                 coupon_code=code,
                 plan_id=plan_id,
@@ -320,6 +369,8 @@ async def purchase_plan_and_distribute(
                 created_by_user_id=buyer.id,        # payer/actor
                 owner_user_id=coupon_owner_id,      # coupon owner (seller or direct child)
                 notes=note,
+                **owner_columns,
+                **category_columns,
             )
             db.add(coupon)
 
@@ -347,7 +398,29 @@ async def purchase_plan_and_distribute(
                 )
             )
 
-            coupon_codes.append(code)
+            if include_keys:
+                coupon_codes.append(code)
+
+        if new_codes:
+            await record_minted(db, owner_user_id=coupon_owner_id, plan_id=plan_id, count=len(new_codes))
+
+        # Outbox: derived data (rollups, notifications, caches) is maintained
+        # asynchronously from these events instead of inside this transaction.
+        await emit_ledger_posted(db, tx_id=tx_id, entries=ledger_entries, kind="purchase")
+        await emit_event(
+            db,
+            event_type=ORDER_PAID,
+            payload={
+                "order_no": int(order.order_no),
+                "tx_id": str(tx_id),
+                "buyer_user_id": int(buyer.id),
+                "coupon_owner_user_id": coupon_owner_id,
+                "plan_id": plan_id,
+                "quantity": quantity,
+                "unit_price_cents": unit_price_cents,
+                "total_paid_cents": total_paid_cents,
+            },
+        )
 
         await db.commit()
 
@@ -369,6 +442,7 @@ async def purchase_plan_and_distribute(
             "coupon_owner_user_id": coupon_owner_id,
             "coupon_codes": coupon_codes,
             "keys_text": keys_text,
+            "keys_delivery": "inline" if include_keys else "deferred",
         }
 
     except Exception:
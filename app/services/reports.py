@@ -45,6 +45,22 @@ def _ltree_is_descendant_expr(user_path_col, admin_path: str):
     return user_path_col.op("<@")(admin_path)
 
 
+def _owner_in_admin_subtree_expr(owner_user, admin_path: str):
+    """
+    Coupon owner under admin_path: the denormalized coupons.owner_path, or,
+    for coupons the owner-path backfill has not reached yet (owner_path NULL),
+    the owner's users.path via `owner_user` (outer-joined with _owner_user_join).
+    """
+    return or_(
+        _ltree_is_descendant_expr(Coupon.owner_path, admin_path),
+        and_(Coupon.owner_path.is_(None), _ltree_is_descendant_expr(owner_user.path, admin_path)),
+    )
+
+
+def _owner_user_join(owner_user):
+    return and_(Coupon.owner_path.is_(None), owner_user.id == Coupon.owner_user_id)
+
+
 async def _assert_user_in_admin_subtree(db: AsyncSession, *, current_admin: User, user_id: int) -> None:
     if not getattr(current_admin, "path", None):
         raise ReportError("Current admin has no path; cannot scope subtree.")
@@ -117,13 +133,15 @@ async def _fetch_coupon_rows(
     from sqlalchemy.orm import aliased
 
     UCreated = aliased(User)
-    UOwner = aliased(User)
     UReserved = aliased(User)
     UUsed = aliased(User)
 
+    UOwner = aliased(User)
+
     subtree_or = or_(
         and_(Coupon.created_by_user_id.isnot(None), UCreated.id.isnot(None), _ltree_is_descendant_expr(UCreated.path, current_admin.path)),
-        and_(Coupon.owner_user_id.isnot(None), UOwner.id.isnot(None), _ltree_is_descendant_expr(UOwner.path, current_admin.path)),
+        # owner: denormalized coupons.owner_path; users.path only for not yet backfilled coupons
+        _owner_in_admin_subtree_expr(UOwner, current_admin.path),
         and_(Coupon.reserved_by_user_id.isnot(None), UReserved.id.isnot(None), _ltree_is_descendant_expr(UReserved.path, current_admin.path)),
         and_(Coupon.used_by_user_id.isnot(None), UUsed.id.isnot(None), _ltree_is_descendant_expr(UUsed.path, current_admin.path)),
     )
@@ -152,9 +170,9 @@ async def _fetch_coupon_rows(
         select(Coupon, Plan)
         .join(Plan, Plan.id == Coupon.plan_id)
         .outerjoin(UCreated, UCreated.id == Coupon.created_by_user_id)
-        .outerjoin(UOwner, UOwner.id == Coupon.owner_user_id)
         .outerjoin(UReserved, UReserved.id == Coupon.reserved_by_user_id)
         .outerjoin(UUsed, UUsed.id == Coupon.used_by_user_id)
+        .outerjoin(UOwner, _owner_user_join(UOwner))
         .where(where_clause)
         .order_by(Coupon.created_at.desc(), Coupon.coupon_code.asc())
         .limit(limit)
@@ -350,22 +368,22 @@ async def generate_coupon_trace_pdf(
     from sqlalchemy.orm import aliased
 
     UCreated = aliased(User)
-    UOwner = aliased(User)
     UReserved = aliased(User)
     UUsed = aliased(User)
+    UOwner = aliased(User)
 
     scope_stmt = (
         select(Coupon.coupon_code)
         .select_from(Coupon)
         .outerjoin(UCreated, UCreated.id == Coupon.created_by_user_id)
-        .outerjoin(UOwner, UOwner.id == Coupon.owner_user_id)
         .outerjoin(UReserved, UReserved.id == Coupon.reserved_by_user_id)
         .outerjoin(UUsed, UUsed.id == Coupon.used_by_user_id)
+        .outerjoin(UOwner, _owner_user_join(UOwner))
         .where(Coupon.coupon_code == coupon_code)
         .where(
             or_(
                 and_(Coupon.created_by_user_id.isnot(None), _ltree_is_descendant_expr(UCreated.path, current_admin.path)),
-                and_(Coupon.owner_user_id.isnot(None), _ltree_is_descendant_expr(UOwner.path, current_admin.path)),
+                _owner_in_admin_subtree_expr(UOwner, current_admin.path),
                 and_(Coupon.reserved_by_user_id.isnot(None), _ltree_is_descendant_expr(UReserved.path, current_admin.path)),
                 and_(Coupon.used_by_user_id.isnot(None), _ltree_is_descendant_expr(UUsed.path, current_admin.path)),
             )
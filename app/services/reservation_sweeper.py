@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.services.coupon_transitions import apply_batch_transition
+from app.services.outbox import emit_event
+
+logger = logging.getLogger(__name__)
+
+
+COUPON_RESERVATIONS_SWEPT = "coupon_reservations_swept"
+
+_SWEEP_LOCK_ID = 29_0002
+
+
+async def sweep_stale_reservations(
+    *,
+    ttl_minutes: int | None = None,
+    batch_size: int | None = None,
+    max_batches: int | None = None,
+) -> dict:
+    """
+    Unreserve coupons that have been `reserved` for longer than the TTL
+    (failed provisioning leaves them there on purpose, see admin_mark_coupon_failed).
+    Reservations held after an unknown provider outcome (HELD_FAILURE_STEPS,
+    the device may have been issued) are never swept; an admin releases them.
+
+    Each batch is its own short transaction (own session):
+      - rows held by a live issuance are skipped (FOR UPDATE SKIP LOCKED), never waited on
+      - lock_timeout guards the counter / outbox writes that come after the update
+      - one bulk UPDATE + `unreserved` events + inventory/outbox rows per batch
+
+    Only one worker sweeps at a time (advisory lock, taken per batch).
+    Returns {"unreserved": n, "batches": k, "cutoff": iso}; unreserved=-1 if
+    another worker holds the lock.
+    """
+    ttl = int(ttl_minutes if ttl_minutes is not None else settings.RESERVATION_TTL_MINUTES)
+    size = int(batch_size if batch_size is not None else settings.RESERVATION_SWEEP_BATCH_SIZE)
+    rounds = int(max_batches if max_batches is not None else settings.RESERVATION_SWEEP_MAX_BATCHES)
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=ttl)
+
+    total = 0
+    batches = 0
+    while batches < rounds:
+        async with AsyncSessionLocal() as db:
+            got = await db.execute(text("SELECT pg_try_advisory_xact_lock(:k)"), {"k": _SWEEP_LOCK_ID})
+            if not got.scalar_one():
+                await db.rollback()
+                if batches == 0:
+                    return {"unreserved": -1, "batches": 0, "cutoff": cutoff.isoformat()}
+                break
+
+            await db.execute(text("SET LOCAL lock_timeout = '2s'"))
+            try:
+                outcomes = await apply_batch_transition(
+                    db,
+                    action="unreserve",
+                    actor_user_id=None,
+                    reserved_before=cutoff,
+                    limit=size,
+                    event_meta={"reason": "reservation_expired", "ttl_minutes": ttl},
+                )
+                n = len(outcomes)
+                if n:
+                    await emit_event(
+                        db,
+                        event_type=COUPON_RESERVATIONS_SWEPT,
+                        payload={
+                            "count": n,
+                            "ttl_minutes": ttl,
+                            "cutoff": cutoff.isoformat(),
+                            "coupon_codes": [o["coupon_code"] for o in outcomes[:100]],
+                        },
+                    )
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+        batches += 1
+        total += n
+        if n < size:
+            break
+
+    if total:
+        logger.info("reservation sweep: unreserved %s coupon(s) older than %s min", total, ttl)
+    return {"unreserved": total, "batches": batches, "cutoff": cutoff.isoformat()}
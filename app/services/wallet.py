@@ -10,6 +10,7 @@ from sqlalchemy.exc import IntegrityError
 
 from app.models.user import User
 from app.models.wallet import WalletAccount, WalletLedger
+from app.services.outbox import emit_ledger_posted
 
 
 USD = "USD"
@@ -130,6 +131,7 @@ async def admin_topup(
         )
         db.add(entry)
         await db.flush()
+        await emit_ledger_posted(db, tx_id=tx_id, entries=[entry], kind="admin_topup")
         return entry
 
     except Exception:
@@ -202,6 +204,7 @@ async def transfer_between_users(
     db.add(in_entry)
     await db.flush()
 
+    await emit_ledger_posted(db, tx_id=tx_id, entries=[out_entry, in_entry], kind="transfer")
     return [out_entry, in_entry]
 
 
@@ -303,6 +306,7 @@ async def admin_set_balance_via_parent(
             db.add(out_entry)
             db.add(in_entry)
             await db.flush()
+            await emit_ledger_posted(db, tx_id=tx_id, entries=[out_entry, in_entry], kind="admin_set_balance_via_parent")
             return [out_entry, in_entry]
 
         # target < current: child pays parent
@@ -353,6 +357,7 @@ async def admin_set_balance_via_parent(
         db.add(out_entry)
         db.add(in_entry)
         await db.flush()
+        await emit_ledger_posted(db, tx_id=tx_id, entries=[out_entry, in_entry], kind="admin_set_balance_via_parent")
         return [out_entry, in_entry]
 
     except Exception:
@@ -447,6 +452,8 @@ async def admin_delete_user_return_balance_to_parent(
         await db.execute(delete(WalletAccount).where(WalletAccount.user_id == int(target_user.id)))
         await db.execute(delete(User).where(User.id == int(target_user.id)))
 
+        if entries:
+            await emit_ledger_posted(db, tx_id=tx_id, entries=entries, kind="admin_delete_return_balance")
         return entries
 
     except Exception:
@@ -550,6 +557,7 @@ async def seller_set_balance_via_parent(
         db.add(out_entry)
         db.add(in_entry)
         await db.flush()
+        await emit_ledger_posted(db, tx_id=tx_id, entries=[out_entry, in_entry], kind="seller_set_balance_via_parent")
         return [out_entry, in_entry]
 
     # target < current: child pays seller
@@ -600,6 +608,7 @@ async def seller_set_balance_via_parent(
     db.add(out_entry)
     db.add(in_entry)
     await db.flush()
+    await emit_ledger_posted(db, tx_id=tx_id, entries=[out_entry, in_entry], kind="seller_set_balance_via_parent")
     return [out_entry, in_entry]
 
 
@@ -735,6 +744,8 @@ async def seller_delete_user_return_balance_to_parent(
     # NOTE: We do NOT delete users or wallet_accounts to avoid FK violations
     # with orders and to preserve audit history.
 
+    if entries:
+        await emit_ledger_posted(db, tx_id=tx_id, entries=entries, kind="seller_deactivate_subtree_return_balance")
     return entries
 
 
@@ -0,0 +1,24 @@
+"""COUPON_CODE_KEY is required; only a missing or placeholder value fails startup."""
+
+import pytest
+from pydantic import ValidationError
+
+from app.core.config import Settings
+
+
+@pytest.mark.parametrize("value", ["", "  ", "change-me", "CHANGE_ME", "changeme"])
+def test_placeholder_coupon_code_key_is_rejected(monkeypatch, value):
+    monkeypatch.setenv("COUPON_CODE_KEY", value)
+    with pytest.raises(ValidationError, match="token_hex"):
+        Settings()
+
+
+def test_missing_coupon_code_key_is_rejected(monkeypatch):
+    monkeypatch.delenv("COUPON_CODE_KEY", raising=False)
+    with pytest.raises(ValidationError, match="COUPON_CODE_KEY"):
+        Settings(_env_file=None)
+
+
+def test_generated_coupon_code_key_is_accepted(monkeypatch):
+    monkeypatch.setenv("COUPON_CODE_KEY", "9f2c" * 16)
+    assert Settings().COUPON_CODE_KEY == "9f2c" * 16
@@ -0,0 +1,78 @@
+"""
+coupons.owner_path backfill and its users.path fallback, on fake sessions
+(no database).
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+
+from app.services import coupon_owner_paths, reports
+
+
+class BackfillSession:
+    """Answers the batch statement from an in-memory sorted list of coupon codes."""
+
+    def __init__(self, codes, drifted):
+        self.codes = sorted(codes)
+        self.drifted = set(drifted)
+        self.calls = []
+        self.commits = 0
+
+    async def execute(self, stmt, params=None):
+        assert stmt is coupon_owner_paths._BACKFILL_SQL
+        self.calls.append(dict(params))
+        chunk = [c for c in self.codes if c > params["after"]][: params["limit"]]
+        updated = [c for c in chunk if c in self.drifted]
+        self.drifted -= set(updated)
+        row = SimpleNamespace(scanned=len(chunk), last_code=max(chunk) if chunk else None, updated=len(updated))
+        return SimpleNamespace(one=lambda: row)
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        pass
+
+
+def test_backfill_walks_the_table_once_by_key():
+    codes = [f"C{i:03d}" for i in range(10)]
+    db = BackfillSession(codes, drifted=["C001", "C005", "C009"])
+
+    updated = asyncio.run(coupon_owner_paths.backfill_coupon_owner_paths(db, batch_size=4))
+
+    assert updated == 3
+    # each batch resumes after the previous one's last key; no batch restarts at the table start
+    assert [c["after"] for c in db.calls] == ["", "C003", "C007"]
+    assert db.commits == 3
+
+
+def test_backfill_stops_on_an_exactly_full_last_batch():
+    db = BackfillSession([f"C{i}" for i in range(4)], drifted=[])
+
+    assert asyncio.run(coupon_owner_paths.backfill_coupon_owner_paths(db, batch_size=2)) == 0
+    assert [c["after"] for c in db.calls] == ["", "C1", "C3"]
+
+
+class CaptureSession:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, stmt, params=None):
+        self.statements.append(stmt)
+        return SimpleNamespace(all=lambda: [])
+
+
+def test_coupon_report_scopes_not_yet_backfilled_owners_through_users_path():
+    db = CaptureSession()
+    admin = SimpleNamespace(id=1, path="u1")
+
+    rows = asyncio.run(reports._fetch_coupon_rows(db, current_admin=admin))
+
+    assert rows == []
+    sql = str(db.statements[0].compile(dialect=postgresql.dialect()))
+    assert "coupons.owner_path <@" in sql
+    # users joined for the owner only where owner_path is still NULL
+    assert "coupons.owner_path IS NULL AND users_4.id = coupons.owner_user_id" in sql
+    assert "users_4.path <@" in sql
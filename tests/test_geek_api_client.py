@@ -0,0 +1,171 @@
+"""GeekApiClient against a local stub Geek server (plain HTTP/1.1, keep-alive)."""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from app.integrations.geek_api_client import GeekApiClient, GeekApiError, GeekHttpPool
+
+
+class _StubGeekHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections open between requests
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        server.requests.append({"path": self.path, "body": body, "client_port": self.client_address[1]})
+
+        if server.delay_seconds:
+            time.sleep(server.delay_seconds)
+
+        status = server.status_code
+        payload = json.dumps({"code": 0, "udid": body["udid"]} if status == 200 else {"msg": "unavailable"})
+        data = payload.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client timed out and hung up
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubGeekHandler)
+    server.daemon_threads = True
+    server.requests = []
+    server.status_code = 200
+    server.delay_seconds = 0.0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _base_url(server) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def _client(server, **timeout) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=_base_url(server),
+        limits=httpx.Limits(max_connections=4, max_keepalive_connections=4),
+        timeout=httpx.Timeout(**{"timeout": 5.0, **timeout}),
+    )
+
+
+def test_issue_device_posts_to_mode_endpoint(stub_server):
+    async def run():
+        async with _client(stub_server) as http:
+            geek = GeekApiClient(http=http)
+            instant = await geek.issue_device("UDID-1", "instant", 1, 30, note="n")
+            await geek.issue_device("UDID-2", "reserve", 2, 0)
+        return instant
+
+    out = asyncio.run(run())
+
+    assert out == {"code": 0, "udid": "UDID-1"}
+    assert [r["path"] for r in stub_server.requests] == ["/api/adddevice", "/api/addyydevice"]
+    assert stub_server.requests[0]["body"]["type"] == 1
+    assert stub_server.requests[0]["body"]["beizhu"] == "n"
+    assert stub_server.requests[1]["body"]["beizhu"] == ""
+
+
+def test_sequential_calls_reuse_one_pooled_connection(stub_server):
+    async def run():
+        async with _client(stub_server) as http:
+            geek = GeekApiClient(http=http)
+            for i in range(5):
+                await geek.issue_device(f"UDID-{i}", "instant", 1, 30)
+
+    asyncio.run(run())
+
+    ports = {r["client_port"] for r in stub_server.requests}
+    assert len(stub_server.requests) == 5
+    assert len(ports) == 1
+
+
+def test_http_pool_hands_out_one_client_until_stopped(stub_server, monkeypatch):
+    monkeypatch.setattr("app.core.config.settings.GEEK_API_BASE_URL", _base_url(stub_server))
+
+    async def run():
+        pool = GeekHttpPool()
+        await pool.start()
+        first = pool.http
+        await GeekApiClient(http=pool.http).issue_device("UDID-1", "instant", 1, 30)
+        await GeekApiClient(http=pool.http).issue_device("UDID-2", "instant", 1, 30)
+        same = pool.http is first
+        await pool.stop()
+        assert first.is_closed
+        # lazily recreated for use outside the app lifespan
+        again = pool.http
+        await pool.stop()
+        return same, again is not first
+
+    same, recreated = asyncio.run(run())
+
+    assert same and recreated
+    assert len({r["client_port"] for r in stub_server.requests}) == 1
+
+
+@pytest.mark.parametrize("status", [400, 429, 502, 503])
+def test_non_200_raises_geek_api_error_with_status(stub_server, status):
+    stub_server.status_code = status
+
+    async def run():
+        async with _client(stub_server) as http:
+            await GeekApiClient(http=http).issue_device("UDID-1", "instant", 1, 30)
+
+    with pytest.raises(GeekApiError) as exc:
+        asyncio.run(run())
+
+    assert exc.value.status_code == status
+    assert "unavailable" in str(exc.value)
+
+
+def test_slow_provider_raises_read_timeout(stub_server):
+    stub_server.delay_seconds = 0.5
+
+    async def run():
+        async with _client(stub_server, read=0.1) as http:
+            await GeekApiClient(http=http).issue_device("UDID-1", "instant", 1, 30)
+
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(run())
+
+
+def test_pool_timeout_when_every_connection_is_busy(stub_server):
+    stub_server.delay_seconds = 0.5
+
+    async def run():
+        http = httpx.AsyncClient(
+            base_url=_base_url(stub_server),
+            limits=httpx.Limits(max_connections=1, max_keepalive_connections=1),
+            timeout=httpx.Timeout(5.0, pool=0.1),
+        )
+        async with http:
+            geek = GeekApiClient(http=http)
+            return await asyncio.gather(
+                geek.issue_device("UDID-1", "instant", 1, 30),
+                geek.issue_device("UDID-2", "instant", 1, 30),
+                return_exceptions=True,
+            )
+
+    results = asyncio.run(run())
+
+    assert sum(isinstance(r, dict) for r in results) == 1
+    assert sum(isinstance(r, httpx.PoolTimeout) for r in results) == 1
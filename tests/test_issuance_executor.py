@@ -0,0 +1,205 @@
+"""IssuanceExecutor against MockGeekProvider / scripted providers (no network)."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.integrations.geek_api_client import GeekApiError
+from app.integrations.geek_mock import MockGeekProvider
+from app.services.issuance_executor import (
+    IssuanceError,
+    IssuanceExecutor,
+    IssuanceOutcomeUnknown,
+    IssuanceUnavailable,
+)
+
+ISSUE = {"udid": "UDID-1", "issue_mode": "instant", "pool_type": 1, "warranty": 30}
+
+
+class ScriptedProvider:
+    """Each call pops the next outcome: an exception is raised, anything else returned."""
+
+    def __init__(self, outcomes, *, gate: asyncio.Event | None = None):
+        self.outcomes = list(outcomes)
+        self.gate = gate
+        self.calls = 0
+
+    async def issue_device(self, **kwargs):
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        outcome = self.outcomes.pop(0) if self.outcomes else {"code": 0}
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def _executor(provider, **overrides) -> IssuanceExecutor:
+    opts = {
+        "concurrency": 1,
+        "queue_max": 10,
+        "max_attempts": 3,
+        "backoff_base_seconds": 0.0,
+        "backoff_max_seconds": 0.0,
+        "breaker_threshold": 5,
+        "breaker_reset_seconds": 30.0,
+        "drain_seconds": 1.0,
+    }
+    opts.update(overrides)
+    return IssuanceExecutor(provider=provider, **opts)
+
+
+async def _run(executor: IssuanceExecutor, coro_fn):
+    await executor.start()
+    try:
+        return await coro_fn()
+    finally:
+        await executor.stop()
+
+
+def test_retries_503_then_succeeds():
+    provider = ScriptedProvider([GeekApiError("busy", status_code=503), {"code": 0, "req": "x"}])
+    ex = _executor(provider)
+
+    result = asyncio.run(_run(ex, lambda: ex.issue_device(**ISSUE)))
+
+    assert result == {"code": 0, "req": "x"}
+    assert provider.calls == 2
+    stats = ex.stats()["endpoints"]["adddevice"]
+    assert stats["retries"] == 1
+    assert stats["succeeded"] == 1
+    assert stats["circuit"] == "closed"
+
+
+def test_mock_provider_503s_exhaust_retries():
+    provider = MockGeekProvider(latency_seconds=0.0, jitter_seconds=0.0, transient_error_rate=1.0)
+    ex = _executor(provider, max_attempts=3)
+
+    with pytest.raises(IssuanceUnavailable):
+        asyncio.run(_run(ex, lambda: ex.issue_device(**ISSUE)))
+
+    assert provider.calls["adddevice"] == 3
+    assert ex.stats()["endpoints"]["adddevice"]["retries"] == 2
+
+
+def test_mock_provider_rejection_is_not_retried():
+    provider = MockGeekProvider(latency_seconds=0.0, jitter_seconds=0.0, permanent_error_rate=1.0)
+    ex = _executor(provider)
+
+    with pytest.raises(IssuanceError) as exc:
+        asyncio.run(_run(ex, lambda: ex.issue_device(**ISSUE)))
+
+    assert not isinstance(exc.value, IssuanceOutcomeUnknown)
+    assert provider.calls["adddevice"] == 1
+    assert ex.breakers["adddevice"].state == "closed"
+
+
+def test_read_timeout_is_not_retried():
+    provider = ScriptedProvider([httpx.ReadTimeout("slow"), {"code": 0}])
+    ex = _executor(provider)
+
+    with pytest.raises(IssuanceOutcomeUnknown):
+        asyncio.run(_run(ex, lambda: ex.issue_device(**ISSUE)))
+
+    assert provider.calls == 1
+    assert ex.stats()["endpoints"]["adddevice"]["retries"] == 0
+
+
+def test_breaker_opens_then_half_open_probe_closes_it():
+    provider = ScriptedProvider(
+        [GeekApiError("down", status_code=503), GeekApiError("down", status_code=503), {"code": 0}]
+    )
+    ex = _executor(provider, max_attempts=1, breaker_threshold=2, breaker_reset_seconds=0.05)
+    breaker = ex.breakers["adddevice"]
+    seen = []
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(IssuanceUnavailable):
+                await ex.issue_device(**ISSUE)
+        seen.append(breaker.state)
+
+        # open: fails fast without calling the provider
+        with pytest.raises(IssuanceUnavailable, match="circuit open"):
+            await ex.issue_device(**ISSUE)
+        seen.append(provider.calls)
+
+        await asyncio.sleep(0.06)
+        result = await ex.issue_device(**ISSUE)
+        seen.append(breaker.state)
+        return result
+
+    result = asyncio.run(_run(ex, scenario))
+
+    assert seen == ["open", 2, "closed"]
+    assert result == {"code": 0}
+    assert provider.calls == 3
+
+
+def test_failed_half_open_probe_reopens_breaker():
+    provider = ScriptedProvider([GeekApiError("down", status_code=503)] * 2)
+    ex = _executor(provider, max_attempts=1, breaker_threshold=1, breaker_reset_seconds=0.05)
+    breaker = ex.breakers["adddevice"]
+
+    async def scenario():
+        with pytest.raises(IssuanceUnavailable):
+            await ex.issue_device(**ISSUE)
+        await asyncio.sleep(0.06)
+        assert breaker.allow() is True  # this is the half-open probe slot
+        breaker.release_probe()
+        with pytest.raises(IssuanceUnavailable):
+            await ex.issue_device(**ISSUE)
+        return breaker.state
+
+    assert asyncio.run(_run(ex, scenario)) == "open"
+    assert provider.calls == 2
+
+
+def test_full_queue_rejects_immediately():
+    async def scenario():
+        gate = asyncio.Event()
+        provider = ScriptedProvider([], gate=gate)
+        ex = _executor(provider, concurrency=1, queue_max=1)
+        await ex.start()
+        try:
+            running = asyncio.create_task(ex.issue_device(**ISSUE))
+            await asyncio.sleep(0.01)  # the only worker picks it up and blocks on the gate
+            queued = asyncio.create_task(ex.issue_device(**ISSUE))
+            await asyncio.sleep(0.01)
+
+            with pytest.raises(IssuanceUnavailable, match="queue is full"):
+                await ex.issue_device(**ISSUE)
+            # the other endpoint has its own queue
+            assert ex.stats()["endpoints"]["addyydevice"]["rejected"] == 0
+
+            gate.set()
+            results = await asyncio.gather(running, queued)
+            return results, ex.stats()["endpoints"]["adddevice"]
+        finally:
+            await ex.stop()
+
+    results, stats = asyncio.run(scenario())
+
+    assert results == [{"code": 0}, {"code": 0}]
+    assert stats["rejected"] == 1
+    assert stats["submitted"] == 2
+
+
+def test_stop_fails_queued_jobs_as_unavailable():
+    async def scenario():
+        gate = asyncio.Event()
+        provider = ScriptedProvider([], gate=gate)
+        ex = _executor(provider, concurrency=1, drain_seconds=0.05)
+        await ex.start()
+        running = asyncio.create_task(ex.issue_device(**ISSUE))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(ex.issue_device(**ISSUE))
+        await asyncio.sleep(0.01)
+        await ex.stop()
+        return await asyncio.gather(running, queued, return_exceptions=True)
+
+    running, queued = asyncio.run(scenario())
+
+    assert isinstance(running, IssuanceOutcomeUnknown)
+    assert isinstance(queued, IssuanceUnavailable)
@@ -0,0 +1,107 @@
+"""
+Outbox retention: processed events are purged in bounded batches, and the
+dispatcher runs the purge on its own schedule (no database).
+"""
+
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+
+from app.services import outbox
+
+
+class FakeSession:
+    def __init__(self, deleted, calls):
+        self.deleted = deleted
+        self.calls = calls
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, stmt, params=None):
+        assert stmt is outbox._PURGE_PROCESSED_SQL
+        self.calls.append(params)
+        return SimpleNamespace(rowcount=self.deleted.pop(0))
+
+    async def commit(self):
+        pass
+
+
+def test_purge_deletes_in_batches_until_a_short_one(monkeypatch):
+    deleted = [100, 100, 37, 100]
+    calls = []
+    monkeypatch.setattr(outbox, "AsyncSessionLocal", lambda: FakeSession(deleted, calls))
+
+    total = asyncio.run(outbox.purge_processed_events(retention=timedelta(hours=1), batch_size=100))
+
+    assert total == 237
+    assert [c["limit"] for c in calls] == [100, 100, 100]
+    assert deleted == [100]
+
+
+def test_purge_stops_after_max_batches(monkeypatch):
+    deleted = [10] * 5
+    calls = []
+    monkeypatch.setattr(outbox, "AsyncSessionLocal", lambda: FakeSession(deleted, calls))
+
+    total = asyncio.run(outbox.purge_processed_events(retention=timedelta(hours=1), batch_size=10, max_batches=2))
+
+    assert total == 20
+    assert len(calls) == 2
+
+
+def test_dispatcher_purges_once_per_interval(monkeypatch):
+    purges = []
+
+    async def _dispatch_batch(batch_size):
+        return 0, 0
+
+    async def _purge(*, retention, batch_size):
+        purges.append((retention, batch_size))
+        return 0
+
+    monkeypatch.setattr(outbox, "dispatch_batch", _dispatch_batch)
+    monkeypatch.setattr(outbox, "purge_processed_events", _purge)
+
+    async def _run():
+        d = outbox.OutboxDispatcher(
+            batch_size=10,
+            poll_seconds=0.01,
+            retention_seconds=3600,
+            purge_interval_seconds=3600,
+            purge_batch_size=500,
+        )
+        await d.start()
+        await asyncio.sleep(0.1)
+        await d.stop()
+
+    asyncio.run(_run())
+
+    assert purges == [(timedelta(hours=1), 500)]
+
+
+def test_dispatcher_without_retention_never_purges(monkeypatch):
+    purges = []
+
+    async def _dispatch_batch(batch_size):
+        return 0, 0
+
+    async def _purge(**kwargs):
+        purges.append(kwargs)
+        return 0
+
+    monkeypatch.setattr(outbox, "dispatch_batch", _dispatch_batch)
+    monkeypatch.setattr(outbox, "purge_processed_events", _purge)
+
+    async def _run():
+        d = outbox.OutboxDispatcher(batch_size=10, poll_seconds=0.01)
+        await d.start()
+        await asyncio.sleep(0.05)
+        await d.stop()
+
+    asyncio.run(_run())
+
+    assert purges == []
@@ -0,0 +1,194 @@
+"""
+POST/PATCH /sellers/users through the real app routing, on a recording fake
+session (no database): the price writes of the handler that actually serves
+the route must invalidate the pricing cache on commit. Only the
+seller_users_management handlers are patched to run on the fake session, so
+a request served by another (shadowing) handler fails.
+"""
+
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+from app.core.db import get_db
+from app.core.deps import require_seller
+from app.main import app
+from app.models.plan import Plan
+from app.models.pricing import SellerEdgePlanPrice
+from app.models.user import User
+from app.routers import seller_users_management
+from app.services.plan_price_sync import _SYNC_EDGES_SQL, _SYNC_SELLER_PLAN_PRICES_SQL
+from app.services.pricing import _PARENT_COSTS_SQL
+from app.services.pricing_cache import pricing_cache
+
+SELLER_ID = 10
+CHILD_ID = 11
+PLAN_ID = 7
+
+
+class FakeResult:
+    def __init__(self, *, rows=(), scalars=()):
+        self._rows = list(rows)
+        self._scalars = list(scalars)
+
+    def all(self):
+        return list(self._rows)
+
+    def mappings(self):
+        return SimpleNamespace(all=lambda: list(self._rows))
+
+    def scalars(self):
+        return SimpleNamespace(all=lambda: list(self._scalars))
+
+    def scalar_one_or_none(self):
+        return self._scalars[0] if self._scalars else None
+
+
+class FakeSession:
+    """Enough of AsyncSession for the seller user routes; commit runs the real after_commit hooks."""
+
+    def __init__(self, child):
+        self.sync_session = Session()
+        self.child = child
+        self.added = []
+        self.executed = []
+        self.notified = 0
+
+    async def execute(self, stmt, params=None):
+        self.executed.append(stmt)
+        if isinstance(stmt, TextClause):
+            if stmt is _PARENT_COSTS_SQL:
+                # the seller's own (incoming edge) cost for the plan
+                return FakeResult(rows=[{"plan_id": PLAN_ID, "cost_cents": 500, "currency": "USD", "source": "edge_price"}])
+            if stmt is _SYNC_EDGES_SQL or stmt is _SYNC_SELLER_PLAN_PRICES_SQL:
+                return FakeResult(rows=[("updated", PLAN_ID)])
+            return FakeResult()
+
+        cols = stmt.column_descriptions
+        if cols[0]["name"] == "pg_notify":
+            self.notified += 1
+            return FakeResult()
+        if len(cols) == 1 and cols[0]["entity"] is Plan:
+            return FakeResult(scalars=[SimpleNamespace(id=PLAN_ID, is_active=True, title="Plan 7")])
+        if len(cols) == 1 and cols[0]["entity"] is User:
+            return FakeResult(scalars=[self.child])
+        return FakeResult()
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    async def flush(self):
+        pass
+
+    async def refresh(self, obj):
+        pass
+
+    async def commit(self):
+        self.sync_session.commit()
+
+    async def rollback(self):
+        self.sync_session.rollback()
+
+
+@pytest.fixture
+def child():
+    return SimpleNamespace(
+        id=CHILD_ID,
+        username="child",
+        role="seller",
+        parent_id=SELLER_ID,
+        full_name="Child",
+        email="child@example.com",
+        phone="123",
+        country="US",
+        is_active=True,
+        created_at=datetime.now(timezone.utc),
+    )
+
+
+@pytest.fixture
+def fake_db(child):
+    return FakeSession(child)
+
+
+@pytest.fixture
+def client(fake_db, monkeypatch):
+    seller = SimpleNamespace(id=SELLER_ID, username="seller", role="seller", path="u1.u10", depth=1)
+
+    async def _db():
+        yield fake_db
+
+    app.dependency_overrides[get_db] = _db
+    app.dependency_overrides[require_seller] = lambda: seller
+    # no lifespan: nothing connects to the database
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def stale_edge_entry():
+    """A negatively cached parent->child edge, as a purchase would have left it."""
+    pricing_cache.invalidate()
+    key = (SELLER_ID, CHILD_ID, PLAN_ID)
+    pricing_cache._put(pricing_cache._edges, key, None, pricing_cache.version)
+    assert key in pricing_cache._edges
+    return key
+
+
+def test_create_child_with_plans_invalidates_pricing_cache(client, fake_db, child, stale_edge_entry, monkeypatch):
+    async def _create_user_under_parent(db, **kwargs):
+        return child
+
+    monkeypatch.setattr(seller_users_management, "create_user_under_parent", _create_user_under_parent)
+    version = pricing_cache.version
+
+    r = client.post(
+        "/sellers/users",
+        json={
+            "username": "child",
+            "password": "secret123",
+            "full_name": "Child",
+            "email": "child@example.com",
+            "phone": "123",
+            "country": "US",
+            "plans": [{"plan_id": PLAN_ID, "price_cents": 700}],
+        },
+    )
+
+    assert r.status_code == 200, r.text
+    edges = [o for o in fake_db.added if isinstance(o, SellerEdgePlanPrice)]
+    assert [(e.parent_user_id, e.child_user_id, e.plan_id, e.price_cents) for e in edges] == [
+        (SELLER_ID, CHILD_ID, PLAN_ID, 700)
+    ]
+    assert fake_db.notified == 1
+    assert pricing_cache.version > version
+    assert stale_edge_entry not in pricing_cache._edges
+
+
+def test_update_child_plans_applies_diff_and_invalidates_pricing_cache(client, fake_db, stale_edge_entry):
+    version = pricing_cache.version
+
+    r = client.patch(f"/sellers/users/{CHILD_ID}", json={"plans": [{"plan_id": PLAN_ID, "price_cents": 800}]})
+
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["plan_changes"] == {"inserted": [], "updated": [PLAN_ID], "deleted": []}
+    assert body["edge_changes"] == {"inserted": [], "updated": [PLAN_ID], "deleted": []}
+    # diff sync only: no DELETE-all / re-insert of the child's rows
+    assert not any(getattr(stmt, "is_delete", False) for stmt in fake_db.executed)
+    assert fake_db.added == []
+    assert fake_db.notified == 1
+    assert pricing_cache.version > version
+    assert stale_edge_entry not in pricing_cache._edges
+
+
+def test_child_price_below_seller_cost_is_rejected(client, fake_db):
+    r = client.patch(f"/sellers/users/{CHILD_ID}", json={"plans": [{"plan_id": PLAN_ID, "price_cents": 499}]})
+
+    assert r.status_code == 400
+    assert "(500)" in r.json()["detail"]
+    assert fake_db.notified == 0